@@ -7,6 +7,7 @@ import pandas as pd
 from config import CONFIG
 from evaluator.agent import MobileAgent
 from evaluator.common.action_type import Action
+from evaluator.composite_evaluator import CompositeEvaluator
 from evaluator.exactmatch_evaluator import ExactMatchEvaluator
 from evaluator.lcsmatch_evaluator import LCSMatchEvaluator
 from evaluator.task_trace import Agent, DatasetHelper, TaskCategory, TaskTrace
@@ -39,6 +40,8 @@ class AppAgent(MobileAgent):
         if episode not in self.epi_to_exec_trace_path:
             return None
         epi_trace_path = self.epi_to_exec_trace_path[episode]
+        if not self.helper.testbed_trace_exists(epi_trace_path):
+            return None
         trace = self.helper.load_testbed_trace_by_path(epi_trace_path)
         act_list: List[Action] = [
             item.action for item in trace if item.action is not None
@@ -68,13 +71,18 @@ class AppAgent(MobileAgent):
         if episode not in self.epi_to_exec_trace_path:
             return None
         epi_trace_path = self.epi_to_exec_trace_path[episode]
+        if not self.helper.testbed_trace_exists(epi_trace_path):
+            return None
         return self.helper.load_testbed_trace_by_path(epi_trace_path)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run AutoDroid evaluation.")
     parser.add_argument(
-        "--eval", type=str, help='Evaluation type: "testbed (t)" or "exact (e)"'
+        "--eval",
+        type=str,
+        help='Evaluation type: "testbed (t)", "exact (e)", "lcs-exact (lcse)" '
+        'or "all (a)"',
     )
     args = parser.parse_args()
 
@@ -149,6 +157,34 @@ if __name__ == "__main__":
             suffix=suffix,
         )
 
+    elif args.eval == "all" or args.eval == "a":
+        # one pass over the episodes, sharing loaded traces between evaluators
+        c = CompositeEvaluator(
+            agent=agent,
+            epi_metadata_path=CONFIG.EPI_METADATA_PATH,
+            gr_dataset_path=CONFIG.GR_DATASET_PATH,
+            evaluator_classes=[
+                ExactMatchEvaluator,
+                TestbedEvaluator,
+                LCSMatchEvaluator,
+            ],
+            options={
+                "categories": [
+                    TaskCategory.GENERAL,
+                    TaskCategory.GOOGLEAPPS,
+                    TaskCategory.INSTALL,
+                    TaskCategory.WEBSHOPPING,
+                    TaskCategory.GENERATED,
+                ],
+            },
+        )
+        c.run_evaluation()
+        c.report_stats(
+            human_eval_path=human_eval_path,
+            only_human_eval_positive=table_all_successful_FLAG,
+            suffix=suffix,
+        )
+
     """
     # demo code of ablation study
     options_base = {
@@ -0,0 +1,184 @@
+"""Compare the per-pair cost of check_actions_match called one action pair at
+a time with the batched checks used by ExactMatchEvaluator
+(check_actions_match_batch) and LCSMatchEvaluator (check_actions_match_matrix).
+
+Actions and UI positions are random, with the shapes of the ground-truth
+dataset: a mix of taps, swipes and global actions, and a few dozen UI
+positions per screen.
+
+Usage:
+    python benchmark_action_matching.py --pairs 10000 --steps 30
+"""
+
+import argparse
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from evaluator.common.action_type import Action, ActionType
+from evaluator.exactmatch_evaluation.action_matching import (
+    check_actions_match,
+    check_actions_match_batch,
+    check_actions_match_matrix,
+    pad_annotation_positions,
+    stack_actions,
+)
+
+ACTION_TYPES = [
+    ActionType.DUAL_POINT,
+    ActionType.DUAL_POINT,
+    ActionType.DUAL_POINT,
+    ActionType.TYPE,
+    ActionType.PRESS_BACK,
+]
+
+
+def random_actions(rng: np.random.Generator, num_actions: int) -> List[Action]:
+    actions = []
+    for _ in range(num_actions):
+        touch_yx = rng.random(2)
+        # half taps, half swipes
+        lift_yx = touch_yx + (rng.normal(0, 0.01, 2) if rng.random() < 0.5 else 0.3)
+        actions.append(
+            Action(
+                ACTION_TYPES[rng.integers(len(ACTION_TYPES))],
+                tuple(touch_yx.tolist()),
+                tuple(np.clip(lift_yx, 0, 1).tolist()),
+            )
+        )
+    return actions
+
+
+def random_ui_positions(rng: np.random.Generator, num_screens: int) -> List[np.ndarray]:
+    return [
+        rng.random((rng.integers(10, 60), 4)) * [1, 1, 0.2, 0.5]
+        for _ in range(num_screens)
+    ]
+
+
+def check_pair(action_1: Action, action_2: Action, ui_positions: np.ndarray) -> bool:
+    # as the evaluators checked every action pair before
+    try:
+        return bool(
+            check_actions_match(
+                action_1.touch_point_yx,
+                action_1.lift_point_yx,
+                action_1.action_type,
+                action_2.touch_point_yx,
+                action_2.lift_point_yx,
+                action_2.action_type,
+                ui_positions,
+            )
+        )
+    except Exception:
+        return False
+
+
+def timed(fn: Callable, repeat: int):
+    """(result of fn, best time of *repeat* runs in seconds)"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def report(name: str, num_pairs: int, per_pair_time: float, batch_time: float):
+    print(
+        f"[{name}] {num_pairs} pairs: "
+        f"per pair {per_pair_time / num_pairs * 1e6:.2f}us -> "
+        f"batched {batch_time / num_pairs * 1e6:.3f}us "
+        f"({per_pair_time / batch_time:.0f}x)"
+    )
+
+
+def benchmark_batch(rng: np.random.Generator, num_pairs: int, repeat: int) -> None:
+    actions_1 = random_actions(rng, num_pairs)
+    actions_2 = random_actions(rng, num_pairs)
+    ui_positions = random_ui_positions(rng, num_pairs)
+
+    def per_pair():
+        return np.array(
+            [
+                check_pair(action_1, action_2, positions)
+                for action_1, action_2, positions in zip(
+                    actions_1, actions_2, ui_positions
+                )
+            ]
+        )
+
+    def batched():
+        touch_1, lift_1, types_1, valid_1 = stack_actions(actions_1)
+        touch_2, lift_2, types_2, valid_2 = stack_actions(actions_2)
+        return (
+            check_actions_match_batch(
+                touch_1, lift_1, types_1, touch_2, lift_2, types_2, ui_positions
+            )
+            & valid_1
+            & valid_2
+        )
+
+    expected, per_pair_time = timed(per_pair, repeat)
+    matched, batch_time = timed(batched, repeat)
+    assert np.array_equal(matched, expected)
+    report("check_actions_match_batch", num_pairs, per_pair_time, batch_time)
+
+
+def benchmark_matrix(rng: np.random.Generator, num_steps: int, repeat: int) -> None:
+    gt_actions = random_actions(rng, num_steps)
+    exec_actions = random_actions(rng, num_steps)
+    ui_positions = random_ui_positions(rng, num_steps)
+
+    def per_pair():
+        return np.array(
+            [
+                [
+                    check_pair(gt_action, exec_action, positions)
+                    for exec_action in exec_actions
+                ]
+                for gt_action, positions in zip(gt_actions, ui_positions)
+            ]
+        )
+
+    def batched():
+        gt_touch, gt_lift, gt_types, gt_valid = stack_actions(gt_actions)
+        exec_touch, exec_lift, exec_types, exec_valid = stack_actions(exec_actions)
+        match = check_actions_match_matrix(
+            gt_touch,
+            gt_lift,
+            gt_types,
+            exec_touch,
+            exec_lift,
+            exec_types,
+            *pad_annotation_positions(ui_positions),
+        )
+        return match & gt_valid[:, None] & exec_valid[None, :]
+
+    expected, per_pair_time = timed(per_pair, repeat)
+    matched, batch_time = timed(batched, repeat)
+    assert np.array_equal(matched, expected)
+    report("check_actions_match_matrix", num_steps**2, per_pair_time, batch_time)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark batched action matching against per-pair checks"
+    )
+    parser.add_argument(
+        "--pairs", type=int, default=10000, help="number of action pairs"
+    )
+    parser.add_argument(
+        "--steps",
+        type=int,
+        default=30,
+        help="number of steps of both traces compared by LCS",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measure")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    benchmark_batch(rng, args.pairs, args.repeat)
+    benchmark_matrix(rng, args.steps, args.repeat)
@@ -5,6 +5,7 @@ from typing import List, Optional
 from config import CONFIG
 from evaluator.agent import MobileAgent
 from evaluator.common.action_type import Action
+from evaluator.composite_evaluator import CompositeEvaluator
 from evaluator.exactmatch_evaluator import ExactMatchEvaluator
 from evaluator.lcsmatch_evaluator import LCSMatchEvaluator
 from evaluator.task_trace import Agent, DatasetHelper, TaskCategory, TaskTrace
@@ -26,18 +27,20 @@ class CoCoAgent(MobileAgent):
 
     def load_exec_trace_by_episode(self, episode: str) -> Optional[TaskTrace]:
         epi_folder = os.path.join(self.base_folder, episode, "captured_data")
-        if not os.path.exists(epi_folder):
+        helper = DatasetHelper(CONFIG.EPI_METADATA_PATH, CONFIG.GR_DATASET_PATH)
+        if not helper.testbed_trace_exists(epi_folder):
             return None
 
-        return DatasetHelper(
-            CONFIG.EPI_METADATA_PATH, CONFIG.GR_DATASET_PATH
-        ).load_testbed_trace_by_path(epi_folder)
+        return helper.load_testbed_trace_by_path(epi_folder)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run CoCoAgent evaluation.")
     parser.add_argument(
-        "--eval", type=str, help='Evaluation type: "testbed (t)" or "exact (e)"'
+        "--eval",
+        type=str,
+        help='Evaluation type: "testbed (t)", "exact (e)", "lcs-exact (lcse)" '
+        'or "all (a)"',
     )
     args = parser.parse_args()
 
@@ -112,7 +115,35 @@ if __name__ == "__main__":
             suffix="only_human_success",
         )
 
+    elif args.eval == "all" or args.eval == "a":
+        # one pass over the episodes, sharing loaded traces between evaluators
+        c = CompositeEvaluator(
+            agent=agent,
+            epi_metadata_path=CONFIG.EPI_METADATA_PATH,
+            gr_dataset_path=CONFIG.GR_DATASET_PATH,
+            evaluator_classes=[
+                ExactMatchEvaluator,
+                TestbedEvaluator,
+                LCSMatchEvaluator,
+            ],
+            options={
+                "categories": [
+                    TaskCategory.GENERAL,
+                    TaskCategory.GOOGLEAPPS,
+                    TaskCategory.INSTALL,
+                    TaskCategory.WEBSHOPPING,
+                    TaskCategory.GENERATED,
+                ],
+            },
+        )
+        c.run_evaluation()
+        c.report_stats(
+            human_eval_path=CONFIG.COCOAGENT_HUMANEVAL_PATH,
+            only_human_eval_positive=False,
+            suffix="only_human_success",
+        )
     else:
         raise Exception(
-            f"Invalid evaluation type: {args.eval}, expected: testbed/t and exact/e"
+            f"Invalid evaluation type: {args.eval}, expected: testbed/t, exact/e, "
+            "lcs-exact/lcse or all/a"
         )
@@ -0,0 +1,94 @@
+import argparse
+
+from appagent import AppAgent
+from autodroid import AutoDroid
+from autoui import AutoUI
+from cocoagent import CoCoAgent
+from config import CONFIG
+from evaluator.exactmatch_evaluator import ExactMatchEvaluator
+from evaluator.lcsmatch_evaluator import LCSMatchEvaluator
+from evaluator.multi_agent_evaluator import MultiAgentEvaluator
+from evaluator.task_trace import TaskCategory
+from evaluator.testbed_evaluator import TestbedEvaluator
+
+# agent -> (MobileAgent class, human eval result path)
+AGENTS = {
+    "autoui": (AutoUI, CONFIG.AUTOUI_HUMANEVAL_PATH),
+    "autodroid": (AutoDroid, CONFIG.AUTODROID_HUMANEVAL_PATH),
+    "appagent": (AppAgent, CONFIG.APPAGENT_HUMANEVAL_PATH),
+    "cocoagent": (CoCoAgent, CONFIG.COCOAGENT_HUMANEVAL_PATH),
+}
+
+EVALUATORS = {
+    "testbed": [TestbedEvaluator],
+    "t": [TestbedEvaluator],
+    "exact": [ExactMatchEvaluator],
+    "e": [ExactMatchEvaluator],
+    "lcs-exact": [LCSMatchEvaluator],
+    "lcse": [LCSMatchEvaluator],
+    "all": [ExactMatchEvaluator, TestbedEvaluator, LCSMatchEvaluator],
+    "a": [ExactMatchEvaluator, TestbedEvaluator, LCSMatchEvaluator],
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Evaluate several agents, sharing the ground-truth work of "
+        "each episode between them."
+    )
+    parser.add_argument(
+        "--agents",
+        type=str,
+        nargs="+",
+        default=list(AGENTS),
+        help=f"Agents to compare, from {list(AGENTS)}. Default: all of them",
+    )
+    parser.add_argument(
+        "--eval",
+        type=str,
+        default="all",
+        help='Evaluation type: "testbed (t)", "exact (e)", "lcs-exact (lcse)" '
+        'or "all (a)". Default: all',
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=1, help="number of worker processes"
+    )
+    args = parser.parse_args()
+
+    for agent_name in args.agents:
+        if agent_name not in AGENTS:
+            raise Exception(
+                f"Invalid agent: {agent_name}, expected one of {list(AGENTS)}"
+            )
+    if args.eval not in EVALUATORS:
+        raise Exception(
+            f"Invalid evaluation type: {args.eval}, expected: testbed/t, exact/e, "
+            "lcs-exact/lcse or all/a"
+        )
+
+    agents = [AGENTS[agent_name][0]() for agent_name in args.agents]
+    m = MultiAgentEvaluator(
+        agents=agents,
+        epi_metadata_path=CONFIG.EPI_METADATA_PATH,
+        gr_dataset_path=CONFIG.GR_DATASET_PATH,
+        evaluator_classes=EVALUATORS[args.eval],
+        options={
+            "categories": [
+                TaskCategory.GENERAL,
+                TaskCategory.GOOGLEAPPS,
+                TaskCategory.INSTALL,
+                TaskCategory.WEBSHOPPING,
+                TaskCategory.GENERATED,
+            ],
+            "jobs": args.jobs,
+        },
+    )
+    m.run_evaluation()
+    m.report_stats(
+        human_eval_path={
+            agent.agent_name: AGENTS[agent_name][1]
+            for agent_name, agent in zip(args.agents, agents)
+        },
+        only_human_eval_positive=False,
+        suffix="only_human_success",
+    )
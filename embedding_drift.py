@@ -0,0 +1,99 @@
+"""Report how far the screen-level similarity scores of an embedding backend
+drift from the torch backend on the ground-truth dataset.
+
+For every episode, the simplified view of each UIState annotated with
+fuzzy<-1> is compared with the simplified views of all UIStates in the same
+trace, using both backends.
+
+Usage:
+    python embedding_drift.py --backend onnx-int8
+"""
+
+import argparse
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from config import CONFIG
+from evaluator.task_trace import DatasetHelper, TaskCategory
+from evaluator.testbed_evaluation.embedding_backend import BACKENDS, load_backend
+from evaluator.testbed_evaluation.fuzzy_match import (
+    SCREEN_SIMILARITY_THRESHOLD,
+    has_screen_level_fuzzy_state,
+    load_simplified_views,
+)
+from evaluator.testbed_evaluation.sentence_similarity import MODEL_NAME
+
+
+def collect_views(helper: DatasetHelper, episodes: List[str]) -> Dict[str, List]:
+    """episode -> ([views of fuzzy<-1> UIStates], [views of all UIStates])"""
+    episode_views = {}
+    for epi in episodes:
+        trace = helper.load_groundtruth_trace_by_episode(epi)
+        if not trace:
+            continue
+        fuzzy_views = [
+            load_simplified_views(s.vh_json_path)
+            for s in trace
+            if has_screen_level_fuzzy_state(s)
+        ]
+        if fuzzy_views:
+            all_views = [load_simplified_views(s.vh_json_path) for s in trace]
+            episode_views[epi] = (fuzzy_views, all_views)
+    return episode_views
+
+
+def compute_scores(backend: str, episode_views: Dict[str, List]) -> np.ndarray:
+    model = load_backend(backend, MODEL_NAME)
+    views = sorted({v for pair in episode_views.values() for vs in pair for v in vs})
+    start = time.perf_counter()
+    embeddings = dict(zip(views, model.encode(views, batch_size=64)))
+    print(
+        f"[{backend}] encoded {len(views)} views in {time.perf_counter() - start:.2f}s"
+    )
+
+    scores = [
+        np.array([embeddings[v] for v in fuzzy_views])
+        @ np.array([embeddings[v] for v in all_views]).T
+        for fuzzy_views, all_views in episode_views.values()
+    ]
+    return np.concatenate([s.ravel() for s in scores])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report embedding backend drift.")
+    parser.add_argument(
+        "--backend", type=str, default="onnx-int8", choices=BACKENDS[1:]
+    )
+    parser.add_argument(
+        "--category",
+        type=str,
+        default=None,
+        help="only use episodes of this category, e.g., general",
+    )
+    args = parser.parse_args()
+
+    helper = DatasetHelper(CONFIG.EPI_METADATA_PATH, CONFIG.GR_DATASET_PATH)
+    episodes = (
+        helper.get_episodes_by_category(TaskCategory[args.category.upper()])
+        if args.category
+        else helper.get_all_episodes()
+    )
+    episode_views = collect_views(helper, episodes)
+
+    reference = compute_scores("torch", episode_views)
+    candidate = compute_scores(args.backend, episode_views)
+    drift = np.abs(candidate - reference)
+    flipped = (reference > SCREEN_SIMILARITY_THRESHOLD) != (
+        candidate > SCREEN_SIMILARITY_THRESHOLD
+    )
+
+    print(f"episodes: {len(episode_views)}, compared screen pairs: {len(drift)}")
+    print(f"mean absolute drift: {drift.mean():.6f}")
+    print(f"p99 absolute drift: {np.percentile(drift, 99):.6f}")
+    print(f"max absolute drift: {drift.max():.6f}")
+    print(
+        f"decisions flipped at threshold {SCREEN_SIMILARITY_THRESHOLD}: "
+        f"{flipped.sum()} ({flipped.mean():.4%})"
+    )
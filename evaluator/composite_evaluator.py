@@ -0,0 +1,192 @@
+import logging
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type
+
+from .agent import MobileAgent
+from .evaluator import BaseEvaluator, _failed_reason_str
+from .groundtruth_features import GroundTruthFeatures
+from .result_cache import get_options_key
+from .task_trace import TaskTrace
+
+
+class SharedEpisodeAgent(MobileAgent):
+    """Wraps the agent evaluated by a CompositeEvaluator, so that all its
+    evaluators get the same exec trace and predicted actions of the episode
+    being evaluated, loaded once"""
+
+    def __init__(self, agent: MobileAgent) -> None:
+        super().__init__()
+        self.inner = agent
+        self._agent = agent.agent
+        self.agent_name = agent.agent_name
+        self._episode: Optional[str] = None
+        self._loaded: Dict[str, Any] = {}
+
+    def begin_episode(self, episode: str) -> None:
+        self._episode = episode
+        self._loaded = {}
+
+    def end_episode(self) -> None:
+        self._episode = None
+        self._loaded = {}
+
+    def _load(self, kind: str, episode: str, load: Callable[[str], Any]) -> Any:
+        if episode != self._episode:
+            return load(episode)
+        if kind not in self._loaded:
+            self._loaded[kind] = load(episode)
+        return self._loaded[kind]
+
+    def load_exec_trace_by_episode(self, episode: str) -> Optional[TaskTrace]:
+        return self._load("exec_trace", episode, self.inner.load_exec_trace_by_episode)
+
+    def load_predicted_action_by_episode(self, episode: str) -> Optional[List]:
+        return self._load(
+            "predicted_actions", episode, self.inner.load_predicted_action_by_episode
+        )
+
+
+class CompositeEvaluator(BaseEvaluator):
+    """Evaluate an agent with several evaluators in one pass over the
+    episodes. The evaluators of an episode share its ground-truth trace and
+    exec trace (with their parsed view hierarchies and screen sizes), the
+    predicted actions of the agent, and the UI positions extracted from view
+    hierarchies.
+
+    Results of each evaluator are recorded in its own episode_completion, so
+    that report_stats() can be called on every evaluator in self.evaluators.
+    An episode is completed for the CompositeEvaluator itself only when all
+    evaluators consider it completed.
+
+    Options of the CompositeEvaluator select and schedule the episodes (e.g.,
+    "categories", "jobs", "journal"); options of an evaluator are given in
+    *evaluator_options* by its class name.
+    """
+
+    def __init__(
+        self,
+        agent: MobileAgent,
+        epi_metadata_path: str,
+        gr_dataset_path: str,
+        evaluator_classes: Sequence[Type[BaseEvaluator]],
+        options: Dict = None,
+        evaluator_options: Optional[Dict[str, Dict]] = None,
+    ) -> None:
+        super().__init__(agent, epi_metadata_path, gr_dataset_path, options)
+        self.evaluator_name = self.__class__.__name__
+        self.shared_agent = SharedEpisodeAgent(agent)
+        self.ui_positions_cache: Dict[Tuple, Any] = {}
+        self.evaluators: List[BaseEvaluator] = []
+        for evaluator_class in evaluator_classes:
+            evaluator = evaluator_class(
+                self.shared_agent,
+                epi_metadata_path,
+                gr_dataset_path,
+                (evaluator_options or {}).get(evaluator_class.__name__, None),
+            )
+            if hasattr(evaluator, "ui_positions_cache"):
+                evaluator.ui_positions_cache = self.ui_positions_cache
+            self.evaluators.append(evaluator)
+        # created after the evaluators, which may reset the logging level
+        self.logger = logging.getLogger(self.evaluator_name)
+
+    def get_evaluators_key(self) -> Dict[str, str]:
+        """Class name -> options changing results, of every evaluator"""
+        return {
+            evaluator.__class__.__name__: get_options_key(evaluator.options)
+            for evaluator in self.evaluators
+        }
+
+    def get_result_options(self) -> Dict:
+        # results of other evaluators or evaluator options are never reused
+        return {**(self.options or {}), "evaluators": self.get_evaluators_key()}
+
+    def get_episode_fingerprint(self, episode: str) -> str:
+        # the predicted actions compared by ExactMatchEvaluator and the like
+        return ",".join(
+            [
+                super().get_episode_fingerprint(episode),
+                self.result_cache.actions_fingerprint(
+                    self.agent.load_predicted_action_by_episode(episode)
+                ),
+            ]
+        )
+
+    def prepare_evaluation(self, target_episodes: List[str]) -> None:
+        for evaluator in self.evaluators:
+            evaluator.prepare_evaluation(target_episodes)
+
+    def add_groundtruth_features(self, features: GroundTruthFeatures) -> None:
+        for evaluator in self.evaluators:
+            evaluator.add_groundtruth_features(features)
+
+    def eval_impl(
+        self, episode: str, task_description: str
+    ) -> Tuple[bool, Optional[str]]:
+        self.shared_agent.begin_episode(episode)
+        try:
+            for evaluator in self.evaluators:
+                evaluator.gr_features = self.gr_features
+                completeness, failed_reason = evaluator.eval_episode(episode)
+                evaluator.episode_completion[episode] = (
+                    completeness,
+                    _failed_reason_str(failed_reason),
+                )
+        finally:
+            self.shared_agent.end_episode()
+            self.ui_positions_cache.clear()
+            for evaluator in self.evaluators:
+                evaluator.gr_features = None
+
+        failed = [
+            f"{evaluator.evaluator_name}: "
+            f"{evaluator.episode_completion[episode][1] or 'not completed'}"
+            for evaluator in self.evaluators
+            if not evaluator.episode_completion[episode][0]
+        ]
+        return not failed, "; ".join(failed) if failed else None
+
+    def export_episode_stats(
+        self, episode: str
+    ) -> Dict[str, Tuple[Tuple[bool, str], Any]]:
+        # popped, so that results evaluated in a worker are only kept once
+        return {
+            evaluator.evaluator_name: (
+                evaluator.episode_completion.pop(episode),
+                evaluator.export_episode_stats(episode),
+            )
+            for evaluator in self.evaluators
+            if episode in evaluator.episode_completion
+        }
+
+    def import_episode_stats(
+        self, episode: str, episode_stats: Dict[str, Tuple[Tuple[bool, str], Any]]
+    ) -> None:
+        for evaluator in self.evaluators:
+            if evaluator.evaluator_name not in (episode_stats or {}):
+                continue
+            result, evaluator_stats = episode_stats[evaluator.evaluator_name]
+            evaluator.episode_completion[episode] = tuple(result)
+            evaluator.import_episode_stats(episode, evaluator_stats)
+
+    def finish_evaluation(self) -> None:
+        for evaluator in self.evaluators:
+            # episodes failing before any evaluator ran fail for all of them
+            evaluator.episode_completion = {
+                epi: evaluator.episode_completion.get(epi, result)
+                for epi, result in self.episode_completion.items()
+            }
+            evaluator.finish_evaluation()
+
+    def report_stats(
+        self,
+        human_eval_path: str = None,
+        only_human_eval_positive: bool = False,
+        to_stdout: bool = False,
+        suffix: str = "",
+    ) -> None:
+        """Report the statistics of every evaluator"""
+        for evaluator in self.evaluators:
+            print(f"[{evaluator.evaluator_name}]")
+            evaluator.report_stats(
+                human_eval_path, only_human_eval_positive, to_stdout, suffix
+            )
@@ -0,0 +1,288 @@
+"""A persistent index of the ground-truth dataset.
+
+Loading a ground-truth trace from the raw dataset reads instruction.txt, parses
+eventStructs.txt, and opens every .activity and .ess file of the trace. The
+index (a SQLite file, by default [GR_DATASET_PATH]/.dataset_index.sqlite)
+stores the parsed content of every trace folder, so that DatasetHelper loads
+traces without parsing any file:
+
+    - traces: folder (relative to the dataset) -> category, episode, signature
+    - ui_states: actions, activities, essential states and screenshot sizes
+
+The signature of a trace folder hashes the name, size and mtime of all its
+files. A trace whose folder no longer matches its signature is stale and is
+loaded from the raw files instead.
+
+Build or rebuild the index with:
+    python -m evaluator.dataset_index [GR_DATASET_PATH]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+
+from . import trace_storage
+from .common.action_type import Action, ActionType
+
+INDEX_FILE_NAME = ".dataset_index.sqlite"
+INDEX_VERSION = "1"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS traces (
+    path TEXT PRIMARY KEY,
+    category TEXT,
+    episode TEXT,
+    signature TEXT
+);
+CREATE TABLE IF NOT EXISTS ui_states (
+    path TEXT,
+    idx INTEGER,
+    action_type INTEGER,
+    touch_y REAL,
+    touch_x REAL,
+    lift_y REAL,
+    lift_x REAL,
+    typed_text TEXT,
+    activity TEXT,
+    essential_state TEXT,
+    screen_width INTEGER,
+    screen_height INTEGER,
+    PRIMARY KEY (path, idx)
+);
+"""
+
+
+def get_trace_signature(trace_path: str) -> str:
+    """Hash of the name, size and mtime of all files in a trace folder, or of
+    the pack or archive holding the trace"""
+    stored = trace_storage.split_storage_path(trace_path)
+    if stored is not None:
+        stat = os.stat(stored[0])
+        entries = [(trace_path, stat.st_size, stat.st_mtime_ns)]
+        return hashlib.sha1(repr(entries).encode("utf-8")).hexdigest()
+    entries = sorted(
+        (entry.name, entry.stat().st_size, entry.stat().st_mtime_ns)
+        for entry in os.scandir(trace_path)
+        if entry.is_file()
+    )
+    return hashlib.sha1(repr(entries).encode("utf-8")).hexdigest()
+
+
+# one state of an indexed trace:
+# (index, action, activity, essential_state, (screen_width, screen_height))
+IndexedUIState = Tuple[int, Action, str, Optional[dict], Tuple[int, int]]
+
+
+class DatasetIndex:
+    def __init__(self, gr_dataset_path: str, index_path: Optional[str] = None) -> None:
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.gr_dataset_path = gr_dataset_path
+        self.index_path = index_path or os.path.join(gr_dataset_path, INDEX_FILE_NAME)
+        # connections can only be used by the thread that opened them
+        self._local = threading.local()
+        self._outdated = False
+
+    def __getstate__(self):
+        # connections cannot be pickled; each process opens its own ones
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state) -> None:
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def exists(self) -> bool:
+        return os.path.exists(self.index_path)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path)
+            conn.executescript(_SCHEMA)
+            version = conn.execute(
+                "SELECT value FROM meta WHERE key = 'version'"
+            ).fetchone()
+            if version is not None and version[0] != INDEX_VERSION:
+                self.logger.warning(
+                    f"Ignore index {self.index_path} of version {version[0]}, "
+                    f"rebuild it to version {INDEX_VERSION}"
+                )
+                self._outdated = True
+            self._local.conn = conn
+        return conn
+
+    def load_trace(self, trace_path: str) -> Optional[Tuple[str, List[IndexedUIState]]]:
+        """Load an indexed trace folder
+
+        Return:
+            (episode, indexed UI states), or None if the folder is not indexed
+            or has changed since it was indexed
+        """
+        conn = self.conn
+        if self._outdated:
+            return None
+        rel_path = os.path.relpath(trace_path, self.gr_dataset_path)
+        row = conn.execute(
+            "SELECT episode, signature FROM traces WHERE path = ?", (rel_path,)
+        ).fetchone()
+        if row is None:
+            return None
+        episode, signature = row
+        if signature != get_trace_signature(trace_path):
+            self.logger.info(f"Index of {trace_path} is stale")
+            return None
+
+        ui_states: List[IndexedUIState] = []
+        for (
+            idx,
+            action_type,
+            touch_y,
+            touch_x,
+            lift_y,
+            lift_x,
+            typed_text,
+            activity,
+            essential_state,
+            screen_width,
+            screen_height,
+        ) in conn.execute(
+            "SELECT idx, action_type, touch_y, touch_x, lift_y, lift_x, typed_text, "
+            "activity, essential_state, screen_width, screen_height "
+            "FROM ui_states WHERE path = ? ORDER BY idx",
+            (rel_path,),
+        ):
+            action = Action(
+                action_type=ActionType(action_type),
+                touch_point_yx=(touch_y, touch_x),
+                lift_point_yx=(lift_y, lift_x),
+                typed_text=typed_text,
+            )
+            ui_states.append(
+                (
+                    idx,
+                    action,
+                    activity,
+                    None if essential_state is None else json.loads(essential_state),
+                    (screen_width, screen_height),
+                )
+            )
+        return episode, ui_states
+
+    def find_trace_paths(self, episode: str) -> List[str]:
+        """Indexed trace folders (relative to the dataset) of an episode"""
+        conn = self.conn
+        if self._outdated:
+            return []
+        return [
+            path
+            for (path,) in conn.execute(
+                "SELECT path FROM traces WHERE episode = ? ORDER BY path", (episode,)
+            )
+        ]
+
+    def build(self, helper) -> None:
+        """(Re)build the index of all traces in the dataset. Traces that fail
+        to be loaded are left out and will be loaded from the raw files.
+
+        Args:
+            helper: DatasetHelper of the dataset, used to parse trace folders
+        """
+        from .task_trace import TaskCategory
+
+        conn = self.conn
+        self._outdated = False
+        with conn:
+            conn.execute("DELETE FROM traces")
+            conn.execute("DELETE FROM ui_states")
+            conn.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('version', ?)", (INDEX_VERSION,)
+            )
+            for category in TaskCategory:
+                category_path = os.path.join(self.gr_dataset_path, category.value)
+                if not os.path.isdir(category_path):
+                    continue
+                dirs = os.listdir(category_path)
+                for dir in sorted(dirs):
+                    trace_path = os.path.join(category_path, dir)
+                    folder = trace_storage.strip_storage_suffix(dir)
+                    if folder is not None and os.path.isfile(trace_path):
+                        if folder in dirs:
+                            continue
+                        trace_path = trace_storage.resolve_trace_root(
+                            os.path.join(category_path, folder)
+                        )
+                    elif not os.path.isdir(trace_path):
+                        continue
+                    try:
+                        self._index_trace(helper, category.value, trace_path)
+                    except Exception as e:
+                        self.logger.warning(f"Skip indexing {trace_path}: {str(e)}")
+        num_traces = conn.execute("SELECT COUNT(*) FROM traces").fetchone()[0]
+        self.logger.info(f"Indexed {num_traces} traces in {self.index_path}")
+
+    def _index_trace(self, helper, category: str, trace_path: str) -> None:
+        signature = get_trace_signature(trace_path)
+        with trace_storage.open_file(os.path.join(trace_path, "instruction.txt")) as f:
+            episode = f.readline().strip()
+        trace = helper._load_groundtruth_trace_by_path(trace_path)
+
+        rel_path = os.path.relpath(trace_path, self.gr_dataset_path)
+        rows = []
+        for ui_state in trace:
+            action = ui_state.action
+            essential_state = (
+                None
+                if ui_state.essential_state is None
+                else json.dumps(
+                    {
+                        keyword.value: contents
+                        for keyword, contents in ui_state.essential_state.items()
+                    }
+                )
+            )
+            screen_width, screen_height = ui_state.screen_size
+            rows.append(
+                (
+                    rel_path,
+                    ui_state.index,
+                    action.action_type.value,
+                    *action.touch_point_yx,
+                    *action.lift_point_yx,
+                    action.typed_text,
+                    ui_state.activity,
+                    essential_state,
+                    screen_width,
+                    screen_height,
+                )
+            )
+        self.conn.execute(
+            "INSERT INTO traces VALUES (?, ?, ?, ?)",
+            (rel_path, category, episode, signature),
+        )
+        self.conn.executemany(
+            "INSERT INTO ui_states VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+        )
+
+
+if __name__ == "__main__":
+    from config import CONFIG
+
+    from .task_trace import DatasetHelper
+
+    parser = argparse.ArgumentParser(description="Build the ground-truth index.")
+    parser.add_argument(
+        "gr_dataset_path", type=str, nargs="?", default=CONFIG.GR_DATASET_PATH
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    helper = DatasetHelper(CONFIG.EPI_METADATA_PATH, args.gr_dataset_path)
+    helper.build_dataset_index()
@@ -1,14 +1,23 @@
 import logging
+import multiprocessing
 import os
 from abc import ABC, abstractmethod
+from concurrent.futures import (
+    BrokenExecutor,
+    Future,
+    ProcessPoolExecutor,
+    as_completed,
+)
 from datetime import datetime
 from enum import Enum
-from typing import Dict, Optional, Tuple
-
-import pandas as pd
+from typing import Any, Dict, Generator, Iterator, List, Optional, Tuple, Union
 
 from .agent import MobileAgent
-from .task_trace import DatasetHelper
+from .groundtruth_features import GroundTruthFeatures
+from .result_cache import DEFAULT_CACHE_PATH, ResultCache
+from .result_sink import ResultSink, RunningStats, open_result_sink
+from .run_journal import RunJournal
+from .task_trace import DatasetHelper, TaskTrace
 
 
 class FailedReason(Enum):
@@ -17,6 +26,43 @@ class FailedReason(Enum):
     REF_TRACE_NOT_FOUND = "reference trace not found"
     STEP_CHECK_FAILED = "step checking failed"
     UI_POSITIONS_NOT_FOUND = "ui positions not found"
+    WORKER_CRASHED = "evaluation worker crashed"
+    EVALUATION_ERROR = "evaluation raised an exception"
+
+
+def _failed_reason_str(failed_reason: Optional[Union[FailedReason, str]]) -> str:
+    # users may pass string or FailedReason enum as parameter
+    # accept and record both of them
+    if failed_reason is None:
+        return ""
+    if isinstance(failed_reason, FailedReason):
+        return failed_reason.value
+    return failed_reason
+
+
+# the copy of the evaluator used by a worker process, set by _init_worker
+_worker_evaluator: Optional["BaseEvaluator"] = None
+
+
+def _init_worker(evaluator: "BaseEvaluator") -> None:
+    global _worker_evaluator
+    _worker_evaluator = evaluator
+
+
+def _eval_episode_with(
+    evaluator: "BaseEvaluator", episode: str
+) -> Tuple[str, bool, str, Any]:
+    completeness, failed_reason = evaluator.eval_episode(episode)
+    return (
+        episode,
+        completeness,
+        _failed_reason_str(failed_reason),
+        evaluator.export_episode_stats(episode),
+    )
+
+
+def _eval_episode_in_worker(episode: str) -> Tuple[str, bool, str, Any]:
+    return _eval_episode_with(_worker_evaluator, episode)
 
 
 class BaseEvaluator(ABC):
@@ -35,15 +81,63 @@ class BaseEvaluator(ABC):
             epi_metadata_path=epi_metadata_path, gr_dataset_path=gr_dataset_path
         )
         self.episode_completion: Dict[str, Tuple[bool, str]] = {}
+        # ground-truth features of the episode being evaluated, set by
+        # MultiAgentEvaluator to share them with the evaluators of all agents
+        self.gr_features: Optional[GroundTruthFeatures] = None
+        # aggregated results of the last run_evaluation()
+        self.running_stats: Optional[RunningStats] = None
         # evaluation options: by default, all episodes will be evaluated
         #   - "categories": [TaskCategory.GENERAL, TaskCategory.GOOGLEAPPS, ...]
         #                 only evaluate episodes in target categories
         #   - "first_n": only evaluating the first_n episodes
         #   - "episodes": [episode_1, episode_2, ...]
         #                 only evaluate target episodes
+        #   - "jobs": number of worker processes evaluating episodes in
+        #                 parallel; the evaluator and its agent are pickled
+        #                 to each worker. Default: 1, no worker process
+        #   - "executor": a concurrent.futures.Executor used instead of the
+        #                 process pool created for "jobs"
+        #   - "trace_cache_max_entries", "trace_cache_max_bytes": budget of
+        #                 the loaded traces kept in memory. Default: 1024
+        #                 traces, no byte budget; None disables a budget
+        #   - "result_cache": path of the file caching results of evaluated
+        #                 episodes (see evaluator/result_cache.py), or True
+        #                 for ~/.cache/llamatouch/result_cache.sqlite.
+        #                 Default: False, no cache
+        #   - "result_cache_bypass": evaluate all episodes again and refresh
+        #                 their cached results. Default: False
+        #   - "journal": path of the JSONL file each episode result is
+        #                 appended to as soon as it is evaluated (see
+        #                 evaluator/run_journal.py), or True for
+        #                 dumped_stats/[evaluator_name]_[agent_name].jsonl.
+        #                 Default: False, no journal
+        #   - "resume": do not evaluate episodes recorded in the journal for
+        #                 the same evaluator, agent and options. Default: False
+        #   - "result_sink": path (or list of paths) of .jsonl, .csv or
+        #                 .parquet files each episode result is written to as
+        #                 soon as it is evaluated (see evaluator/result_sink.py)
+        #   - "human_eval_path", "only_human_eval_positive": human validation
+        #                 results that self.running_stats are computed against
+        #                 during the run, see report_stats()
         self.options = options if options else None
+        if self.options and (
+            "trace_cache_max_entries" in self.options
+            or "trace_cache_max_bytes" in self.options
+        ):
+            self.helper.trace_cache.resize(
+                self.options.get("trace_cache_max_entries", 1024),
+                self.options.get("trace_cache_max_bytes", None),
+            )
+        self.result_cache: Optional[ResultCache] = None
+        result_cache_path = (
+            self.options.get("result_cache", False) if self.options else False
+        )
+        if result_cache_path:
+            if result_cache_path is True:
+                result_cache_path = DEFAULT_CACHE_PATH
+            self.result_cache = ResultCache(result_cache_path)
 
-    def run_evaluation(self) -> None:
+    def get_target_episodes(self) -> List[str]:
         target_episodes = self.helper.get_all_episodes()
 
         if self.options:
@@ -58,30 +152,280 @@ class BaseEvaluator(ABC):
             elif "first_n" in self.options:
                 first_n = int(self.options["first_n"])
                 target_episodes = self.helper.get_all_episodes()[:first_n]
+        return target_episodes
 
-        for epi in target_episodes:
-            completeness, failed_reason = self.eval_episode(epi)
-            if failed_reason is not None:
-                # users may pass string or FailedReason enum as parameter
-                # accept and record both of them
-                failed_reason_str = (
-                    failed_reason.value
-                    if isinstance(failed_reason, FailedReason)
-                    else failed_reason
+    def prepare_evaluation(self, target_episodes: List[str]) -> None:
+        """Hook for evaluators to do bulk work for all target episodes before
+        they are evaluated one by one; no-op by default"""
+        pass
+
+    def add_groundtruth_features(self, features: GroundTruthFeatures) -> None:
+        """Hook for evaluators to add the ground-truth features they read
+        while self.gr_features is set (see evaluator/groundtruth_features.py);
+        no-op by default"""
+        pass
+
+    def get_groundtruth_features(self, episode: str) -> Optional[GroundTruthFeatures]:
+        if self.gr_features is not None and self.gr_features.episode == episode:
+            return self.gr_features
+        return None
+
+    def load_groundtruth_trace(self, episode: str) -> Optional[TaskTrace]:
+        """Ground-truth trace of an episode, from self.gr_features if set"""
+        gr_features = self.get_groundtruth_features(episode)
+        if gr_features is not None:
+            return gr_features.gr_trace
+        return self.helper.load_groundtruth_trace_by_episode(episode)
+
+    def get_journal(self) -> Optional[RunJournal]:
+        """Journal of this run configured by the "journal" option, or None"""
+        journal_path = self.options.get("journal", False) if self.options else False
+        if not journal_path:
+            return None
+        if journal_path is True:
+            journal_path = os.path.join(
+                "dumped_stats", f"{self.evaluator_name}_{self.agent.agent_name}.jsonl"
+            )
+        return RunJournal(
+            journal_path,
+            self.evaluator_name,
+            self.agent.agent_name,
+            self.get_result_options(),
+        )
+
+    def get_result_options(self) -> Optional[Dict]:
+        """Options identifying the results of this evaluator, in the keys of
+        cached results and the run of the journal; options that do not change
+        results are left out by result_cache.get_options_key"""
+        return self.options
+
+    def run_evaluation(self) -> None:
+        target_episodes = self.get_target_episodes()
+        results: Dict[str, Tuple[bool, str]] = {}
+        self.running_stats = RunningStats(
+            self.options.get("human_eval_path", None) if self.options else None,
+            (
+                self.options.get("only_human_eval_positive", False)
+                if self.options
+                else False
+            ),
+        )
+        sink_paths = self.options.get("result_sink", []) if self.options else []
+        if isinstance(sink_paths, str):
+            sink_paths = [sink_paths]
+        sinks: List[ResultSink] = []
+
+        def record(epi: str, completeness: bool, failed_reason: str) -> None:
+            results[epi] = (completeness, failed_reason)
+            self.running_stats.update(epi, completeness)
+            for sink in sinks:
+                sink.write(epi, completeness, failed_reason)
+            self.logger.info(
+                f"[{len(results)}/{len(target_episodes)}] "
+                f"{self.running_stats.snapshot()}"
+            )
+
+        journal = self.get_journal()
+        resume = self.options.get("resume", False) if self.options else False
+        try:
+            sinks.extend(open_result_sink(path) for path in sink_paths)
+            if journal is not None and resume:
+                recorded = journal.load()
+                for epi in target_episodes:
+                    if epi in recorded:
+                        completeness, failed_reason, episode_stats = recorded[epi]
+                        self.import_episode_stats(epi, episode_stats)
+                        record(epi, completeness, failed_reason)
+                self.logger.info(
+                    f"Resuming from {journal.journal_path}: "
+                    f"{len(results)}/{len(target_episodes)} episodes were evaluated"
                 )
-                self.episode_completion[epi] = (completeness, failed_reason_str)
-            else:
-                self.episode_completion[epi] = (completeness, "")
+            pending_episodes = [epi for epi in target_episodes if epi not in results]
+            self.prepare_evaluation(pending_episodes)
+
+            for epi, completeness, failed_reason in self.iter_episode_results(
+                pending_episodes
+            ):
+                if journal is not None:
+                    journal.append(
+                        epi,
+                        completeness,
+                        failed_reason,
+                        self._peek_episode_stats(epi),
+                    )
+                record(epi, completeness, failed_reason)
+        finally:
+            if journal is not None:
+                journal.close()
+            for sink in sinks:
+                sink.close()
+        # record results in the order of target episodes, whatever order
+        # they were evaluated in
+        for epi in target_episodes:
+            self.episode_completion[epi] = results[epi]
+        if self.result_cache is not None:
+            # hits and misses of worker processes are not counted
+            try:
+                self.logger.info(f"Result cache stats: {self.result_cache.stats()}")
+            except Exception as e:
+                self.logger.warning(f"Failed to read result cache stats: {e}")
+        self.finish_evaluation()
+
+    def finish_evaluation(self) -> None:
+        """Hook for evaluators to complete or summarize their statistics after
+        all target episodes are evaluated; no-op by default"""
+        pass
+
+    def iter_episode_results(
+        self, target_episodes: List[str]
+    ) -> Iterator[Tuple[str, bool, str]]:
+        """Evaluate target episodes and yield (episode, completeness,
+        failed_reason) of each episode as soon as it is evaluated.
+
+        With the "jobs" or "executor" option, episodes are evaluated in
+        parallel and yielded in completion order. A worker process that
+        crashes (e.g., killed for running out of memory) breaks the whole
+        pool; its unfinished episodes are then evaluated again one by one in
+        new workers, and the ones crashing again fail with
+        FailedReason.WORKER_CRASHED.
+        """
+        jobs = int(self.options.get("jobs", 1)) if self.options else 1
+        executor = self.options.get("executor", None) if self.options else None
+
+        if executor is not None:
+            futures = {
+                executor.submit(_eval_episode_with, self, epi): epi
+                for epi in target_episodes
+            }
+            crashed = yield from self._collect_results(futures)
+            for epi in crashed:
+                yield epi, False, FailedReason.WORKER_CRASHED.value
+            return
+
+        if jobs <= 1:
+            for epi in target_episodes:
+                completeness, failed_reason = self.eval_episode(epi)
+                yield epi, completeness, _failed_reason_str(failed_reason)
+            return
+
+        if not target_episodes:
+            return
+        crashed = yield from self._eval_in_process_pool(target_episodes, jobs)
+        for epi in crashed:
+            if (yield from self._eval_in_process_pool([epi], 1)):
+                yield epi, False, FailedReason.WORKER_CRASHED.value
+
+    def _eval_in_process_pool(
+        self, episodes: List[str], jobs: int
+    ) -> Generator[Tuple[str, bool, str], None, List[str]]:
+        # "spawn" does not inherit threads of the parent process (e.g., the
+        # thread pools of a loaded model), which may deadlock forked workers
+        with ProcessPoolExecutor(
+            max_workers=min(jobs, len(episodes)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self,),
+        ) as pool:
+            futures = {
+                pool.submit(_eval_episode_in_worker, epi): epi for epi in episodes
+            }
+            return (yield from self._collect_results(futures))
+
+    def _collect_results(
+        self, futures: Dict[Future, str]
+    ) -> Generator[Tuple[str, bool, str], None, List[str]]:
+        """Yield results of finished futures
+
+        Return:
+            episodes whose worker crashed
+        """
+        crashed: List[str] = []
+        for future in as_completed(futures):
+            epi = futures[future]
+            try:
+                _, completeness, failed_reason, episode_stats = future.result()
+            except BrokenExecutor:
+                crashed.append(epi)
+                continue
+            except Exception as e:
+                # e.g., the evaluator could not be pickled to the worker
+                self.logger.error(f"Failed to evaluate episode {epi}: {str(e)}")
+                yield epi, False, FailedReason.WORKER_CRASHED.value
+                continue
+            self.import_episode_stats(epi, episode_stats)
+            yield epi, completeness, failed_reason
+        return crashed
+
+    def export_episode_stats(self, episode: str) -> Any:
+        """Hook for evaluators to send per-episode statistics collected in a
+        worker back to the main process; None by default"""
+        return None
+
+    def import_episode_stats(self, episode: str, episode_stats: Any) -> None:
+        """Hook to merge statistics returned by export_episode_stats"""
+        pass
+
+    def _peek_episode_stats(self, episode: str) -> Any:
+        # exported and imported back, the statistics stay in this evaluator
+        episode_stats = self.export_episode_stats(episode)
+        self.import_episode_stats(episode, episode_stats)
+        return episode_stats
+
+    def get_episode_fingerprint(self, episode: str) -> str:
+        """Hash of the inputs of evaluating an episode, used to look up its
+        cached result: the ground-truth trace and the execution trace"""
+        gr_trace = self.load_groundtruth_trace(episode)
+        exec_trace = self.agent.load_exec_trace_by_episode(episode)
+        return ",".join(
+            [
+                self.result_cache.trace_fingerprint(gr_trace),
+                self.result_cache.trace_fingerprint(exec_trace),
+            ]
+        )
 
     def eval_episode(self, episode: str) -> Tuple[bool, Optional[FailedReason]]:
+        cache_key = None
+        if self.result_cache is not None:
+            try:
+                cache_key = self.result_cache.get_key(
+                    self.__class__.__name__,
+                    self.get_result_options(),
+                    episode,
+                    self.get_episode_fingerprint(episode),
+                )
+            except Exception as e:
+                self.logger.warning(
+                    f"Failed to look up the cached result of episode {episode}: {str(e)}"
+                )
+        bypass = (
+            self.options.get("result_cache_bypass", False) if self.options else False
+        )
+        if cache_key is not None and not bypass:
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                self.logger.info(f"Using the cached result of episode: {episode}")
+                completeness, failed_reason, episode_stats = cached
+                self.import_episode_stats(episode, episode_stats)
+                return completeness, failed_reason if failed_reason else None
+
         self.logger.info(f"Evaluating episode: {episode}")
         task_description = self.helper.get_task_description_by_episode(episode)
         try:
             ret = self.eval_impl(episode, task_description)
         except Exception as e:
             self.logger.error(f"Failed to evaluate episode {episode}: {str(e)}")
-            # TODO: add FailedReason for this case
-            return False, FailedReason.UI_POSITIONS_NOT_FOUND
+            return False, FailedReason.EVALUATION_ERROR
+
+        if cache_key is not None:
+            completeness, failed_reason = ret
+            self.result_cache.put(
+                cache_key,
+                self.__class__.__name__,
+                episode,
+                completeness,
+                _failed_reason_str(failed_reason),
+                self._peek_episode_stats(episode),
+            )
         return ret
 
     @abstractmethod
@@ -97,32 +441,23 @@ class BaseEvaluator(ABC):
         to_stdout: bool = False,
         suffix: str = "",
     ) -> None:
-        exec_dict = {
-            epi: completed for epi, (completed, _) in self.episode_completion.items()
-        }
-        exec_df = pd.DataFrame(exec_dict.items(), columns=["episode", "execution"])
+        # statistics kept during run_evaluation are reused when they were
+        # computed against the same human validation results
+        stats = self.running_stats
+        if (
+            stats is None
+            or not stats.matches(human_eval_path, only_human_eval_positive)
+            or stats.num_episodes != len(self.episode_completion)
+        ):
+            stats = RunningStats(human_eval_path, only_human_eval_positive)
+            for epi, (completed, _) in self.episode_completion.items():
+                stats.update(epi, completed)
+        print(stats.summary())
         if not human_eval_path:
-            exec_positive = (exec_df["execution"] == 1).sum()
-            exec_negative = (exec_df["execution"] == 0).sum()
-            print(f"Completed tasks: {exec_positive}, failed tasks: {exec_negative}")
             self._dump_stats(to_stdout=to_stdout)
         else:
-            with open(human_eval_path, "r") as f:
-                human_df = pd.read_csv(f)
-            eval_df = human_df.merge(exec_df, on="episode", how="inner")
-            if only_human_eval_positive:
-                eval_df = eval_df[eval_df[eval_df.columns[1]] == 1]
-            total = eval_df.shape[0]
-            if only_human_eval_positive and total < 1:
-                total = 1
-
-            human_positive = (eval_df[eval_df.columns[1]] == 1).sum()
-            exec_positive = (eval_df["execution"] == 1).sum()
-            exec_negative = total - exec_positive
-            print(f"Completed tasks: {exec_positive}, failed tasks: {exec_negative}")
-            tp = (eval_df[eval_df.columns[1]] == eval_df["execution"]).sum()
             self._dump_stats(
-                metric=(total, human_positive, exec_positive, tp),
+                metric=stats.metric(),
                 to_stdout=to_stdout,
                 suffix=suffix,
             )
@@ -140,7 +475,7 @@ class BaseEvaluator(ABC):
 
         if to_stdout:
             print("".join(stats))
-            exit(0)
+            return
 
         if metric:
             total, human_positive, exec_positive, tp = metric
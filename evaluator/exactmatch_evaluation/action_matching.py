@@ -245,3 +245,290 @@ def check_actions_match(
             jnp.logical_or(taps_match, drags_match),
         ),
     )
+
+
+def stack_actions(actions):
+    """Columns of a list of actions for the batched checks below.
+
+    Args:
+      actions: A list of n Actions; entries that are None or not actions are
+        invalid.
+
+    Returns:
+      touch_yx: A float array of shape (n, 2), touch points of the actions.
+      lift_yx: A float array of shape (n, 2), lift points of the actions.
+      action_types: An int array of shape (n,), ActionType values of the
+        actions.
+      valid: A bool array of shape (n,), whether each action is valid.
+    """
+    num_actions = len(actions)
+    touch_yx = np.full((num_actions, 2), -1.0)
+    lift_yx = np.full((num_actions, 2), -1.0)
+    action_types = np.full(num_actions, -1, dtype=np.int64)
+    valid = np.zeros(num_actions, dtype=bool)
+    for i, action in enumerate(actions):
+        try:
+            touch_yx[i] = action.touch_point_yx
+            lift_yx[i] = action.lift_point_yx
+            action_types[i] = ActionType(action.action_type).value
+        except Exception:
+            continue
+        valid[i] = True
+    return touch_yx, lift_yx, action_types, valid
+
+
+def pad_annotation_positions(annotation_positions_list):
+    """Pad the annotation positions of several screens to the same number of
+    bounding boxes.
+
+    Args:
+      annotation_positions_list: A list of n arrays of shape (num_bboxes, 4);
+        empty arrays stand for screens without annotations.
+
+    Returns:
+      annotation_positions: A float array of shape (n, max_num_bboxes, 4).
+      annotation_mask: A bool array of shape (n, max_num_bboxes), False for
+        padded bounding boxes.
+    """
+    positions_list = [
+        np.asarray(positions, dtype=float).reshape(-1, 4)
+        for positions in annotation_positions_list
+    ]
+    max_num_bboxes = max([len(positions) for positions in positions_list] + [0])
+    annotation_positions = np.zeros((len(positions_list), max_num_bboxes, 4))
+    annotation_mask = np.zeros((len(positions_list), max_num_bboxes), dtype=bool)
+    for i, positions in enumerate(positions_list):
+        annotation_positions[i, : len(positions)] = positions
+        annotation_mask[i, : len(positions)] = True
+    return annotation_positions, annotation_mask
+
+
+def _as_padded_annotation_positions(annotation_positions, annotation_mask, num_actions):
+    """Padded annotation positions of shape (num_actions, num_bboxes, 4) and
+    their mask, from either a padded array or a list of ragged arrays."""
+    if isinstance(annotation_positions, (list, tuple)):
+        assert annotation_mask is None, "Ragged annotation positions are not masked"
+        annotation_positions, annotation_mask = pad_annotation_positions(
+            annotation_positions
+        )
+    annotation_positions = np.asarray(annotation_positions, dtype=float)
+    assert annotation_positions.shape[:1] == (num_actions,) and (
+        annotation_positions.shape[2:] == (4,)
+    ), f"Expected annotation positions of shape ({num_actions}, num_bboxes, 4)"
+    if annotation_mask is None:
+        annotation_mask = np.ones(annotation_positions.shape[:2], dtype=bool)
+    return annotation_positions, np.asarray(annotation_mask, dtype=bool)
+
+
+def _resized_annotation_bounds(
+    annotation_positions,
+    annotation_width_augment_fraction,
+    annotation_height_augment_fraction,
+):
+    """(top, bottom, left, right) of the bounding boxes of an array of shape
+    (..., num_bboxes, 4), resized as _resize_annotation_bounding_boxes."""
+    height_change = annotation_height_augment_fraction * annotation_positions[..., 2]
+    width_change = annotation_width_augment_fraction * annotation_positions[..., 3]
+    top = np.maximum(0, annotation_positions[..., 0] - (height_change / 2))
+    left = np.maximum(0, annotation_positions[..., 1] - (width_change / 2))
+    bottom = top + np.minimum(1, annotation_positions[..., 2] + height_change)
+    right = left + np.minimum(1, annotation_positions[..., 3] + width_change)
+    return top, bottom, left, right
+
+
+def _check_actions_match_broadcast(
+    action_1_touch_yx,
+    action_1_lift_yx,
+    action_1_action_type,
+    action_2_touch_yx,
+    action_2_lift_yx,
+    action_2_action_type,
+    annotation_bounds,
+    annotation_mask,
+    tap_distance_threshold,
+):
+    """check_actions_match over arrays of actions broadcast against each other.
+
+    Points have shape (..., 2), action types shape (...), and the resized
+    annotation bounds and mask shape (..., num_bboxes), where the leading
+    dimensions of all arguments are broadcastable to the shape of the result.
+    """
+    has_non_dual_point_action = np.logical_or(
+        action_1_action_type != ActionType.DUAL_POINT.value,
+        action_2_action_type != ActionType.DUAL_POINT.value,
+    )
+    is_tap_1 = (
+        np.linalg.norm(action_1_touch_yx - action_1_lift_yx, axis=-1)
+        <= _SWIPE_DISTANCE_THRESHOLD
+    )
+    is_tap_2 = (
+        np.linalg.norm(action_2_touch_yx - action_2_lift_yx, axis=-1)
+        <= _SWIPE_DISTANCE_THRESHOLD
+    )
+    different_dual_point_types = np.logical_xor(is_tap_1, is_tap_2)
+    is_tap = np.logical_and(is_tap_1, is_tap_2)
+
+    top, bottom, left, right = annotation_bounds
+
+    def yx_in_bounding_boxes(yx):
+        y, x = yx[..., 0:1], yx[..., 1:2]
+        return (y >= top) & (y <= bottom) & (x >= left) & (x <= right)
+
+    both_in_box = np.any(
+        yx_in_bounding_boxes(action_1_touch_yx)
+        & yx_in_bounding_boxes(action_2_touch_yx)
+        & annotation_mask,
+        axis=-1,
+    )
+    within_threshold = (
+        np.linalg.norm(action_1_touch_yx - action_2_touch_yx, axis=-1)
+        <= tap_distance_threshold
+    )
+    taps_match = np.logical_and(is_tap, np.logical_or(both_in_box, within_threshold))
+
+    drags_match = np.equal(
+        np.argmax(np.abs(action_1_lift_yx - action_1_touch_yx), axis=-1),
+        np.argmax(np.abs(action_2_lift_yx - action_2_touch_yx), axis=-1),
+    )
+    drags_match = np.where(is_tap, False, drags_match)
+
+    match = np.where(
+        has_non_dual_point_action,
+        np.equal(action_1_action_type, action_2_action_type),
+        np.where(
+            different_dual_point_types,
+            False,
+            np.logical_or(taps_match, drags_match),
+        ),
+    )
+    # check_actions_match fails on an empty annotation set
+    return match & np.any(annotation_mask, axis=-1)
+
+
+def check_actions_match_batch(
+    actions_1_touch_yx,
+    actions_1_lift_yx,
+    actions_1_action_type,
+    actions_2_touch_yx,
+    actions_2_lift_yx,
+    actions_2_action_type,
+    annotation_positions,
+    annotation_mask=None,
+    tap_distance_threshold=_TAP_DISTANCE_THRESHOLD,
+    annotation_width_augment_fraction=ANNOTATION_WIDTH_AUGMENT_FRACTION,
+    annotation_height_augment_fraction=ANNOTATION_HEIGHT_AUGMENT_FRACTION,
+):
+    """check_actions_match on N pairs of actions, each pair with its own
+    annotation positions, in a few array operations over all pairs.
+
+    Args:
+      actions_1_touch_yx: A float array of shape (N, 2), the (y, x) coordinates
+        of the first actions' touches.
+      actions_1_lift_yx: A float array of shape (N, 2), the (y, x) coordinates
+        of the first actions' lifts.
+      actions_1_action_type: An int array of shape (N,), the ActionType values
+        of the first actions.
+      actions_2_touch_yx: Same as actions_1_touch_yx, for the second actions.
+      actions_2_lift_yx: Same as actions_1_lift_yx, for the second actions.
+      actions_2_action_type: Same as actions_1_action_type, for the second
+        actions.
+      annotation_positions: The positions of the UI annotations for the screen
+        of each pair; either a list of N arrays of shape (num_bboxes, 4), or a
+        float array of shape (N, max_num_bboxes, 4) padded as
+        pad_annotation_positions.
+      annotation_mask: A bool array of shape (N, max_num_bboxes), False for
+        padded bounding boxes. Default: no padding.
+      tap_distance_threshold: See check_actions_match.
+      annotation_width_augment_fraction: See check_actions_match.
+      annotation_height_augment_fraction: See check_actions_match.
+
+    Returns:
+      A bool array of shape (N,) whose i-th element represents whether the
+      actions of the i-th pair are the same. Pairs whose screen has no
+      annotation do not match, as check_actions_match fails on an empty
+      annotation set.
+    """
+    touch_1 = np.asarray(actions_1_touch_yx, dtype=float).reshape(-1, 2)
+    annotation_positions, annotation_mask = _as_padded_annotation_positions(
+        annotation_positions, annotation_mask, len(touch_1)
+    )
+    return _check_actions_match_broadcast(
+        touch_1,
+        np.asarray(actions_1_lift_yx, dtype=float).reshape(-1, 2),
+        np.asarray(actions_1_action_type),
+        np.asarray(actions_2_touch_yx, dtype=float).reshape(-1, 2),
+        np.asarray(actions_2_lift_yx, dtype=float).reshape(-1, 2),
+        np.asarray(actions_2_action_type),
+        _resized_annotation_bounds(
+            annotation_positions,
+            annotation_width_augment_fraction,
+            annotation_height_augment_fraction,
+        ),
+        annotation_mask,
+        tap_distance_threshold,
+    )
+
+
+def check_actions_match_matrix(
+    actions_1_touch_yx,
+    actions_1_lift_yx,
+    actions_1_action_type,
+    actions_2_touch_yx,
+    actions_2_lift_yx,
+    actions_2_action_type,
+    annotation_positions,
+    annotation_mask=None,
+    tap_distance_threshold=_TAP_DISTANCE_THRESHOLD,
+    annotation_width_augment_fraction=ANNOTATION_WIDTH_AUGMENT_FRACTION,
+    annotation_height_augment_fraction=ANNOTATION_HEIGHT_AUGMENT_FRACTION,
+):
+    """check_actions_match on every pair of M first actions and N second
+    actions, in a few array operations over all pairs.
+
+    Args:
+      actions_1_touch_yx: A float array of shape (M, 2), the (y, x) coordinates
+        of the first actions' touches.
+      actions_1_lift_yx: A float array of shape (M, 2), the (y, x) coordinates
+        of the first actions' lifts.
+      actions_1_action_type: An int array of shape (M,), the ActionType values
+        of the first actions.
+      actions_2_touch_yx: Same as actions_1_touch_yx, of shape (N, 2).
+      actions_2_lift_yx: Same as actions_1_lift_yx, of shape (N, 2).
+      actions_2_action_type: Same as actions_1_action_type, of shape (N,).
+      annotation_positions: The positions of the UI annotations for the screen
+        of each first action; either a list of M arrays of shape
+        (num_bboxes, 4), or a float array of shape (M, max_num_bboxes, 4)
+        padded as pad_annotation_positions.
+      annotation_mask: A bool array of shape (M, max_num_bboxes), False for
+        padded bounding boxes. Default: no padding.
+      tap_distance_threshold: See check_actions_match.
+      annotation_width_augment_fraction: See check_actions_match.
+      annotation_height_augment_fraction: See check_actions_match.
+
+    Returns:
+      A bool array of shape (M, N) whose element (i, j) represents whether the
+      i-th first action and the j-th second action are the same. First actions
+      whose screen has no annotation match no action.
+    """
+    touch_1 = np.asarray(actions_1_touch_yx, dtype=float).reshape(-1, 2)
+    annotation_positions, annotation_mask = _as_padded_annotation_positions(
+        annotation_positions, annotation_mask, len(touch_1)
+    )
+    # the boxes of a screen are resized once, and broadcast over second
+    # actions along axis 1
+    top, bottom, left, right = _resized_annotation_bounds(
+        annotation_positions,
+        annotation_width_augment_fraction,
+        annotation_height_augment_fraction,
+    )
+    return _check_actions_match_broadcast(
+        touch_1[:, None, :],
+        np.asarray(actions_1_lift_yx, dtype=float).reshape(-1, 1, 2),
+        np.asarray(actions_1_action_type)[:, None],
+        np.asarray(actions_2_touch_yx, dtype=float).reshape(1, -1, 2),
+        np.asarray(actions_2_lift_yx, dtype=float).reshape(1, -1, 2),
+        np.asarray(actions_2_action_type)[None, :],
+        (top[:, None, :], bottom[:, None, :], left[:, None, :], right[:, None, :]),
+        annotation_mask[:, None, :],
+        tap_distance_threshold,
+    )
@@ -0,0 +1,86 @@
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .. import trace_storage
+from ..groundtruth_features import GroundTruthFeatures
+from ..utils.vh_simplify import extract_ui_positions_from_vh
+
+
+class UIPositionsMixin:
+    """Normalized UI positions of screens, extracted from view hierarchies,
+    for evaluators matching actions like AITW (ExactMatchEvaluator and
+    LCSMatchEvaluator).
+
+    UI positions of ground-truth screens are read from self.gr_features when
+    set. Otherwise, they are extracted again, unless ui_positions_cache is set.
+    """
+
+    # UI positions extracted from view hierarchies: (vh_path, screen_size)
+    # -> positions; set by CompositeEvaluator to share them with other
+    # evaluators of the same episode
+    ui_positions_cache: Optional[Dict[Tuple, np.ndarray]] = None
+
+    def add_groundtruth_features(self, features: GroundTruthFeatures) -> None:
+        # UI positions of all ground-truth screens; screens whose positions
+        # cannot be extracted fail when evaluating the episode
+        for ui_state in features.gr_trace or []:
+            try:
+                cache_key = (ui_state.vh_path, tuple(ui_state.screen_size))
+                if cache_key in features.ui_positions:
+                    continue
+                ui_positions = self._normalized_ui_positions(*cache_key)
+            except Exception:
+                continue
+            # shared read-only by the evaluators of all agents
+            ui_positions.flags.writeable = False
+            features.ui_positions[cache_key] = ui_positions
+
+    def extract_ui_positions_from_vh(
+        self,
+        screenshot_path: str,
+        vh_path: str,
+        screen_size: Optional[Tuple[int, int]] = None,
+    ) -> np.ndarray[np.ndarray]:
+        """Extract UI positions used for evaluation from view hierarchy
+
+        Args:
+            screenshot_path: path to the screenshot; used to get (width, height)
+            vh_path: path to the view hierarchy file
+            screen_size: (width, height) of the screenshot, if already known
+
+        Return:
+            normalized_ui_positions: [
+                [y, x, height, width],
+                [y, x, height, width],
+                [y, x, height, width],
+                ...
+            ]
+        """
+        if screen_size is None:
+            with trace_storage.open_image(screenshot_path) as img:
+                screen_size = img.size
+        cache_key = (vh_path, tuple(screen_size))
+        if self.gr_features is not None and cache_key in self.gr_features.ui_positions:
+            return self.gr_features.ui_positions[cache_key]
+        if self.ui_positions_cache is not None and cache_key in self.ui_positions_cache:
+            return self.ui_positions_cache[cache_key]
+        ui_positions = self._normalized_ui_positions(vh_path, screen_size)
+        if self.ui_positions_cache is not None:
+            # shared read-only by all evaluators
+            ui_positions.flags.writeable = False
+            self.ui_positions_cache[cache_key] = ui_positions
+        return ui_positions
+
+    def _normalized_ui_positions(
+        self, vh_path: str, screen_size: Tuple[int, int]
+    ) -> np.ndarray[np.ndarray]:
+        screen_width, screen_height = screen_size
+        ui_positions = extract_ui_positions_from_vh(vh_path).astype(float)
+        self.logger.debug(f"extracting {len(ui_positions)} UI positions from {vh_path}")
+        if len(ui_positions) == 0:
+            return np.array([])
+        # normalize every single np.ndarray in ui_positions according to w, h
+        ui_positions[:, [0, 2]] /= screen_height
+        ui_positions[:, [1, 3]] /= screen_width
+        return ui_positions
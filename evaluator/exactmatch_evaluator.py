@@ -1,19 +1,24 @@
 import logging
 from collections import defaultdict
-from typing import Dict, Optional, Tuple
+from typing import Dict, Optional, Tuple, Union
 
 import numpy as np
-from PIL import Image
 
 from evaluator.agent import MobileAgent
 
 from .evaluator import BaseEvaluator, FailedReason
-from .exactmatch_evaluation.action_matching import check_actions_match
+from .exactmatch_evaluation.action_matching import (
+    check_actions_match_batch,
+    stack_actions,
+)
+from .exactmatch_evaluation.ui_positions import UIPositionsMixin
 from .task_trace import get_all_actions, get_all_screenshot_paths, get_all_vh_paths
-from .utils.vh_simplify import extract_ui_positions_from_vh
 
+# number of steps checked in the first batch; each next batch is twice larger
+_FIRST_STEP_CHUNK_SIZE = 4
 
-class ExactMatchEvaluator(BaseEvaluator):
+
+class ExactMatchEvaluator(UIPositionsMixin, BaseEvaluator):
     def __del__(self):
         for epi, n in self.epi_to_num_correct_action.items():
             print(f"{epi} has {n} correct actions")
@@ -30,11 +35,30 @@ class ExactMatchEvaluator(BaseEvaluator):
         self.logger = logging.getLogger(self.evaluator_name)
         self.epi_to_num_correct_action = defaultdict(int)
 
+    def export_episode_stats(self, episode: str) -> Optional[int]:
+        # popped, so that the copy in a worker does not print it again
+        return self.epi_to_num_correct_action.pop(episode, None)
+
+    def import_episode_stats(self, episode: str, episode_stats: Optional[int]) -> None:
+        if episode_stats is not None:
+            self.epi_to_num_correct_action[episode] = episode_stats
+
+    def get_episode_fingerprint(self, episode: str) -> str:
+        # only predicted actions of the agent are compared
+        gr_trace = self.load_groundtruth_trace(episode)
+        predicted_actions = self.agent.load_predicted_action_by_episode(episode)
+        return ",".join(
+            [
+                self.result_cache.trace_fingerprint(gr_trace),
+                self.result_cache.actions_fingerprint(predicted_actions),
+            ]
+        )
+
     def eval_impl(
         self, episode, task_description
-    ) -> Tuple[bool, Optional[FailedReason]]:
+    ) -> Tuple[bool, Optional[Union[FailedReason, str]]]:
         """Exact match evaluation using self-defined trace"""
-        gr_trace = self.helper.load_groundtruth_trace_by_episode(episode)
+        gr_trace = self.load_groundtruth_trace(episode)
         if not gr_trace:
             return False, FailedReason.GR_TRACE_NOT_FOUND
         screenshot_paths = get_all_screenshot_paths(gr_trace)
@@ -48,69 +72,60 @@ class ExactMatchEvaluator(BaseEvaluator):
         # print(gr_actions[-1])
         # print(agent_predicted_actions[-1])
 
-        for i, gr_action in enumerate(gr_actions):
-            if i >= len(agent_predicted_actions):
-                return False, FailedReason.STEP_CHECK_FAILED.value + f" on step {i}"
-            real_action = agent_predicted_actions[i]
-            try:
-                ui_positions = self.extract_ui_positions_from_vh(
-                    screenshot_paths[i], vh_paths[i]
-                )
-            except:
-                print(f"failed to extract ui positions from file: {vh_paths[i]}")
-                return False, FailedReason.UI_POSITIONS_NOT_FOUND
-            if len(ui_positions) == 0:
-                return False, FailedReason.UI_POSITIONS_NOT_FOUND
+        # steps are checked in chunks of growing size, so that an episode
+        # failing at an early step only extracts the UI positions of its
+        # first screens
+        num_steps = min(len(gr_actions), len(agent_predicted_actions))
+        chunk_start, chunk_size = 0, _FIRST_STEP_CHUNK_SIZE
+        while chunk_start < num_steps:
+            chunk_end = min(chunk_start + chunk_size, num_steps)
+            # UI positions of the chunk, up to the first screen without them
+            ui_positions_list = []
+            for i in range(chunk_start, chunk_end):
+                try:
+                    ui_positions = self.extract_ui_positions_from_vh(
+                        screenshot_paths[i], vh_paths[i], gr_trace[i].screen_size
+                    )
+                except:
+                    print(f"failed to extract ui positions from file: {vh_paths[i]}")
+                    break
+                if len(ui_positions) == 0:
+                    break
+                ui_positions_list.append(ui_positions)
+            checked_end = chunk_start + len(ui_positions_list)
+
+            gr_touch_yx, gr_lift_yx, gr_action_types, gr_valid = stack_actions(
+                gr_actions[chunk_start:checked_end]
+            )
+            exec_touch_yx, exec_lift_yx, exec_action_types, exec_valid = stack_actions(
+                agent_predicted_actions[chunk_start:checked_end]
+            )
+            step_matched = check_actions_match_batch(
+                gr_touch_yx,
+                gr_lift_yx,
+                gr_action_types,
+                exec_touch_yx,
+                exec_lift_yx,
+                exec_action_types,
+                ui_positions_list,
+            )
+            step_matched &= gr_valid & exec_valid
 
-            if not self.check_action_match_like_AITW(
-                gr_action, real_action, ui_positions
-            ):
-                return False, FailedReason.STEP_CHECK_FAILED.value + f" on step {i}"
-            else:
+            # the first failed step of the chunk is reported
+            num_correct_action = int(np.argmin(np.append(step_matched, False)))
+            for i in range(chunk_start, chunk_start + num_correct_action):
                 self.epi_to_num_correct_action[episode] += 1
                 print(f"step{i} passed")
-        return True, None
+            if chunk_start + num_correct_action < checked_end:
+                return (
+                    False,
+                    FailedReason.STEP_CHECK_FAILED.value
+                    + f" on step {chunk_start + num_correct_action}",
+                )
+            if checked_end < chunk_end:
+                return False, FailedReason.UI_POSITIONS_NOT_FOUND
+            chunk_start, chunk_size = chunk_end, chunk_size * 2
 
-    def check_action_match_like_AITW(
-        self, gr_action, exec_action, ui_positions
-    ) -> bool:
-        try:
-            check_match = check_actions_match(
-                gr_action.touch_point_yx,
-                gr_action.lift_point_yx,
-                gr_action.action_type,
-                exec_action.touch_point_yx,
-                exec_action.lift_point_yx,
-                exec_action.action_type,
-                ui_positions,
-            )
-        except Exception as e:
-            check_match = False
-        return check_match
-
-    def extract_ui_positions_from_vh(
-        self, screenshot_path: str, vh_path: str
-    ) -> np.ndarray[np.ndarray]:
-        """Extract UI positions used for evaluation from view hierarchy
-
-        Args:
-            screenshot_path: path to the screenshot; used to get (width, height)
-            vh_path: path to the view hierarchy file
-
-        Return:
-            normalized_ui_positions: [
-                [y, x, height, width],
-                [y, x, height, width],
-                [y, x, height, width],
-                ...
-            ]
-        """
-        screen_width, screen_height = Image.open(screenshot_path).size
-        ui_positions = extract_ui_positions_from_vh(vh_path).astype(float)
-        print(f"extracting {len(ui_positions)} UI positions from {vh_path}")
-        if len(ui_positions) == 0:
-            return np.array([])
-        # normalize every single np.ndarray in ui_positions according to w, h
-        ui_positions[:, [0, 2]] /= screen_height
-        ui_positions[:, [1, 3]] /= screen_width
-        return ui_positions
+        if num_steps < len(gr_actions):
+            return False, FailedReason.STEP_CHECK_FAILED.value + f" on step {num_steps}"
+        return True, None
@@ -0,0 +1,44 @@
+"""Features of the ground-truth trace of an episode, shared by evaluators.
+
+Part of the work of evaluating an episode only depends on its ground-truth
+trace: loading the trace and its .ess annotations, simplifying and embedding
+the views compared by screen-level fuzzy match, extracting the UI positions
+of its screens, and hashing the image patches of annotated UI components.
+GroundTruthFeatures keeps the results of this work for one episode.
+
+Evaluators add the features they need in
+BaseEvaluator.add_groundtruth_features() and read them while
+BaseEvaluator.gr_features is set, so that MultiAgentEvaluator does the
+ground-truth work of an episode once, whatever the number of agents it
+evaluates.
+"""
+
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from imagehash import ImageHash
+
+from .task_trace import TaskTrace
+
+
+class GroundTruthFeatures:
+    def __init__(self, episode: str, gr_trace: Optional[TaskTrace]) -> None:
+        self.episode = episode
+        # with its essential states and annotated UI nodes loaded
+        self.gr_trace = gr_trace
+        # (vh_path, screen_size) -> normalized UI positions, read-only
+        self.ui_positions: Dict[Tuple, np.ndarray] = {}
+        # index of a UIState annotated with fuzzy<-1> -> embedding of its
+        # simplified views
+        self.view_embeddings: Dict[int, np.ndarray] = {}
+        # (index of a UIState, id of an annotated UI node) -> average hash of
+        # the image patch of the node
+        self.patch_hashes: Dict[Tuple[int, int], ImageHash] = {}
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "ui_states": len(self.gr_trace) if self.gr_trace else 0,
+            "ui_positions": len(self.ui_positions),
+            "view_embeddings": len(self.view_embeddings),
+            "patch_hashes": len(self.patch_hashes),
+        }
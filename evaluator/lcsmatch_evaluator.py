@@ -1,24 +1,56 @@
 import logging
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Union
 
 import numpy as np
-from PIL import Image
 
 from evaluator.agent import MobileAgent
 
 from .common.action_type import Action
 from .evaluator import BaseEvaluator, FailedReason
-from .exactmatch_evaluation.action_matching import check_actions_match
-from .task_trace import (
-    TaskTrace,
-    get_all_actions,
-    get_all_screenshot_paths,
-    get_all_vh_paths,
+from .exactmatch_evaluation.action_matching import (
+    check_actions_match_matrix,
+    pad_annotation_positions,
+    stack_actions,
 )
-from .utils.vh_simplify import extract_ui_positions_from_vh
+from .exactmatch_evaluation.ui_positions import UIPositionsMixin
+from .task_trace import TaskTrace, get_all_actions
 
 
-class LCSMatchEvaluator(BaseEvaluator):
+def longest_common_subsequence(
+    match: np.ndarray,
+) -> Tuple[int, List[Tuple[int, int]]]:
+    """Longest common subsequence of two sequences whose elements i and j
+    match if match[i][j]
+
+    Return:
+        length of the LCS, and the pairs (i, j) of matched elements in the
+        LCS, in increasing order
+    """
+    num_rows, num_columns = match.shape
+    # f[i][j]: LCS of the first i and the first j elements
+    f = np.zeros(shape=(num_rows + 1, num_columns + 1), dtype=np.int32)
+    for i in range(num_rows):
+        # f[i + 1][j + 1] = max(f[i][j + 1], f[i][j] + 1 if matched,
+        # f[i + 1][j]); the last term is a running maximum along the row
+        f[i + 1, 1:] = np.maximum.accumulate(
+            np.maximum(f[i, 1:], np.where(match[i], f[i, :-1] + 1, 0))
+        )
+
+    alignment: List[Tuple[int, int]] = []
+    i, j = num_rows, num_columns
+    while i > 0 and j > 0:
+        if match[i - 1][j - 1] and f[i][j] == f[i - 1][j - 1] + 1:
+            alignment.append((i - 1, j - 1))
+            i, j = i - 1, j - 1
+        elif f[i - 1][j] >= f[i][j - 1]:
+            i -= 1
+        else:
+            j -= 1
+    alignment.reverse()
+    return int(f[num_rows][num_columns]), alignment
+
+
+class LCSMatchEvaluator(UIPositionsMixin, BaseEvaluator):
     """
     Evaluate the task completion by calculating the Longest Common Subsequence
     (LCS) of the ground-truth trace and the task execution trace by testbed.
@@ -34,12 +66,24 @@ class LCSMatchEvaluator(BaseEvaluator):
         super().__init__(agent, epi_metadata_path, gr_dataset_path, options)
         self.evaluator_name = self.__class__.__name__
         self.logger = logging.getLogger(self.evaluator_name)
+        # episode -> pairs of (ground-truth step, executed step) in the LCS
+        self.epi_to_alignment: Dict[str, List[Tuple[int, int]]] = {}
         logging.getLogger().setLevel(logging.INFO)
 
+    def export_episode_stats(self, episode: str) -> Optional[List[Tuple[int, int]]]:
+        # popped, so that alignments of a worker are only kept once
+        return self.epi_to_alignment.pop(episode, None)
+
+    def import_episode_stats(
+        self, episode: str, episode_stats: Optional[List[Tuple[int, int]]]
+    ) -> None:
+        if episode_stats is not None:
+            self.epi_to_alignment[episode] = [tuple(pair) for pair in episode_stats]
+
     def eval_impl(
         self, episode, task_description
-    ) -> Tuple[bool, Optional[FailedReason]]:
-        gr_trace: TaskTrace = self.helper.load_groundtruth_trace_by_episode(episode)
+    ) -> Tuple[bool, Optional[Union[FailedReason, str]]]:
+        gr_trace: TaskTrace = self.load_groundtruth_trace(episode)
         if not gr_trace:
             return False, FailedReason.GR_TRACE_NOT_FOUND
         try:
@@ -59,83 +103,49 @@ class LCSMatchEvaluator(BaseEvaluator):
             print("Failed to extract ui positions")
             return False, FailedReason.UI_POSITIONS_NOT_FOUND
 
-        MAX_STEPS = 30
-        f = np.zeros(shape=(MAX_STEPS + 5, MAX_STEPS + 5), dtype=np.int32)
-        # i: index of ground truth trace
-        for i in range(0, len(gt_actions)):
-            # j: index of execution trace
-            for j in range(0, len(exec_actions)):
-                if j > 0:
-                    f[i][j] = max(f[i][j], f[i][j - 1])
-                if i > 0:
-                    f[i][j] = max(f[i][j], f[i - 1][j])
-                if self.check_action_match_like_AITW(
-                    gt_actions[i], exec_actions[j], gt_ui_positions[i]
-                ):
-                    if i > 0 and j > 0:
-                        f[i][j] = max(f[i][j], f[i - 1][j - 1] + 1)
-                    else:
-                        f[i][j] = max(f[i][j], 1)
+        gt_touch_yx, gt_lift_yx, gt_action_types, gt_valid = stack_actions(gt_actions)
+        exec_touch_yx, exec_lift_yx, exec_action_types, exec_valid = stack_actions(
+            exec_actions
+        )
+        annotation_positions, annotation_mask = pad_annotation_positions(
+            gt_ui_positions
+        )
+        # match[i][j]: whether the i-th ground-truth action and the j-th
+        # executed action match, checked against the UI positions of the i-th
+        # ground-truth screen
+        match = check_actions_match_matrix(
+            gt_touch_yx,
+            gt_lift_yx,
+            gt_action_types,
+            exec_touch_yx,
+            exec_lift_yx,
+            exec_action_types,
+            annotation_positions,
+            annotation_mask,
+        )
+        match &= gt_valid[:, None] & exec_valid[None, :]
+
+        lcs, alignment = longest_common_subsequence(match)
+        self.epi_to_alignment[episode] = alignment
         self.logger.info(
-            f"episode = {episode}, LCS = {f[len(gt_actions) - 1][len(exec_actions) - 1]}"
+            f"episode = {episode}, LCS = {lcs}, alignment (gt step, exec step) = {alignment}"
         )
+        if lcs == len(gt_actions):
+            return True, None
         return (
-            int(f[len(gt_actions) - 1][len(exec_actions) - 1]) == len(gt_actions),
-            FailedReason.STEP_CHECK_FAILED,
+            False,
+            FailedReason.STEP_CHECK_FAILED.value
+            + f", {lcs} of {len(gt_actions)} steps matched",
         )
 
     def _get_all_actions_uipositions(
         self, trace: TaskTrace
     ) -> Tuple[List[Action], List[np.ndarray[np.ndarray]]]:
         actions = get_all_actions(trace)
-        screenshot_paths = get_all_screenshot_paths(trace)
-        vh_paths = get_all_vh_paths(trace)
         ui_positions = [
-            self.extract_ui_positions_from_vh(screenshot_path, vh_path)
-            for screenshot_path, vh_path in zip(screenshot_paths, vh_paths)
+            self.extract_ui_positions_from_vh(
+                ui_state.screenshot_path, ui_state.vh_path, ui_state.screen_size
+            )
+            for ui_state in trace
         ]
         return actions, ui_positions
-
-    def check_action_match_like_AITW(
-        self, gr_action, exec_action, ui_positions
-    ) -> bool:
-        try:
-            check_match = check_actions_match(
-                gr_action.touch_point_yx,
-                gr_action.lift_point_yx,
-                gr_action.action_type,
-                exec_action.touch_point_yx,
-                exec_action.lift_point_yx,
-                exec_action.action_type,
-                ui_positions,
-            )
-        except Exception as e:
-            check_match = False
-        return check_match
-
-    def extract_ui_positions_from_vh(
-        self, screenshot_path: str, vh_path: str
-    ) -> np.ndarray[np.ndarray]:
-        """Extract UI positions used for evaluation from view hierarchy
-
-        Args:
-            screenshot_path: path to the screenshot; used to get (width, height)
-            vh_path: path to the view hierarchy file
-
-        Return:
-            normalized_ui_positions: [
-                [y, x, height, width],
-                [y, x, height, width],
-                [y, x, height, width],
-                ...
-            ]
-        """
-        screen_width, screen_height = Image.open(screenshot_path).size
-        ui_positions = extract_ui_positions_from_vh(vh_path).astype(float)
-        # print(f"extracting {len(ui_positions)} UI positions from {vh_path}")
-        if len(ui_positions) == 0:
-            return np.array([])
-        # normalize every single np.ndarray in ui_positions according to w, h
-        ui_positions[:, [0, 2]] /= screen_height
-        ui_positions[:, [1, 3]] /= screen_width
-        return ui_positions
@@ -0,0 +1,221 @@
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type, Union
+
+from .agent import MobileAgent
+from .composite_evaluator import CompositeEvaluator
+from .evaluator import BaseEvaluator, _failed_reason_str
+from .groundtruth_features import GroundTruthFeatures
+from .run_journal import RunJournal
+
+
+class MultiAgentEvaluator(BaseEvaluator):
+    """Evaluate several agents episode by episode against the same
+    ground-truth features (see evaluator/groundtruth_features.py).
+
+    The ground-truth trace of an episode is loaded, and its views embedded,
+    UI positions extracted and annotated image patches hashed, once for all
+    agents; evaluating one more agent only adds the work on its own execution
+    trace.
+
+    Each agent is evaluated by a CompositeEvaluator of *evaluator_classes*,
+    kept in self.agent_evaluators by agent name; the results of an evaluator
+    of an agent are in self.agent_evaluators[agent_name].evaluators. An
+    episode is completed for the MultiAgentEvaluator itself only when all
+    agents completed it.
+
+    Options of the MultiAgentEvaluator select and schedule the episodes (e.g.,
+    "categories", "jobs", "journal"); options of an evaluator are given in
+    *evaluator_options* by its class name.
+    """
+
+    def __init__(
+        self,
+        agents: Sequence[MobileAgent],
+        epi_metadata_path: str,
+        gr_dataset_path: str,
+        evaluator_classes: Sequence[Type[BaseEvaluator]],
+        options: Dict = None,
+        evaluator_options: Optional[Dict[str, Dict]] = None,
+    ) -> None:
+        assert agents, "No agent to evaluate"
+        agent_names = [agent.agent_name for agent in agents]
+        assert len(set(agent_names)) == len(
+            agent_names
+        ), f"Agents must have distinct names: {agent_names}"
+        super().__init__(agents[0], epi_metadata_path, gr_dataset_path, options)
+        self.evaluator_name = self.__class__.__name__
+        self.agents: List[MobileAgent] = list(agents)
+        self.agent_evaluators: Dict[str, CompositeEvaluator] = {
+            agent.agent_name: CompositeEvaluator(
+                agent,
+                epi_metadata_path,
+                gr_dataset_path,
+                evaluator_classes,
+                evaluator_options=evaluator_options,
+            )
+            for agent in self.agents
+        }
+        # time spent on ground-truth features, reported after the run
+        self.gr_features_time: float = 0.0
+        # created after the evaluators, which may reset the logging level
+        self.logger = logging.getLogger(self.evaluator_name)
+
+    @property
+    def agent_names(self) -> str:
+        return "+".join(self.agent_evaluators)
+
+    def get_journal(self) -> Optional[RunJournal]:
+        """Journal of this run configured by the "journal" option, or None;
+        its records are only reused for the same set of agents"""
+        journal_path = self.options.get("journal", False) if self.options else False
+        if not journal_path:
+            return None
+        if journal_path is True:
+            journal_path = os.path.join(
+                "dumped_stats", f"{self.evaluator_name}_{self.agent_names}.jsonl"
+            )
+        return RunJournal(
+            journal_path,
+            self.evaluator_name,
+            self.agent_names,
+            self.get_result_options(),
+        )
+
+    def get_result_options(self) -> Dict:
+        # all agents are evaluated by the same evaluators
+        return {
+            **(self.options or {}),
+            "evaluators": next(
+                iter(self.agent_evaluators.values())
+            ).get_evaluators_key(),
+        }
+
+    def get_episode_fingerprint(self, episode: str) -> str:
+        # the execution traces and predicted actions of all agents
+        gr_trace = self.helper.load_groundtruth_trace_by_episode(episode)
+        fingerprints = [self.result_cache.trace_fingerprint(gr_trace)]
+        for agent in self.agents:
+            fingerprints += [
+                agent.agent_name,
+                self.result_cache.trace_fingerprint(
+                    agent.load_exec_trace_by_episode(episode)
+                ),
+                self.result_cache.actions_fingerprint(
+                    agent.load_predicted_action_by_episode(episode)
+                ),
+            ]
+        return ",".join(fingerprints)
+
+    def prepare_evaluation(self, target_episodes: List[str]) -> None:
+        for evaluator in self.agent_evaluators.values():
+            evaluator.prepare_evaluation(target_episodes)
+
+    def build_groundtruth_features(self, episode: str) -> GroundTruthFeatures:
+        """Ground-truth features of an episode needed by the evaluators"""
+        start = time.perf_counter()
+        features = GroundTruthFeatures(
+            episode, self.helper.load_groundtruth_trace_by_episode(episode)
+        )
+        if features.gr_trace:
+            try:
+                # all agents are evaluated by the same evaluators
+                next(iter(self.agent_evaluators.values())).add_groundtruth_features(
+                    features
+                )
+            except Exception as e:
+                # evaluators compute the missing features themselves
+                self.logger.warning(
+                    f"Failed to compute ground-truth features of episode "
+                    f"{episode}: {str(e)}"
+                )
+        self.gr_features_time += time.perf_counter() - start
+        return features
+
+    def eval_impl(
+        self, episode: str, task_description: str
+    ) -> Tuple[bool, Optional[str]]:
+        features = self.build_groundtruth_features(episode)
+        self.logger.info(f"Ground-truth features of {episode}: {features.stats()}")
+        try:
+            for evaluator in self.agent_evaluators.values():
+                evaluator.gr_features = features
+                completeness, failed_reason = evaluator.eval_episode(episode)
+                evaluator.episode_completion[episode] = (
+                    completeness,
+                    _failed_reason_str(failed_reason),
+                )
+        finally:
+            for evaluator in self.agent_evaluators.values():
+                evaluator.gr_features = None
+
+        failed = [
+            agent_name
+            for agent_name, evaluator in self.agent_evaluators.items()
+            if not evaluator.episode_completion[episode][0]
+        ]
+        return not failed, (f"not completed by {', '.join(failed)}" if failed else None)
+
+    def export_episode_stats(
+        self, episode: str
+    ) -> Dict[str, Tuple[Tuple[bool, str], Any]]:
+        # popped, so that results evaluated in a worker are only kept once
+        return {
+            agent_name: (
+                evaluator.episode_completion.pop(episode),
+                evaluator.export_episode_stats(episode),
+            )
+            for agent_name, evaluator in self.agent_evaluators.items()
+            if episode in evaluator.episode_completion
+        }
+
+    def import_episode_stats(
+        self, episode: str, episode_stats: Dict[str, Tuple[Tuple[bool, str], Any]]
+    ) -> None:
+        for agent_name, evaluator in self.agent_evaluators.items():
+            if agent_name not in (episode_stats or {}):
+                continue
+            result, evaluator_stats = episode_stats[agent_name]
+            evaluator.episode_completion[episode] = tuple(result)
+            evaluator.import_episode_stats(episode, evaluator_stats)
+
+    def finish_evaluation(self) -> None:
+        for evaluator in self.agent_evaluators.values():
+            # episodes failing before any agent was evaluated fail for all
+            evaluator.episode_completion = {
+                epi: evaluator.episode_completion.get(epi, result)
+                for epi, result in self.episode_completion.items()
+            }
+            evaluator.finish_evaluation()
+        # features computed in worker processes are not counted
+        self.logger.info(
+            f"Spent {self.gr_features_time:.2f}s on ground-truth features "
+            f"shared by {len(self.agents)} agents"
+        )
+
+    def report_stats(
+        self,
+        human_eval_path: Union[str, Dict[str, str]] = None,
+        only_human_eval_positive: bool = False,
+        to_stdout: bool = False,
+        suffix: str = "",
+    ) -> None:
+        """Report the statistics of every evaluator of every agent
+
+        Args:
+            human_eval_path: human validation results of all agents, or a dict
+                of agent name -> human validation results of the agent
+        """
+        for agent_name, evaluator in self.agent_evaluators.items():
+            print(f"[{agent_name}]")
+            evaluator.report_stats(
+                (
+                    human_eval_path.get(agent_name, None)
+                    if isinstance(human_eval_path, dict)
+                    else human_eval_path
+                ),
+                only_human_eval_positive,
+                to_stdout,
+                suffix,
+            )
@@ -0,0 +1,363 @@
+"""A persistent cache of episode evaluation results.
+
+Evaluating an episode again with the same inputs gives the same result, so
+BaseEvaluator.eval_episode stores the result of every evaluated episode in a
+SQLite file (option "result_cache") and returns the stored result when the
+inputs have not changed. The key of a result hashes:
+
+    - the evaluator class and its options, except the ones that do not change
+      results (e.g., "jobs" or the trace cache budget)
+    - the code version: the content of all source files of the evaluator package
+    - the fingerprint of the episode (BaseEvaluator.get_episode_fingerprint):
+      actions, activities and essential states (i.e., the .ess annotations)
+      of the ground-truth and the execution traces, and the content of their
+      screenshots and view hierarchies
+
+Content hashes of files are kept in the cache file with the size and mtime of
+the files, so that a file is only read again after it has been modified.
+
+Show statistics or prune the cache with:
+    python -m evaluator.result_cache CACHE_PATH [--prune] [--older_than DAYS]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from . import trace_storage
+from .testbed_evaluation.embedding_cache import USER_CACHE_DIR
+
+# cache file of the "result_cache" option set to True; shared by all datasets,
+# as results are keyed on the content of the traces
+DEFAULT_CACHE_PATH = os.path.join(USER_CACHE_DIR, "result_cache.sqlite")
+
+# options that change how episodes are evaluated, but not their results
+NON_RESULT_OPTIONS = {
+    "categories",
+    "episodes",
+    "first_n",
+    "jobs",
+    "executor",
+    "trace_cache_max_entries",
+    "trace_cache_max_bytes",
+    "result_cache",
+    "result_cache_bypass",
+    "journal",
+    "resume",
+    "result_sink",
+    "human_eval_path",
+    "only_human_eval_positive",
+    "warm_up_model",
+    "embedding_cache_dir",
+    "bulk_embedding",
+    "embedding_batch_size",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    evaluator TEXT,
+    episode TEXT,
+    code_version TEXT,
+    completeness INTEGER,
+    failed_reason TEXT,
+    episode_stats BLOB,
+    created REAL,
+    last_used REAL
+);
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER,
+    sha1 TEXT
+);
+"""
+
+# (completeness, failed_reason, episode_stats) of a cached episode
+CachedResult = Tuple[bool, str, Any]
+
+
+@lru_cache(maxsize=None)
+def get_code_version() -> str:
+    """Hash of all source files of the evaluator package, except tests"""
+    package_path = os.path.dirname(os.path.abspath(__file__))
+    sha1 = hashlib.sha1()
+    for root, dirs, files in os.walk(package_path):
+        dirs[:] = sorted(d for d in dirs if d != "tests" and not d.startswith("."))
+        for file_name in sorted(files):
+            if not file_name.endswith(".py"):
+                continue
+            file_path = os.path.join(root, file_name)
+            sha1.update(os.path.relpath(file_path, package_path).encode("utf-8"))
+            with open(file_path, "rb") as f:
+                sha1.update(f.read())
+    return sha1.hexdigest()
+
+
+def get_options_key(options: Optional[Dict]) -> str:
+    """Options of an evaluator changing its results, as a JSON string"""
+
+    def to_json(value):
+        if isinstance(value, Enum):
+            return value.value
+        if isinstance(value, (set, frozenset)):
+            return sorted(value, key=str)
+        return str(value)
+
+    return json.dumps(
+        {
+            key: value
+            for key, value in (options or {}).items()
+            if key not in NON_RESULT_OPTIONS
+        },
+        sort_keys=True,
+        default=to_json,
+    )
+
+
+def _action_entry(action) -> Optional[list]:
+    # touch points may be numpy scalars, whose repr changes across versions
+    if action is None:
+        return None
+    return [
+        action.action_type.value,
+        [float(v) for v in action.touch_point_yx],
+        [float(v) for v in action.lift_point_yx],
+        action.typed_text,
+    ]
+
+
+class ResultCache:
+    def __init__(self, cache_path: str) -> None:
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.cache_path = cache_path
+        # connections can only be used by the thread that opened them
+        self._local = threading.local()
+        # counted in this process only
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        # connections cannot be pickled; each process opens its own ones
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state) -> None:
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            cache_dir = os.path.dirname(self.cache_path)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            # worker processes and threads of a parallel evaluation write at
+            # the same time
+            conn = sqlite3.connect(self.cache_path, timeout=60)
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def get_key(
+        self,
+        evaluator_name: str,
+        options: Optional[Dict],
+        episode: str,
+        fingerprint: str,
+    ) -> str:
+        key = [evaluator_name, get_options_key(options), get_code_version()]
+        key += [episode, fingerprint]
+        return hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        row = self.conn.execute(
+            "SELECT completeness, failed_reason, episode_stats FROM results "
+            "WHERE key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self.conn:
+            self.conn.execute(
+                "UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+        completeness, failed_reason, episode_stats = row
+        return (
+            bool(completeness),
+            failed_reason,
+            None if episode_stats is None else pickle.loads(episode_stats),
+        )
+
+    def put(
+        self,
+        key: str,
+        evaluator_name: str,
+        episode: str,
+        completeness: bool,
+        failed_reason: str,
+        episode_stats: Any = None,
+    ) -> None:
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    evaluator_name,
+                    episode,
+                    get_code_version(),
+                    int(bool(completeness)),
+                    failed_reason,
+                    None if episode_stats is None else pickle.dumps(episode_stats),
+                    now,
+                    now,
+                ),
+            )
+
+    def file_hash(self, path: Optional[str]) -> Optional[str]:
+        """sha1 of the content of a trace file, or None if it does not exist"""
+        if path is None:
+            return None
+        stored = trace_storage.split_storage_path(path)
+        try:
+            # files in a pack or an archive are modified with it
+            stat = os.stat(path if stored is None else stored[0])
+        except OSError:
+            return None
+        if stored is not None and not trace_storage.isfile(path):
+            return None
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, sha1 FROM file_hashes WHERE path = ?", (path,)
+        ).fetchone()
+        if row is not None and row[:2] == (stat.st_size, stat.st_mtime_ns):
+            return row[2]
+        sha1 = hashlib.sha1(trace_storage.read_bytes(path)).hexdigest()
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, sha1),
+            )
+        return sha1
+
+    def trace_fingerprint(self, trace: Optional[Iterable]) -> str:
+        """Hash of the parsed content and the files of a TaskTrace"""
+        if trace is None:
+            return "no trace"
+        sha1 = hashlib.sha1()
+        for ui_state in trace:
+            essential_state = None
+            if ui_state.essential_state is not None:
+                essential_state = sorted(
+                    (keyword.value, contents)
+                    for keyword, contents in ui_state.essential_state.items()
+                )
+            paths = [
+                ui_state.screenshot_path,
+                ui_state.vh_path,
+                ui_state.vh_json_path,
+                ui_state.vh_simp_ui_json_path,
+            ]
+            if ui_state.state_type == "execution":
+                paths.append(ui_state.installed_app_path)
+            entry = [
+                ui_state.index,
+                ui_state.state_type,
+                ui_state.activity,
+                _action_entry(ui_state.action),
+                essential_state,
+                [self.file_hash(path) for path in paths],
+            ]
+            sha1.update(json.dumps(entry).encode("utf-8"))
+        return sha1.hexdigest()
+
+    def actions_fingerprint(self, actions: Optional[Iterable]) -> str:
+        """Hash of a list of actions, e.g., actions predicted by an agent"""
+        if actions is None:
+            return "no actions"
+        entries = [_action_entry(action) for action in actions]
+        return hashlib.sha1(json.dumps(entries).encode("utf-8")).hexdigest()
+
+    def stats(self) -> Dict[str, int]:
+        num_entries = self.conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        num_stale = self.conn.execute(
+            "SELECT COUNT(*) FROM results WHERE code_version != ?",
+            (get_code_version(),),
+        ).fetchone()[0]
+        num_files = self.conn.execute("SELECT COUNT(*) FROM file_hashes").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": num_entries,
+            "stale_entries": num_stale,
+            "hashed_files": num_files,
+        }
+
+    def prune(self, older_than_days: Optional[float] = None) -> int:
+        """Remove results of other code versions, results not used in the last
+        *older_than_days* days, and hashes of files that no longer exist
+
+        Return:
+            number of removed results
+        """
+        with self.conn:
+            removed = self.conn.execute(
+                "DELETE FROM results WHERE code_version != ?", (get_code_version(),)
+            ).rowcount
+            if older_than_days is not None:
+                removed += self.conn.execute(
+                    "DELETE FROM results WHERE last_used < ?",
+                    (time.time() - older_than_days * 86400,),
+                ).rowcount
+            missing = [
+                (path,)
+                for (path,) in self.conn.execute("SELECT path FROM file_hashes")
+                if not trace_storage.exists(path)
+            ]
+            self.conn.executemany("DELETE FROM file_hashes WHERE path = ?", missing)
+        self.conn.execute("VACUUM")
+        self.logger.info(
+            f"Removed {removed} results and {len(missing)} file hashes "
+            f"from {self.cache_path}"
+        )
+        return removed
+
+    def clear(self) -> None:
+        with self.conn:
+            self.conn.execute("DELETE FROM results")
+            self.conn.execute("DELETE FROM file_hashes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or prune a result cache.")
+    parser.add_argument("cache_path", type=str)
+    parser.add_argument("--prune", action="store_true")
+    parser.add_argument(
+        "--older_than",
+        type=float,
+        default=None,
+        help="with --prune, also remove results not used for this many days",
+    )
+    parser.add_argument("--clear", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    cache = ResultCache(args.cache_path)
+    if args.clear:
+        cache.clear()
+    elif args.prune:
+        cache.prune(args.older_than)
+    print(cache.stats())
@@ -0,0 +1,232 @@
+"""Streaming outputs of an evaluation run.
+
+BaseEvaluator.run_evaluation passes every episode result, as soon as it is
+evaluated, to:
+
+    - RunningStats: counts of completed and failed tasks, and the task
+      completion rate and accuracy against human validation results, updated
+      incrementally so that they are available during the run
+    - the ResultSinks of the "result_sink" option, writing one row per episode
+      (episode, completeness, failed_reason) to a .jsonl, .csv or .parquet
+      file (the latter requires `pip install pyarrow`)
+"""
+
+import csv
+import json
+import os
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+
+def load_human_eval(human_eval_path: str) -> Dict[str, List[int]]:
+    """Human validation results: episode -> labels (0 or 1) in the second
+    column of the CSV file; episodes are kept as strings"""
+    labels: Dict[str, List[int]] = defaultdict(list)
+    with open(human_eval_path, "r", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header: episode,[human column]
+        for row in reader:
+            if len(row) < 2:
+                continue
+            labels[row[0].strip()].append(int(float(row[1])))
+    return dict(labels)
+
+
+class RunningStats:
+    def __init__(
+        self,
+        human_eval_path: Optional[str] = None,
+        only_human_eval_positive: bool = False,
+    ) -> None:
+        self.human_eval_path = human_eval_path
+        self.only_human_eval_positive = only_human_eval_positive
+        self.human_labels: Optional[Dict[str, List[int]]] = (
+            load_human_eval(human_eval_path) if human_eval_path else None
+        )
+
+        self.num_episodes = 0
+        self.completed = 0
+        # episodes joined with human validation results
+        self.total = 0
+        self.human_positive = 0
+        self.exec_positive = 0
+        self.tp = 0
+
+    def matches(
+        self, human_eval_path: Optional[str], only_human_eval_positive: bool
+    ) -> bool:
+        """Whether these statistics are computed against the given human
+        validation results"""
+        return self.human_eval_path == human_eval_path and (
+            not human_eval_path
+            or self.only_human_eval_positive == only_human_eval_positive
+        )
+
+    def update(self, episode: str, completeness: bool) -> None:
+        self.num_episodes += 1
+        self.completed += int(bool(completeness))
+        if self.human_labels is None:
+            return
+        for label in self.human_labels.get(episode, []):
+            if self.only_human_eval_positive and label != 1:
+                continue
+            self.total += 1
+            self.human_positive += int(label == 1)
+            self.exec_positive += int(bool(completeness))
+            self.tp += int(label == int(bool(completeness)))
+
+    @property
+    def failed(self) -> int:
+        return self.num_episodes - self.completed
+
+    def metric(self) -> Optional[Tuple[int, int, int, int]]:
+        """(total, human_positive, exec_positive, tp) against human
+        validation results, or None without them"""
+        if self.human_labels is None:
+            return None
+        total = self.total
+        if self.only_human_eval_positive and total < 1:
+            total = 1
+        return total, self.human_positive, self.exec_positive, self.tp
+
+    def summary(self) -> str:
+        metric = self.metric()
+        if metric is None:
+            return f"Completed tasks: {self.completed}, failed tasks: {self.failed}"
+        total, _, exec_positive, _ = metric
+        return (
+            f"Completed tasks: {exec_positive}, "
+            f"failed tasks: {total - exec_positive}"
+        )
+
+    def snapshot(self) -> Dict[str, float]:
+        stats = {
+            "episodes": self.num_episodes,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+        metric = self.metric()
+        if metric is not None and metric[0] > 0:
+            total, human_positive, exec_positive, tp = metric
+            stats["human_tcr"] = human_positive / total
+            stats["tcr"] = exec_positive / total
+            stats["accuracy"] = tp / total
+        return stats
+
+
+class ResultSink(ABC):
+    def __init__(self, path: str) -> None:
+        self.path = path
+        sink_dir = os.path.dirname(path)
+        if sink_dir:
+            os.makedirs(sink_dir, exist_ok=True)
+
+    @abstractmethod
+    def write(self, episode: str, completeness: bool, failed_reason: str) -> None:
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        pass
+
+
+class JsonlResultSink(ResultSink):
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write(self, episode: str, completeness: bool, failed_reason: str) -> None:
+        record = {
+            "episode": episode,
+            "completeness": bool(completeness),
+            "failed_reason": failed_reason,
+        }
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class CsvResultSink(ResultSink):
+    def __init__(self, path: str) -> None:
+        super().__init__(path)
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(["episode", "completeness", "failed_reason"])
+
+    def write(self, episode: str, completeness: bool, failed_reason: str) -> None:
+        self._writer.writerow([episode, bool(completeness), failed_reason])
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetResultSink(ResultSink):
+    """Rows are buffered and written in row groups of *row_group_size* rows,
+    as a Parquet file cannot grow by single rows"""
+
+    def __init__(self, path: str, row_group_size: int = 1024) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError(
+                "pyarrow is required to write results to a .parquet file: "
+                "pip install pyarrow"
+            )
+        super().__init__(path)
+        self._pa = pa
+        self._schema = pa.schema(
+            [
+                ("episode", pa.string()),
+                ("completeness", pa.bool_()),
+                ("failed_reason", pa.string()),
+            ]
+        )
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._row_group_size = row_group_size
+        self._rows: List[tuple] = []
+
+    def write(self, episode: str, completeness: bool, failed_reason: str) -> None:
+        self._rows.append((episode, bool(completeness), failed_reason))
+        if len(self._rows) >= self._row_group_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+        columns = list(zip(*self._rows))
+        self._writer.write_table(
+            self._pa.table(
+                {
+                    name: list(column)
+                    for name, column in zip(self._schema.names, columns)
+                },
+                schema=self._schema,
+            )
+        )
+        self._rows = []
+
+    def close(self) -> None:
+        self._flush()
+        self._writer.close()
+
+
+RESULT_SINKS = {
+    ".jsonl": JsonlResultSink,
+    ".csv": CsvResultSink,
+    ".parquet": ParquetResultSink,
+}
+
+
+def open_result_sink(path: str) -> ResultSink:
+    """ResultSink writing to *path*, by the suffix of *path*"""
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix not in RESULT_SINKS:
+        raise ValueError(
+            f"Unsupported result sink {path}, expected one of {list(RESULT_SINKS)}"
+        )
+    return RESULT_SINKS[suffix](path)
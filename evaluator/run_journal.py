@@ -0,0 +1,119 @@
+"""A durable journal of evaluated episodes.
+
+With the "journal" option, BaseEvaluator.run_evaluation appends the result of
+every episode to a JSONL file as soon as the episode is evaluated, and syncs
+the file to disk, so that the results survive a crash or an interrupted run.
+Each line records one episode:
+
+    {"run": str, "evaluator": str, "agent": str, "options": str,
+     "episode": str, "completeness": bool, "failed_reason": str,
+     "episode_stats": Any, "time": float}
+
+"run" hashes the evaluator, the agent and the options changing results (see
+result_cache.get_options_key). With the "resume" option, episodes recorded
+with the same "run" are not evaluated again.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import IO, Any, Dict, Optional, Tuple
+
+from .result_cache import get_options_key
+
+# (completeness, failed_reason, episode_stats) of a recorded episode
+RecordedResult = Tuple[bool, str, Any]
+
+
+class RunJournal:
+    def __init__(
+        self,
+        journal_path: str,
+        evaluator_name: str,
+        agent_name: str,
+        options: Optional[Dict] = None,
+    ) -> None:
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.journal_path = journal_path
+        self.evaluator_name = evaluator_name
+        self.agent_name = agent_name
+        self.options_key = get_options_key(options)
+        self.run_id = hashlib.sha1(
+            json.dumps([evaluator_name, agent_name, self.options_key]).encode("utf-8")
+        ).hexdigest()
+        self._file: Optional[IO] = None
+
+    def load(self) -> Dict[str, RecordedResult]:
+        """Results of episodes recorded by runs of the same evaluator, agent
+        and options; the last record of an episode wins"""
+        recorded: Dict[str, RecordedResult] = {}
+        if not os.path.exists(self.journal_path):
+            return recorded
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # e.g., the last line of a run killed while writing it
+                    self.logger.warning(
+                        f"Skip broken line {line_no} of {self.journal_path}"
+                    )
+                    continue
+                if record.get("run") != self.run_id:
+                    continue
+                recorded[record["episode"]] = (
+                    record["completeness"],
+                    record["failed_reason"],
+                    record.get("episode_stats"),
+                )
+        return recorded
+
+    def append(
+        self,
+        episode: str,
+        completeness: bool,
+        failed_reason: str,
+        episode_stats: Any = None,
+    ) -> None:
+        record = {
+            "run": self.run_id,
+            "evaluator": self.evaluator_name,
+            "agent": self.agent_name,
+            "options": self.options_key,
+            "episode": episode,
+            "completeness": bool(completeness),
+            "failed_reason": failed_reason,
+            "episode_stats": episode_stats,
+            "time": time.time(),
+        }
+        try:
+            line = json.dumps(record)
+        except TypeError:
+            # statistics that JSON cannot encode are not recorded
+            record["episode_stats"] = None
+            line = json.dumps(record)
+
+        if self._file is None:
+            journal_dir = os.path.dirname(self.journal_path)
+            if journal_dir:
+                os.makedirs(journal_dir, exist_ok=True)
+            # a run killed while writing a line leaves it unterminated
+            terminated = True
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, "rb") as f:
+                    if f.seek(0, os.SEEK_END) > 0:
+                        f.seek(-1, os.SEEK_END)
+                        terminated = f.read(1) == b"\n"
+            self._file = open(self.journal_path, "a", encoding="utf-8")
+            if not terminated:
+                self._file.write("\n")
+        self._file.write(line + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
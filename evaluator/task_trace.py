@@ -2,12 +2,33 @@ import json
 import logging
 import os
 import re
+import sys
+import threading
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from functools import lru_cache
-from typing import DefaultDict, Dict, List, Optional, Tuple, Union
-
+from types import MappingProxyType
+from typing import (
+    Any,
+    DefaultDict,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+from lxml import etree
+
+from . import trace_storage
 from .common.action_type import Action, ActionType
+from .dataset_index import DatasetIndex
+from .trace_cache import TraceCache
+from .utils.vh_tree import VHIndex, VHTreeCache, parse_vh
 
 
 class Agent(Enum):
@@ -55,6 +76,29 @@ class EssentialStateKeyword(Enum):
     CHECK_UNINSTALL = "check_uninstall"
 
 
+def parse_bounds(bounds: Optional[str]) -> Optional[Tuple[int, int, int, int]]:
+    """Convert bounds like "[189,266][890,323]" to (left, top, right, bottom);
+    return None if *bounds* is not in this format
+    """
+    match = re.search(r"\[(\d+),(\d+)\]\[(\d+),(\d+)\]", bounds or "")
+    if match is None:
+        return None
+    return tuple(map(int, match.groups()))
+
+
+# files of the UIState with index {} relative to its trace folder, by state
+# type: (screenshot, vh, vh_json, vh_simp_ui_json)
+TRACE_LAYOUTS: Dict[str, Tuple[str, str, str, Optional[str]]] = {
+    "groundtruth": ("{}.png", "{}.xml", "{}.vh", "{}.json"),
+    "execution": (
+        os.path.join("screenshot", "{}.png"),
+        os.path.join("xml", "{}.xml"),
+        os.path.join("view_hierarchy", "{}.json"),
+        None,
+    ),
+}
+
+
 class UIState:
     """
     - index: int, index of the UIState in a trace
@@ -66,23 +110,55 @@ class UIState:
     - activity: stirng, activity of the current screen
     - action: Action
     - state_type: string ["groundtruth", "execution"], type of the UIState
+    - vh_tree_cache: VHTreeCache|None, parsed view hierarchies shared by all
+        UIStates of the trace
+    - screen_size: (width, height) of the screenshot, read on first access
+        unless given
+    - annotated_ui_nodes: Tuple[Mapping], read-only UI nodes in
+        vh_simp_ui_json_path, loaded on first access
+    - annotated_ui_bounds: Tuple[(left, top, right, bottom)|None], parsed
+        bounds of annotated_ui_nodes
     - essential_state: Dict[
         "fuzzy": ["0", "1"],
         "check_install": ["Microsoft Excel"],
         ...
         ]
+
+    UIStates created by UIState.in_trace_folder() only keep the trace folder
+    and derive their paths from TRACE_LAYOUTS; the action of a UIState in a
+    TraceTable is stored in the columns of the table.
     """
 
+    __slots__ = (
+        "index",
+        "state_type",
+        "activity",
+        "essential_state",
+        "vh_tree_cache",
+        "_trace_root",
+        "_paths",
+        "_action",
+        "_table",
+        "_row",
+        "_screen_size",
+        "_annotated_ui_nodes",
+        "_annotated_ui_bounds",
+    )
+
     def __init__(
         self,
         index: int,
-        screenshot_path: str,
-        vh_path: str,
-        vh_json_path: str,
+        screenshot_path: Optional[str],
+        vh_path: Optional[str],
+        vh_json_path: Optional[str],
         activity: str,
         action: Action,
         state_type: str,
         vh_simp_ui_json_path: Optional[str] = None,  # only gr-trace contains this field
+        vh_tree_cache: Optional[VHTreeCache] = None,
+        essential_state: Optional[DefaultDict[EssentialStateKeyword, List[str]]] = None,
+        screen_size: Optional[Tuple[int, int]] = None,
+        trace_root: Optional[str] = None,
     ) -> None:
         assert type(index) == int
         self.index: int = index
@@ -90,24 +166,38 @@ class UIState:
         assert state_type in ["groundtruth", "execution"]
         self.state_type: str = state_type
 
-        self.screenshot_path: str = screenshot_path
-        self.vh_path: str = vh_path
-        self.vh_json_path = vh_json_path
-        self.vh_simp_ui_json_path: str = vh_simp_ui_json_path
-        self.activity: str = activity
-        self.action: Action = action
+        # paths are either given or derived from the trace folder
+        self._trace_root: Optional[str] = trace_root
+        self._paths: Optional[Tuple[str, str, str, Optional[str]]] = None
+        if trace_root is None:
+            self._paths = (screenshot_path, vh_path, vh_json_path, vh_simp_ui_json_path)
+        else:
+            assert screenshot_path is None and vh_path is None and vh_json_path is None
+
+        # the same activities appear in many UIStates
+        self.activity: str = sys.intern(activity) if activity else activity
+        self._action: Optional[Action] = action
+        self._table: Optional["TraceTable"] = None
+        self._row: int = -1
+        self.vh_tree_cache: Optional[VHTreeCache] = vh_tree_cache
+        self._screen_size: Optional[Tuple[int, int]] = screen_size
+        self._annotated_ui_nodes: Optional[Tuple[Mapping[str, Any], ...]] = None
+        self._annotated_ui_bounds: Optional[
+            Tuple[Optional[Tuple[int, int, int, int]], ...]
+        ] = None
 
         # load annotated essential_state if it is ground-truth UIState
+        # essential states may be given, e.g., loaded from the dataset index
         self.essential_state: Optional[
             DefaultDict[EssentialStateKeyword, List[str]]
-        ] = None
+        ] = essential_state
         if self.state_type == "groundtruth":
             assert self.vh_simp_ui_json_path is not None
             # check whether this UIState has annotated essential states (file
             # postfix: .ess). if so, load the essential states
             potential_es_file = self.screenshot_path.replace(".png", ".ess")
-            if os.path.exists(potential_es_file):
-                with open(potential_es_file, "r") as f:
+            if self.essential_state is None and trace_storage.exists(potential_es_file):
+                with trace_storage.open_file(potential_es_file, "r") as f:
                     content = f.read()
                 self.essential_state = DefaultDict(list)
                 # split_content: ['exact<1>',
@@ -128,13 +218,129 @@ class UIState:
         else:
             pass
 
-        self.installed_app_path: Optional[str] = None
-        if self.state_type == "execution":
-            self.installed_app_path = os.path.join(
-                self.screenshot_path.split("screenshot")[0],
-                "installed_apps",
-                "installed_apps.txt",
-            )
+    @classmethod
+    def in_trace_folder(
+        cls,
+        trace_root: str,
+        index: int,
+        activity: str,
+        action: Action,
+        state_type: str,
+        **kwargs,
+    ) -> "UIState":
+        """UIState whose files are laid out in *trace_root* as in
+        TRACE_LAYOUTS[state_type]"""
+        return cls(
+            index=index,
+            screenshot_path=None,
+            vh_path=None,
+            vh_json_path=None,
+            activity=activity,
+            action=action,
+            state_type=state_type,
+            trace_root=trace_root,
+            **kwargs,
+        )
+
+    def _get_path(self, kind: int) -> Optional[str]:
+        if self._paths is not None:
+            return self._paths[kind]
+        pattern = TRACE_LAYOUTS[self.state_type][kind]
+        if pattern is None:
+            return None
+        return os.path.join(self._trace_root, pattern.format(self.index))
+
+    @property
+    def screenshot_path(self) -> str:
+        return self._get_path(0)
+
+    @property
+    def vh_path(self) -> str:
+        return self._get_path(1)
+
+    @property
+    def vh_json_path(self) -> str:
+        return self._get_path(2)
+
+    @property
+    def vh_simp_ui_json_path(self) -> Optional[str]:
+        return self._get_path(3)
+
+    @property
+    def installed_app_path(self) -> Optional[str]:
+        if self.state_type != "execution":
+            return None
+        return os.path.join(
+            self.screenshot_path.split("screenshot")[0],
+            "installed_apps",
+            "installed_apps.txt",
+        )
+
+    @property
+    def action(self) -> Optional[Action]:
+        if self._table is not None:
+            return self._table.get_action(self._row)
+        return self._action
+
+    @action.setter
+    def action(self, action: Optional[Action]) -> None:
+        self._table = None
+        self._row = -1
+        self._action = action
+
+    def _move_action_to_table(self, table: "TraceTable", row: int) -> None:
+        self._action = None
+        self._table = table
+        self._row = row
+
+    def get_vh_tree(self) -> etree._ElementTree:
+        """Parsed view hierarchy (self.vh_path) of this UIState, shared
+        through the trace's VHTreeCache; never modify the returned tree.
+        """
+        if self.vh_tree_cache is None:
+            return parse_vh(self.vh_path)
+        return self.vh_tree_cache.get(self.vh_path)
+
+    def get_vh_index(self) -> VHIndex:
+        """Lookup tables over the nodes of self.get_vh_tree()"""
+        if self.vh_tree_cache is None:
+            return VHIndex(parse_vh(self.vh_path))
+        return self.vh_tree_cache.get_index(self.vh_path)
+
+    def release_vh_tree(self) -> None:
+        """Drop the parsed view hierarchy once it will not be checked again"""
+        if self.vh_tree_cache is not None:
+            self.vh_tree_cache.release(self.vh_path)
+
+    @property
+    def screen_size(self) -> Tuple[int, int]:
+        if self._screen_size is None:
+            with trace_storage.open_image(self.screenshot_path) as img:
+                self._screen_size = img.size
+        return self._screen_size
+
+    def _load_annotated_ui_nodes(self) -> None:
+        assert self.vh_simp_ui_json_path is not None
+        with trace_storage.open_file(
+            self.vh_simp_ui_json_path, "r", encoding="utf-8"
+        ) as f:
+            data: List[Dict] = json.load(f)
+        self._annotated_ui_nodes = tuple(MappingProxyType(node) for node in data)
+        self._annotated_ui_bounds = tuple(
+            parse_bounds(node.get("bounds")) for node in data
+        )
+
+    @property
+    def annotated_ui_nodes(self) -> Tuple[Mapping[str, Any], ...]:
+        if self._annotated_ui_nodes is None:
+            self._load_annotated_ui_nodes()
+        return self._annotated_ui_nodes
+
+    @property
+    def annotated_ui_bounds(self) -> Tuple[Optional[Tuple[int, int, int, int]], ...]:
+        if self._annotated_ui_bounds is None:
+            self._load_annotated_ui_nodes()
+        return self._annotated_ui_bounds
 
     def get_bbox_bounds_by_keyword_id(self, keyword_id: int) -> Tuple[float]:
         """
@@ -142,14 +348,57 @@ class UIState:
         """
         assert self.essential_state is not None
 
-        data: List[Dict] = json.load(open(self.vh_simp_ui_json_path, "r"))
-        bounds: str = data[keyword_id]["bounds"]
-        left, top, right, bottom = map(
-            float, re.findall(r"\[(\d+),(\d+)\]\[(\d+),(\d+)\]", bounds)[0]
-        )
+        left, top, right, bottom = map(float, self.annotated_ui_bounds[keyword_id])
         return left, top, right, bottom
 
 
+# ActionType value of UIStates without action in a TraceTable
+NO_ACTION = -1
+
+
+class TraceTable(list):
+    """A list of UIStates whose actions are stored column-wise, built once
+    a trace is loaded:
+    - action_types: int8 array of ActionType values, NO_ACTION for UIStates
+        without action
+    - touch_points_yx, lift_points_yx: float64 arrays of shape (n, 2)
+    - typed_texts: tuple of typed texts
+
+    Columns only cover the UIStates the table was built with; UIStates added
+    later keep their own action.
+    """
+
+    __slots__ = ("action_types", "touch_points_yx", "lift_points_yx", "typed_texts")
+
+    def __init__(self, ui_states: Iterable[UIState] = ()) -> None:
+        super().__init__(ui_states)
+        num_rows = len(self)
+        self.action_types = np.full(num_rows, NO_ACTION, dtype=np.int8)
+        self.touch_points_yx = np.full((num_rows, 2), -1.0)
+        self.lift_points_yx = np.full((num_rows, 2), -1.0)
+        typed_texts = [""] * num_rows
+        for row, ui_state in enumerate(self):
+            action = ui_state.action
+            if action is not None:
+                self.action_types[row] = action.action_type.value
+                self.touch_points_yx[row] = action.touch_point_yx
+                self.lift_points_yx[row] = action.lift_point_yx
+                typed_texts[row] = action.typed_text
+            ui_state._move_action_to_table(self, row)
+        self.typed_texts: Tuple[str, ...] = tuple(typed_texts)
+
+    def get_action(self, row: int) -> Optional[Action]:
+        action_type = int(self.action_types[row])
+        if action_type == NO_ACTION:
+            return None
+        return Action(
+            action_type=ActionType(action_type),
+            touch_point_yx=tuple(self.touch_points_yx[row].tolist()),
+            lift_point_yx=tuple(self.lift_points_yx[row].tolist()),
+            typed_text=self.typed_texts[row],
+        )
+
+
 TaskTrace = List[UIState]
 
 
@@ -165,6 +414,58 @@ def get_all_actions(task_trace: TaskTrace) -> List[Action]:
     return [ui_state.action for ui_state in task_trace]
 
 
+# threads reading the small files of traces, see _read_text_files
+IO_THREADS = 16
+_io_pool: Optional[ThreadPoolExecutor] = None
+_io_pool_lock = threading.Lock()
+
+
+def _get_io_pool() -> ThreadPoolExecutor:
+    global _io_pool
+    with _io_pool_lock:
+        if _io_pool is None:
+            _io_pool = ThreadPoolExecutor(
+                max_workers=IO_THREADS, thread_name_prefix="trace_io"
+            )
+        return _io_pool
+
+
+def _reset_io_pool() -> None:
+    # threads of the parent are not running in a forked child
+    global _io_pool, _io_pool_lock
+    _io_pool = None
+    _io_pool_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_io_pool)
+
+
+def _read_text(path: Optional[str]) -> Optional[str]:
+    if path is None:
+        return None
+    with trace_storage.open_file(path) as f:
+        return f.read()
+
+
+def _read_text_files(paths: List[Optional[str]]) -> List[Optional[str]]:
+    """Contents of *paths* (None for None paths), read concurrently since
+    most of the time is spent waiting for the disk"""
+    if len(paths) <= 1:
+        return [_read_text(path) for path in paths]
+    return [*_get_io_pool().map(_read_text, paths)]
+
+
+def _list_file_names(folder: str) -> Set[str]:
+    """Names of the entries in *folder*; empty if it does not exist"""
+    try:
+        if trace_storage.split_storage_path(folder) is not None:
+            return set(trace_storage.listdir(folder))
+        with os.scandir(folder) as entries:
+            return {entry.name for entry in entries}
+    except FileNotFoundError:
+        return set()
+
+
 class DatasetHelper:
     """A singleton class to help load task metadata from the our constructed dataset."""
 
@@ -176,6 +477,10 @@ class DatasetHelper:
         return cls._instance
 
     def __init__(self, epi_metadata_path: str, gr_dataset_path: str) -> None:
+        # the singleton is initialized again only when the dataset changes
+        if getattr(self, "_paths", None) == (epi_metadata_path, gr_dataset_path):
+            return
+        self._paths = (epi_metadata_path, gr_dataset_path)
         self.logger = logging.getLogger(self.__class__.__name__)
 
         self.epi_metadata_path = epi_metadata_path
@@ -183,6 +488,16 @@ class DatasetHelper:
         self.logger.info(
             f"Using epi_metadata_path: {self.epi_metadata_path}, gr_dataset_path: {gr_dataset_path}"
         )
+        # parsed ground-truth traces, built by self.build_dataset_index()
+        self.dataset_index = DatasetIndex(gr_dataset_path)
+
+        # loaded ground-truth and testbed traces; the cache is kept across
+        # datasets, but traces of the previous dataset are dropped
+        if not hasattr(self, "trace_cache"):
+            self.trace_cache = TraceCache()
+        self.trace_cache.invalidate(lambda key: key[0] == "groundtruth")
+        # category -> {episode: trace folder}, see _get_episode_to_trace_path
+        self._episode_to_trace_path: Dict[TaskCategory, Dict[str, str]] = {}
 
         """Example of epi_metadata_dict: 
         {
@@ -267,6 +582,10 @@ class DatasetHelper:
     # ---- screenshot: [0.png, 1.png, ...]                 #
     # ---------------------------------------------------- #
     def _proc_testbed_trace_action_file(self, action_file) -> Action:
+        with trace_storage.open_file(action_file) as f:
+            return self._parse_testbed_action(f.read())
+
+    def _parse_testbed_action(self, action_repr: str) -> Action:
         """
         action_type:
             - "CLICK"
@@ -292,8 +611,6 @@ class DatasetHelper:
             - "SWIPE|[0.8, 0.5]|[0.2 0.5]|1080|2400"
             - "PRESS_HOME|NULL|NULL|1080|2400"
         """
-        with open(action_file) as f:
-            action_repr = f.read()
         action_repr = action_repr.split("|")
         action_type = action_repr[0]
         if action_repr[2] != "NULL":
@@ -335,35 +652,65 @@ class DatasetHelper:
 
         return action
 
+    def testbed_trace_exists(self, path: str) -> bool:
+        """Whether the testbed trace folder *path* exists, as a folder or in a
+        pack or an archive (see trace_storage.resolve_trace_root)"""
+        return trace_storage.exists(trace_storage.resolve_trace_root(path))
+
     def load_testbed_trace_by_path(self, path: str) -> TaskTrace:
-        screenshot_folder_path = os.path.join(path, "screenshot")
-        num_UIState = len(os.listdir(screenshot_folder_path))
-        task_trace: List[UIState] = []
-        for i in range(num_UIState):
-            screenshot_path = os.path.join(screenshot_folder_path, f"{i}.png")
-            xml_path = os.path.join(path, "xml", f"{i}.xml")
-            vh_json_path = os.path.join(path, "view_hierarchy", f"{i}.json")
-
-            activity_path = os.path.join(path, "activity", f"{i}.activity")
-            activity = self._extract_activity_from_file(activity_path)
-
-            action_path = os.path.join(path, "action", f"{i}.action")
-            if not os.path.exists(action_path):
-                action = None
-            else:
-                action = self._proc_testbed_trace_action_file(action_path)
+        """Load the testbed trace in the folder *path*. The folder may also be
+        packed or archived, e.g., [path].tpack, [path].zip, or
+        [parent].tar.gz/[folder] (see trace_storage)"""
+        path = trace_storage.resolve_trace_root(path)
+        # the trace is loaded again once new screens have been captured
+        screenshot_folder_mtime = trace_storage.getmtime_ns(
+            os.path.join(path, "screenshot")
+        )
+        return self.trace_cache.get_or_load(
+            ("testbed", path, screenshot_folder_mtime),
+            lambda: self._load_testbed_trace_by_path(path),
+        )
+
+    def _load_testbed_trace_by_path(self, path: str) -> TaskTrace:
+        """Load a testbed trace with one os.scandir per folder; the activity
+        and action files are read concurrently and parsed afterwards"""
+        screenshot_names = _list_file_names(os.path.join(path, "screenshot"))
+        action_names = _list_file_names(os.path.join(path, "action"))
+        num_UIState = len(screenshot_names)
+
+        activity_paths = [
+            os.path.join(path, "activity", f"{i}.activity") for i in range(num_UIState)
+        ]
+        # UIStates without action file have no action
+        action_paths = [
+            (
+                os.path.join(path, "action", f"{i}.action")
+                if f"{i}.action" in action_names
+                else None
+            )
+            for i in range(num_UIState)
+        ]
+        contents = _read_text_files(activity_paths + action_paths)
+        activities = [
+            self._parse_activity(content) for content in contents[:num_UIState]
+        ]
+        actions = [
+            None if content is None else self._parse_testbed_action(content)
+            for content in contents[num_UIState:]
+        ]
 
-            ui_state = UIState(
+        vh_tree_cache = VHTreeCache()
+        return TraceTable(
+            UIState.in_trace_folder(
+                path,
                 index=i,
-                screenshot_path=screenshot_path,
-                vh_path=xml_path,
-                vh_json_path=vh_json_path,
-                activity=activity,
-                action=action,
+                activity=activities[i],
+                action=actions[i],
                 state_type="execution",
+                vh_tree_cache=vh_tree_cache,
             )
-            task_trace.append(ui_state)
-        return task_trace
+            for i in range(num_UIState)
+        )
 
     # ---------------------------------------------------- #
     # -- Processing the ground-truth trace we annotated -- #
@@ -374,12 +721,79 @@ class DatasetHelper:
     def load_groundtruth_trace_by_episode(self, episode: str) -> Optional[TaskTrace]:
         category: TaskCategory = self.get_category_by_episode(episode)
         self.logger.info(f"episode: {episode}, category: {category}")
-        if episode in self._load_groundtruth_trace_by_category(category):
-            return self._load_groundtruth_trace_by_category(category)[episode]
-        else:
+        path = self.get_groundtruth_trace_path_by_episode(episode)
+        if path is None:
+            return None
+        return self._load_groundtruth_trace_by_dir(path)
+
+    def get_groundtruth_trace_path_by_episode(self, episode: str) -> Optional[str]:
+        """Folder of the ground-truth trace of an episode.
+
+        The "path" column of the task metadata is tried first and verified
+        with the episode in its instruction.txt; otherwise the folder is
+        found in the dataset index, or by reading instruction.txt of all
+        folders in the category once.
+        """
+        category: TaskCategory = self.get_category_by_episode(episode)
+        path: str = self.epi_metadata_dict[episode]["path"]
+        candidates = [
+            os.path.join(self.gr_dataset_path, path),
+            os.path.join(
+                self.gr_dataset_path, category.value, os.path.basename(path.rstrip("/"))
+            ),
+        ]
+        if self.dataset_index.exists():
+            candidates.extend(
+                os.path.join(self.gr_dataset_path, rel_path)
+                for rel_path in self.dataset_index.find_trace_paths(episode)
+            )
+        for candidate in candidates:
+            candidate = trace_storage.resolve_trace_root(candidate)
+            if self._read_episode_of_trace(candidate) == episode:
+                return candidate
+        return self._get_episode_to_trace_path(category).get(episode)
+
+    def _read_episode_of_trace(self, path: str) -> Optional[str]:
+        ep_id_path = os.path.join(path, "instruction.txt")
+        if not trace_storage.isfile(ep_id_path):
             return None
+        with trace_storage.open_file(ep_id_path, "r") as f:
+            return f.readline().strip()
+
+    def _get_episode_to_trace_path(self, category: TaskCategory) -> Dict[str, str]:
+        """episode -> trace folder of all ground-truth traces in a category"""
+        if category in self._episode_to_trace_path:
+            return self._episode_to_trace_path[category]
+
+        gr_category_path = os.path.join(self.gr_dataset_path, category.value)
+        episode_to_path = {}
+        if os.path.isdir(gr_category_path):
+            dirs = os.listdir(gr_category_path)
+            for dir in sorted(dirs):
+                path = os.path.join(gr_category_path, dir)
+                # packed or archived trace folders, unless the folder exists
+                folder = trace_storage.strip_storage_suffix(dir)
+                if folder is not None:
+                    if folder in dirs:
+                        continue
+                    path = trace_storage.resolve_trace_root(
+                        os.path.join(gr_category_path, folder)
+                    )
+                ep_id = self._read_episode_of_trace(path)
+                if ep_id is not None:
+                    episode_to_path[ep_id] = path
+        self._episode_to_trace_path[category] = episode_to_path
+        return episode_to_path
+
+    def _load_groundtruth_trace_by_dir(self, path: str) -> TaskTrace:
+        def load() -> TaskTrace:
+            indexed = self._load_groundtruth_trace_from_index(path)
+            if indexed is not None:
+                return indexed[1]
+            return self._load_groundtruth_trace_by_path(path)
+
+        return self.trace_cache.get_or_load(("groundtruth", path), load)
 
-    @lru_cache(maxsize=None)
     def _load_groundtruth_trace_by_category(
         self, category: TaskCategory
     ) -> Dict[str, TaskTrace]:
@@ -396,24 +810,51 @@ class DatasetHelper:
             ...
         }
         """
-        gr_category_path = os.path.join(self.gr_dataset_path, category.value)
         gt_trace_dict = {}
-        dirs = [
-            d
-            for d in os.listdir(gr_category_path)
-            if os.path.isdir(os.path.join(gr_category_path, d))
-        ]
-        dirs.sort()
-        for dir in dirs:
-            path = os.path.join(gr_category_path, dir)
-            ep_id_path = os.path.join(path, "instruction.txt")
-            with open(ep_id_path, "r") as f:
-                ep_id = f.readline().strip()
+        for ep_id, path in self._get_episode_to_trace_path(category).items():
+            gt_trace_dict[ep_id] = self._load_groundtruth_trace_by_dir(path)
+        return gt_trace_dict
 
-            ep_trace: TaskTrace = self._load_groundtruth_trace_by_path(path)
-            gt_trace_dict[ep_id] = ep_trace
+    def build_dataset_index(self) -> None:
+        """Parse all ground-truth traces into self.dataset_index, so that they
+        are loaded without parsing the raw files"""
+        self.dataset_index.build(self)
+        self.trace_cache.invalidate(lambda key: key[0] == "groundtruth")
+
+    def _load_groundtruth_trace_from_index(
+        self, path: str
+    ) -> Optional[Tuple[str, TaskTrace]]:
+        """Return (episode, trace) of the trace folder *path* from the dataset
+        index, or None if it is not indexed or has changed since then"""
+        if not self.dataset_index.exists():
+            return None
+        indexed = self.dataset_index.load_trace(path)
+        if indexed is None:
+            return None
 
-        return gt_trace_dict
+        ep_id, indexed_ui_states = indexed
+        ep_trace_list: TaskTrace = []
+        for i, action, activity, essential_state, screen_size in indexed_ui_states:
+            if essential_state is not None:
+                essential_state = DefaultDict(
+                    list,
+                    {
+                        EssentialStateKeyword(keyword): contents
+                        for keyword, contents in essential_state.items()
+                    },
+                )
+            ep_trace_list.append(
+                UIState.in_trace_folder(
+                    path,
+                    index=i,
+                    activity=activity,
+                    action=action,
+                    state_type="groundtruth",
+                    essential_state=essential_state,
+                    screen_size=screen_size,
+                )
+            )
+        return ep_id, TraceTable(ep_trace_list)
 
     def _extract_actions_from_file(self, path: str) -> List[Action]:
         """Actions for one episode are recorded in one file.
@@ -430,7 +871,8 @@ class DatasetHelper:
         ...
         """
         action_list = []
-        action_texts = open(path, "r").readlines()
+        with trace_storage.open_file(path, "r") as f:
+            action_texts = f.readlines()
 
         # this for-range is for processing the action record
         for action_text in action_texts:
@@ -495,9 +937,12 @@ class DatasetHelper:
         return action_list
 
     def _extract_activity_from_file(self, path: str) -> str:
+        with trace_storage.open_file(path) as f:
+            return self._parse_activity(f.read())
+
+    def _parse_activity(self, content: str) -> str:
         """convert com.android.settings/.Settings to com.android.settings.Settings"""
-        with open(path) as f:
-            line = f.read().strip()
+        line = content.strip()
         if "mObscuringWindow" in line:
             raise Exception(f"Activity format error: {line}")
 
@@ -509,37 +954,23 @@ class DatasetHelper:
     def _load_groundtruth_trace_by_path(self, path: str) -> TaskTrace:
         self.logger.debug(f"loading groundtruth trace in path: {path}")
         ep_trace_list: TaskTrace = []
-        # the task trace folder may contain png-format images
-        # their name could be 0.png, 1.png, and 0_drawed.png, 1_drawed.png
-        # 0_drawed.png and 1_drawed.png are used in the annotation process
-        # we only want to get 0.png and 1.png
-        files = [
-            f for f in os.listdir(path) if f.endswith(".png") and "drawed" not in f
-        ]
-        files.sort()
-
+        # the trace folder may contain 0_drawed.png, 1_drawed.png, ... used in
+        # the annotation process; UIStates are the ones with recorded actions
         action_path = os.path.join(path, "eventStructs.txt")
         action_list = self._extract_actions_from_file(action_path)
 
         # iterate in [0, 1, 2, 3, ..., # of all ui states]
         for i in range(len(action_list)):
             action = action_list[i]
-            img_path = os.path.join(path, f"{i}.png")
-            xml_path = img_path.replace("png", "xml")
-            vh_json_path = img_path.replace("png", "vh")
-            vh_simp_ui_json_path = img_path.replace("png", "json")
-            activity_file = img_path.replace("png", "activity")
+            activity_file = os.path.join(path, f"{i}.activity")
             activity = self._extract_activity_from_file(activity_file)
             ep_trace_list.append(
-                UIState(
+                UIState.in_trace_folder(
+                    path,
                     index=i,
-                    screenshot_path=img_path,
-                    vh_path=xml_path,
-                    vh_json_path=vh_json_path,
-                    vh_simp_ui_json_path=vh_simp_ui_json_path,
                     activity=activity,
                     action=action,
                     state_type="groundtruth",
                 )
             )
-        return ep_trace_list
+        return TraceTable(ep_trace_list)
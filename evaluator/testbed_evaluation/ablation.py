@@ -0,0 +1,259 @@
+"""Evaluating all ablation configurations of TestbedEvaluator in one pass.
+
+An ablation configuration enables a subset of the checks of
+TestbedEvaluator.check_essential_state_match. Instead of evaluating the
+episodes once per configuration, AblationSweep runs every check at most once
+per (ground-truth UIState, exec UIState) pair and records its outcomes as two
+bitmasks of Check: the checks that passed (or do not apply to the annotated
+essential states), and the checks that raised an exception. The greedy match
+of TestbedEvaluator.eval_impl is then replayed for every configuration on the
+recorded outcomes.
+"""
+
+from enum import IntFlag
+from typing import Dict, List, Mapping, Optional, Tuple, Union
+
+from imagehash import ImageHash
+
+from ..task_trace import EssentialStateKeyword, TaskTrace, UIState
+from .exact_match import (
+    check_activity_match,
+    check_click_match,
+    check_type_match,
+    check_uicomponent_match,
+)
+from .fuzzy_match import ScreenSimilarityMatrix, check_fuzzy_match
+from .system_state_match import check_install_match, check_uninstall_match
+
+
+class Check(IntFlag):
+    """Checks of an essential state, in the order they are run"""
+
+    SCREEN_LEVEL_FUZZY = 1
+    TEXTBOX_FUZZY = 2
+    ACTIVITY = 4
+    UI_COMPONENT = 8
+    TYPE = 16
+    CLICK = 32
+    INSTALL = 64
+    UNINSTALL = 128
+
+
+ALL_CHECKS = Check(sum(Check))
+
+# option of TestbedEvaluator -> checks it enables
+CHECKS_OF_OPTION = {
+    "screen_level_fuzzy_match": Check.SCREEN_LEVEL_FUZZY,
+    "textbox_fuzzy_match": Check.TEXTBOX_FUZZY,
+    "activity_exact_match": Check.ACTIVITY,
+    "action_exact_match": Check.TYPE | Check.CLICK,
+    "UI_component_exact_match": Check.UI_COMPONENT,
+    "system_state_exact_match": Check.INSTALL | Check.UNINSTALL,
+}
+
+# the ablation table: name -> options of TestbedEvaluator
+DEFAULT_ABLATION_CONFIGS: Dict[str, Dict[str, bool]] = {
+    "all": {},
+    "only_fuzzy_match": {"exact_match": False},
+    "only_exact_match": {"fuzzy_match": False},
+    **{
+        f"only_{option}": {"fuzzy_match": False, "exact_match": False, option: True}
+        for option in CHECKS_OF_OPTION
+    },
+}
+
+
+def get_check_flags(options: Optional[Dict]) -> Dict[str, bool]:
+    """The six check flags of TestbedEvaluator (see CHECKS_OF_OPTION)
+    configured by its options.
+
+    Close [fuzzy_match] means close all related to fuzzy match, close
+    [exact_match] means close all related to exact match, and open
+    [screen_level_fuzzy_match, etc.] means only open itself.
+    """
+    fuzzy_match = options.get("fuzzy_match", True) if options else True
+    exact_match = options.get("exact_match", True) if options else True
+    flags = {
+        option: options.get(option, False) if options else False
+        for option in CHECKS_OF_OPTION
+    }
+    assert sum(flags.values()) <= 1, "Only one ablation study can be enabled"
+    if fuzzy_match:
+        flags["screen_level_fuzzy_match"] = True
+        flags["textbox_fuzzy_match"] = True
+    if exact_match:
+        flags["activity_exact_match"] = True
+        flags["action_exact_match"] = True
+        flags["UI_component_exact_match"] = True
+        flags["system_state_exact_match"] = True
+    return flags
+
+
+def get_required_checks(flags: Dict[str, bool]) -> Check:
+    required = Check(0)
+    for option, enabled in flags.items():
+        if enabled:
+            required |= CHECKS_OF_OPTION[option]
+    return required
+
+
+# outcomes of all checks of a (gr UIState, exec UIState) pair:
+# (passed checks, checks raising an exception, the exception of each of them)
+CheckOutcomes = Tuple[Check, Check, Dict[Check, Exception]]
+
+
+def run_checks(
+    gr_ui_state: UIState,
+    exec_ui_state: UIState,
+    similarity_matrix: Optional[ScreenSimilarityMatrix] = None,
+    patch_hashes: Optional[Mapping[Tuple[int, int], ImageHash]] = None,
+    enabled: Check = ALL_CHECKS,
+) -> CheckOutcomes:
+    """Run the *enabled* checks of the essential states of *gr_ui_state* on
+    *exec_ui_state*; checks of keywords absent from the essential states
+    pass, other checks neither pass nor raise"""
+    es_dict = gr_ui_state.essential_state
+    checks = [
+        (
+            Check.SCREEN_LEVEL_FUZZY,
+            EssentialStateKeyword.FUZZY,
+            lambda: check_fuzzy_match(
+                gr_ui_state, exec_ui_state, True, False, similarity_matrix
+            ),
+        ),
+        (
+            Check.TEXTBOX_FUZZY,
+            EssentialStateKeyword.FUZZY,
+            lambda: check_fuzzy_match(
+                gr_ui_state, exec_ui_state, False, True, similarity_matrix
+            ),
+        ),
+        (
+            Check.ACTIVITY,
+            EssentialStateKeyword.ACTIVITY,
+            lambda: check_activity_match(gr_ui_state, exec_ui_state),
+        ),
+        (
+            Check.UI_COMPONENT,
+            EssentialStateKeyword.EXACT,
+            lambda: check_uicomponent_match(gr_ui_state, exec_ui_state, patch_hashes),
+        ),
+        (
+            Check.TYPE,
+            EssentialStateKeyword.TYPE,
+            lambda: check_type_match(gr_ui_state, exec_ui_state),
+        ),
+        (
+            Check.CLICK,
+            EssentialStateKeyword.CLICK,
+            lambda: check_click_match(gr_ui_state, exec_ui_state),
+        ),
+        (
+            Check.INSTALL,
+            EssentialStateKeyword.CHECK_INSTALL,
+            lambda: check_install_match(gr_ui_state, exec_ui_state),
+        ),
+        (
+            Check.UNINSTALL,
+            EssentialStateKeyword.CHECK_UNINSTALL,
+            lambda: check_uninstall_match(gr_ui_state, exec_ui_state),
+        ),
+    ]
+
+    passed, errors, exceptions = Check(0), Check(0), {}
+    for check, keyword, run in checks:
+        if not check & enabled:
+            continue
+        if not es_dict.get(keyword, None):
+            passed |= check
+            continue
+        try:
+            if run():
+                passed |= check
+        except Exception as e:
+            errors |= check
+            exceptions[check] = e
+    return passed, errors, exceptions
+
+
+class AblationSweep:
+    """Greedy match of TestbedEvaluator.eval_impl for any set of required
+    checks, sharing the outcomes of checks between configurations"""
+
+    def __init__(
+        self,
+        gr_trace: TaskTrace,
+        exec_trace: TaskTrace,
+        similarity_matrix: Optional[ScreenSimilarityMatrix] = None,
+        patch_hashes: Optional[Mapping[Tuple[int, int], ImageHash]] = None,
+        enabled: Check = ALL_CHECKS,
+    ) -> None:
+        self.gr_trace = gr_trace
+        self.exec_trace = exec_trace
+        self.similarity_matrix = similarity_matrix
+        self.patch_hashes = patch_hashes
+        # checks run on each pair: those required by any configuration
+        self.enabled = enabled
+        # (gr index, exec index) -> outcomes of the pair
+        self._outcomes: Dict[Tuple[int, int], CheckOutcomes] = {}
+
+    def outcomes(self, i: int, j: int) -> CheckOutcomes:
+        if (i, j) not in self._outcomes:
+            self._outcomes[(i, j)] = run_checks(
+                self.gr_trace[i],
+                self.exec_trace[j],
+                self.similarity_matrix,
+                self.patch_hashes,
+                self.enabled,
+            )
+        return self._outcomes[(i, j)]
+
+    def state_match(self, i: int, j: int, required: Check) -> bool:
+        passed, errors, exceptions = self.outcomes(i, j)
+        for check in Check:
+            if not check & required:
+                continue
+            # the first failing or raising check decides, as in
+            # TestbedEvaluator.check_essential_state_match
+            if check & errors:
+                raise exceptions[check]
+            if not check & passed:
+                return False
+        return True
+
+    def eval(self, required: Check) -> Tuple[bool, Optional[str]]:
+        """(completeness, failed_reason) with the *required* checks; raises
+        the exception of a required check like eval_impl does"""
+        assert required & self.enabled == required, "Required checks are not run"
+        j = 0
+        for i, ui_state in enumerate(self.gr_trace):
+            if ui_state.essential_state is None:
+                continue
+            if j == len(self.exec_trace):
+                return False, "Remaining essential states are not matched"
+            gr_ui_state_matched = False
+            while j < len(self.exec_trace):
+                j += 1
+                if self.state_match(i, j - 1, required):
+                    gr_ui_state_matched = True
+                    break
+            if not gr_ui_state_matched:
+                return False, None
+        return True, None
+
+    def release(self) -> None:
+        for ui_state in self.exec_trace:
+            ui_state.release_vh_tree()
+
+    def num_evaluated_pairs(self) -> int:
+        return len(self._outcomes)
+
+
+def get_ablation_configs(option: Union[bool, List[str], Dict]) -> Dict[str, Dict]:
+    """Ablation configurations of the "ablation_sweep" option: True for
+    DEFAULT_ABLATION_CONFIGS, a list of their names, or name -> options"""
+    if option is True:
+        return dict(DEFAULT_ABLATION_CONFIGS)
+    if isinstance(option, dict):
+        return dict(option)
+    return {name: DEFAULT_ABLATION_CONFIGS[name] for name in option}
@@ -0,0 +1,158 @@
+"""CPU inference backends of the sentence-embedding model.
+
+- "torch": the original sentence-transformers model in full precision.
+- "onnx": the transformer exported once to a local ONNX file and run by
+  onnxruntime; mean pooling and L2 normalization are done in NumPy.
+- "onnx-int8": the exported ONNX model with dynamically quantized int8 weights.
+
+All backends return L2-normalized float32 embeddings of shape (n, dim).
+"""
+
+import inspect
+import logging
+import os
+import re
+from typing import List
+
+import numpy as np
+
+BACKENDS = ["torch", "onnx", "onnx-int8"]
+
+ONNX_EXPORT_DIR = os.path.join(os.path.dirname(__file__), "onnx_models")
+
+
+class TorchBackend:
+    def __init__(self, model_name: str, device: str = "cpu") -> None:
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name_or_path=model_name, device=device)
+
+    def encode(self, sentences: List[str], batch_size: int = 32) -> np.ndarray:
+        return self.model.encode(
+            sentences,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
+
+
+def export_onnx(model_name: str, export_dir: str, quantize: bool = False) -> str:
+    """Export the transformer of a sentence-transformers model to
+    *export_dir*/model.onnx along with its tokenizer, and optionally quantize
+    it to *export_dir*/model_int8.onnx.
+
+    Return:
+        path of the (quantized) ONNX model
+    """
+    onnx_path = os.path.join(export_dir, "model.onnx")
+    int8_path = os.path.join(export_dir, "model_int8.onnx")
+
+    if not os.path.exists(onnx_path):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        logging.getLogger(__name__).info(f"Exporting {model_name} to {onnx_path}")
+        st_model = SentenceTransformer(model_name_or_path=model_name, device="cpu")
+        # older sentence-transformers versions use one flag per pooling mode
+        pooling_config = st_model[1].get_config_dict()
+        assert pooling_config.get("pooling_mode") == "mean" or pooling_config.get(
+            "pooling_mode_mean_tokens"
+        ), f"only mean pooling is supported, got: {pooling_config}"
+
+        os.makedirs(export_dir, exist_ok=True)
+        st_model.tokenizer.save_pretrained(export_dir)
+        with open(os.path.join(export_dir, "max_seq_length.txt"), "w") as f:
+            f.write(str(st_model.max_seq_length))
+
+        class _Transformer(torch.nn.Module):
+            # pass inputs by name, as the forward signature differs across
+            # versions of transformers
+            def __init__(self, auto_model) -> None:
+                super().__init__()
+                self.auto_model = auto_model
+
+            def forward(self, input_ids, attention_mask, token_type_ids):
+                return self.auto_model(
+                    input_ids=input_ids,
+                    attention_mask=attention_mask,
+                    token_type_ids=token_type_ids,
+                )[0]
+
+        transformer = _Transformer(st_model[0].auto_model).eval()
+        dummy = st_model.tokenizer(["export"], return_tensors="pt")
+        input_names = ["input_ids", "attention_mask", "token_type_ids"]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        export_kwargs = dict(
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+        # newer torch versions export through dynamo by default
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            export_kwargs["dynamo"] = False
+        with torch.no_grad():
+            torch.onnx.export(
+                transformer,
+                tuple(dummy[name] for name in input_names),
+                onnx_path,
+                **export_kwargs,
+            )
+
+    if not quantize:
+        return onnx_path
+
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(onnx_path, int8_path, weight_type=QuantType.QInt8)
+    return int8_path
+
+
+class OnnxBackend:
+    def __init__(self, model_name: str, quantize: bool = False) -> None:
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        export_dir = os.path.join(ONNX_EXPORT_DIR, re.sub(r"[^\w.-]", "_", model_name))
+        onnx_path = export_onnx(model_name, export_dir, quantize=quantize)
+
+        self.tokenizer = AutoTokenizer.from_pretrained(export_dir)
+        with open(os.path.join(export_dir, "max_seq_length.txt"), "r") as f:
+            self.max_seq_length = int(f.read())
+        self.session = ort.InferenceSession(
+            onnx_path, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def encode(self, sentences: List[str], batch_size: int = 32) -> np.ndarray:
+        embeddings = []
+        for start in range(0, len(sentences), batch_size):
+            inputs = self.tokenizer(
+                sentences[start : start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np",
+            )
+            token_embeddings = self.session.run(
+                None, {name: inputs[name].astype(np.int64) for name in self.input_names}
+            )[0]
+            # mean pooling over non-padding tokens, then L2 normalization
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(
+                mask.sum(axis=1), 1e-9, None
+            )
+            pooled /= np.clip(
+                np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None
+            )
+            embeddings.append(pooled.astype(np.float32))
+        return np.concatenate(embeddings)
+
+
+def load_backend(backend: str, model_name: str, device: str = "cpu"):
+    assert backend in BACKENDS, f"Unknown embedding backend: {backend}"
+    if backend == "torch":
+        return TorchBackend(model_name, device)
+    return OnnxBackend(model_name, quantize=backend == "onnx-int8")
@@ -0,0 +1,229 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows
+    fcntl = None
+
+# user folder of the files cached by the evaluators, outside the (possibly
+# read-only) dataset
+USER_CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "llamatouch",
+)
+# default folder of persisted embeddings; shared by all datasets, as
+# embeddings are keyed on their content
+DEFAULT_CACHE_DIR = os.path.join(USER_CACHE_DIR, "embeddings")
+
+
+class EmbeddingCache:
+    """Content-addressed store of sentence embeddings.
+
+    The key of an embedding is the sha256 hash of the model identity and the
+    embedded text (e.g., the simplified view of a screen). When `cache_dir` is
+    given, embeddings are persisted in the following files and are shared by
+    all processes and runs using the same directory:
+
+        - {model_id}.meta.json: {"model_id": str, "dim": int}
+        - {model_id}.f32: float32 matrix of shape (num_rows, dim), memory-mapped
+        - {model_id}.keys: one "{key} {row}" line per embedding
+
+    Rows of the .f32 file that are not fully written, or not listed in the
+    .keys file, are left by interrupted runs; they are truncated when the
+    cache is loaded so that appended rows stay aligned with their keys.
+
+    Without `cache_dir`, at most `max_memory_entries` recently used embeddings
+    are kept in memory.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        cache_dir: Optional[str] = None,
+        max_memory_entries: int = 20000,
+    ) -> None:
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.model_id = model_id
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+
+        self.dim: Optional[int] = None
+        # key -> row in self._vectors, with cache_dir
+        self._rows: Dict[str, int] = {}
+        # key -> embedding in least recently used order, without cache_dir
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        self._vectors: Optional[np.memmap] = None
+        self._num_rows = 0
+
+        self.hits = 0
+        self.misses = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            file_prefix = os.path.join(
+                self.cache_dir, re.sub(r"[^\w.-]", "_", self.model_id)
+            )
+            self._meta_path = f"{file_prefix}.meta.json"
+            self._vectors_path = f"{file_prefix}.f32"
+            self._keys_path = f"{file_prefix}.keys"
+            self._lock_path = f"{file_prefix}.lock"
+            self._load_index()
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_id}\0{text}".encode("utf-8")).hexdigest()
+
+    def __contains__(self, text: str) -> bool:
+        key = self.key(text)
+        return key in self._memory or key in self._rows
+
+    def __len__(self) -> int:
+        return len(self._rows.keys() | self._memory.keys())
+
+    def _load_index(self) -> None:
+        if not os.path.exists(self._meta_path):
+            return
+        with open(self._lock_path, "w") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            with open(self._meta_path, "r") as f:
+                self.dim = json.load(f)["dim"]
+            self._rows = self._repair_files(check_keys=True)
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        self._vectors = None
+        self.logger.info(
+            f"Loaded {len(self._rows)} cached embeddings from {self.cache_dir}"
+        )
+
+    def _repair_files(self, check_keys: bool = False) -> Dict[str, int]:
+        """Truncate what interrupted runs left partially written: a last line
+        of the .keys file without newline, and a last row of the .f32 file
+        that is not complete. With *check_keys*, the keys are also checked
+        against the rows of the .f32 file, and returned.
+
+        Must be called under the lock of the cache files.
+        """
+        row_size = self.dim * 4
+        num_rows = (
+            os.path.getsize(self._vectors_path) // row_size
+            if os.path.exists(self._vectors_path)
+            else 0
+        )
+        rows: Dict[str, int] = {}
+        if os.path.exists(self._keys_path):
+            with open(self._keys_path, "rb+") as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                if size > 0:
+                    f.seek(size - 1)
+                if check_keys or f.read(1) not in (b"", b"\n"):
+                    f.seek(0)
+                    content = f.read()
+                    # keep complete lines only
+                    end = content.rfind(b"\n") + 1
+                    if end < size:
+                        f.truncate(end)
+                    lines = content[:end].decode("utf-8").splitlines()
+            if check_keys:
+                num_lost_keys = 0
+                for line in lines:
+                    key, row = line.split()
+                    if int(row) < num_rows:
+                        rows[key] = int(row)
+                    else:
+                        num_lost_keys += 1
+                if num_lost_keys:
+                    self.logger.warning(
+                        f"Drop {num_lost_keys} cached embeddings missing in "
+                        f"{self._vectors_path}"
+                    )
+                    with open(self._keys_path, "w") as f:
+                        f.writelines(f"{key} {row}\n" for key, row in rows.items())
+        if check_keys:
+            # rows appended without their keys are never read
+            num_rows = max(rows.values(), default=-1) + 1
+        if (
+            os.path.exists(self._vectors_path)
+            and os.path.getsize(self._vectors_path) != num_rows * row_size
+        ):
+            with open(self._vectors_path, "rb+") as f:
+                f.truncate(num_rows * row_size)
+        return rows
+
+    def _get_vectors(self) -> np.memmap:
+        num_rows = os.path.getsize(self._vectors_path) // (self.dim * 4)
+        if self._vectors is None or self._num_rows != num_rows:
+            self._vectors = np.memmap(
+                self._vectors_path,
+                dtype=np.float32,
+                mode="r",
+                shape=(num_rows, self.dim),
+            )
+            self._num_rows = num_rows
+        return self._vectors
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self.key(text)
+        if key in self._memory:
+            self.hits += 1
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        if key in self._rows and os.path.exists(self._vectors_path):
+            row = self._rows[key]
+            vectors = self._get_vectors()
+            if row < len(vectors):
+                self.hits += 1
+                # read from the memory-mapped file, cached by the OS
+                return np.array(vectors[row])
+        self.misses += 1
+        return None
+
+    def put_many(self, texts: List[str], embeddings: np.ndarray) -> None:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        keys = [self.key(text) for text in texts]
+        if not self.cache_dir:
+            for key, embedding in zip(keys, embeddings):
+                self._memory[key] = embedding
+                self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+            return
+        if len(keys) == 0:
+            return
+
+        # rows are appended under an exclusive lock so that concurrent writers
+        # (e.g., evaluations of several agents) never interleave their rows
+        with open(self._lock_path, "w") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if self.dim is None and os.path.exists(self._meta_path):
+                with open(self._meta_path, "r") as f:
+                    self.dim = json.load(f)["dim"]
+            if self.dim is None:
+                self.dim = int(embeddings.shape[1])
+                with open(self._meta_path, "w") as f:
+                    json.dump({"model_id": self.model_id, "dim": self.dim}, f)
+            assert embeddings.shape[1] == self.dim, "embedding dimension mismatch"
+            # another writer may have been interrupted since the cache was loaded
+            self._repair_files()
+
+            with open(self._vectors_path, "ab") as f:
+                first_row = f.tell() // (self.dim * 4)
+                f.write(embeddings.tobytes())
+            with open(self._keys_path, "a") as f:
+                f.writelines(f"{key} {first_row + i}\n" for i, key in enumerate(keys))
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        for i, key in enumerate(keys):
+            self._rows[key] = first_row + i
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self), "hits": self.hits, "misses": self.misses}
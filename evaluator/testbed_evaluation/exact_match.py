@@ -1,13 +1,13 @@
-import json
 import re
-from typing import Dict, List, Optional
+from typing import Dict, List, Mapping, Optional, Tuple
 
 import imagehash
-from lxml import etree
 from PIL import Image
 
+from .. import trace_storage
 from ..common.action_type import ActionType
-from ..task_trace import EssentialStateKeyword, UIState
+from ..task_trace import EssentialStateKeyword, UIState, parse_bounds
+from ..utils.vh_tree import VHIndex
 
 
 def _get_image_patch(image: Image, bounds: List[int]) -> Image:
@@ -15,11 +15,51 @@ def _get_image_patch(image: Image, bounds: List[int]) -> Image:
     return image.crop((left, top, right, bottom))
 
 
+def get_image_patch_hash(
+    screenshot_path: str, bounds: Tuple[int, int, int, int]
+) -> imagehash.ImageHash:
+    """Average hash of the image patch of a screenshot within *bounds*"""
+    return imagehash.average_hash(
+        _get_image_patch(trace_storage.open_image(screenshot_path), list(bounds))
+    )
+
+
+def is_image_matched_node(annotated_ui_node: Mapping) -> bool:
+    """Whether the annotated UI node has neither text nor content-desc, and
+    is matched by its image patch instead"""
+    null_state = ["", " ", "null", None]
+    return (
+        annotated_ui_node.get("text", None) in null_state
+        and annotated_ui_node.get("content-desc", None) in null_state
+    )
+
+
+def get_annotated_patch_hashes(gr_ui_state: UIState) -> Dict[int, imagehash.ImageHash]:
+    """Hashes of the image patches of the UI nodes in exact<> annotations of
+    the ground-truth UIState that are matched by image, by node id"""
+    patch_hashes: Dict[int, imagehash.ImageHash] = {}
+    if not gr_ui_state.essential_state:
+        return patch_hashes
+    for node_id in gr_ui_state.essential_state.get(EssentialStateKeyword.EXACT, []):
+        node_id = int(node_id)
+        if node_id in patch_hashes or not is_image_matched_node(
+            gr_ui_state.annotated_ui_nodes[node_id]
+        ):
+            continue
+        patch_hashes[node_id] = get_image_patch_hash(
+            gr_ui_state.screenshot_path, gr_ui_state.annotated_ui_bounds[node_id]
+        )
+    return patch_hashes
+
+
 def _check_img_exact_match(
     annotated_ui_node: Dict,
     gr_screenshot_path: str,
     exec_screenshot_path: str,
     image_similarity_bound: Optional[int] = 1,
+    gr_bounds: Optional[Tuple[int, int, int, int]] = None,
+    gr_hash: Optional[imagehash.ImageHash] = None,
+    gr_screen_size: Optional[Tuple[int, int]] = None,
 ) -> bool:
     """
     Compare whether the image patch of the annotated UI component matches
@@ -30,24 +70,29 @@ def _check_img_exact_match(
         gr_screenshot_path: screenshot path of the annotated UI
         exec_screenshot_path: screenshot path of the execution UI
         image_similarity_bound: threshold to determine whether the image patches are similar
+        gr_bounds: parsed bounds of the annotated UI node, parsed from
+            annotated_ui_node["bounds"] if not given
+        gr_hash: hash of the annotated image patch, computed if not given
+        gr_screen_size: (width, height) of the annotated screenshot, read
+            from the screenshot if not given
 
     Return:
         boolean value indicating whether the image patch of the annotated UI component
         and the execution UI component matches
     """
-    gr_bounds = annotated_ui_node["bounds"]
+    if gr_bounds is None:
+        gr_bounds = parse_bounds(annotated_ui_node["bounds"])
     assert gr_bounds is not None
 
-    gr_screen_width, gr_screen_height = 0, 0
+    if gr_screen_size is None:
+        with trace_storage.open_image(gr_screenshot_path) as img:
+            gr_screen_size = img.size
+    gr_screen_width, gr_screen_height = gr_screen_size
     exec_screen_width, exec_screen_height = 0, 0
-    with Image.open(gr_screenshot_path) as img:
-        gr_screen_width, gr_screen_height = img.size
-    with Image.open(exec_screenshot_path) as img:
+    with trace_storage.open_image(exec_screenshot_path) as img:
         exec_screen_width, exec_screen_height = img.size
 
-    gr_l, gr_t, gr_r, gr_b = map(
-        int, re.findall(r"\[(\d+),(\d+)\]\[(\d+),(\d+)\]", gr_bounds)[0]
-    )
+    gr_l, gr_t, gr_r, gr_b = gr_bounds
     exec_l, exec_t, exec_r, exec_b = (
         gr_l * exec_screen_width / gr_screen_width,
         gr_t * exec_screen_height / gr_screen_height,
@@ -55,16 +100,12 @@ def _check_img_exact_match(
         gr_b * exec_screen_height / gr_screen_height,
     )
 
-    annotate_image_patch: Image = _get_image_patch(
-        Image.open(gr_screenshot_path), [gr_l, gr_t, gr_r, gr_b]
-    )
-    exec_image_patch: Image = _get_image_patch(
-        Image.open(exec_screenshot_path), [exec_l, exec_t, exec_r, exec_b]
+    if gr_hash is None:
+        gr_hash = get_image_patch_hash(gr_screenshot_path, gr_bounds)
+    exec_hash = get_image_patch_hash(
+        exec_screenshot_path, (exec_l, exec_t, exec_r, exec_b)
     )
 
-    gr_hash = imagehash.average_hash(annotate_image_patch)
-    exec_hash = imagehash.average_hash(exec_image_patch)
-
     if gr_hash - exec_hash > image_similarity_bound:
         print(
             f"[image] match fail: hamming distance: {gr_hash-exec_hash}, '{gr_screenshot_path}' with '{exec_screenshot_path}'"
@@ -78,108 +119,64 @@ def _check_img_exact_match(
 
 
 def _check_exact_single_node_match(
-    annotated_ui_node: Dict, exec_ui_node: etree.ElementTree
+    annotated_ui_node: Dict, exec_vh_index: VHIndex
 ) -> bool:
     """Compare whether current UI representation in the execution trace matches
     the annotated UI component.
     The annotated UI component should be matched only when all attributes like
-    'text', 'content-desc', 'checked', 'resource-id', etc. are matched.
+    'text', 'content-desc', 'checked', 'resource-id', etc. (EXACT_MATCH_ATTRS)
+    are matched.
 
     Args:
         annotated_ui_node: annotated essential state that represents a UI node
-        exec_ui_node: UI hierarchy tree of one screen in the execution trace
+        exec_vh_index: index over the UI hierarchy tree of one screen in the
+            execution trace
 
     Return:
         boolean value indicating whether there is one node in the current UI
         matches the annotated one
     """
-    checked_attrs = [
-        "class",
-        "text",
-        "resource-id",
-        "content-desc",
-        "enabled",
-        "checked",
-        "checkable",
-        "selected",
-        "focused",
-        "focusable",
-        "clickable",
-        "long-clickable",
-        "password",
-        "scrollable",
-    ]
-
-    # for each node, we need to check all attributes listed above
-    for node in exec_ui_node.iter():
-
-        # modify this variable to False until current node doesnot match the annotated one
-        find_node_match = True
-        for attr in checked_attrs:
-            assert attr in annotated_ui_node
-            node_attr = node.get(attr)
-            annotate_ui_node_attr = annotated_ui_node.get(attr)
-
-            if node_attr is None:
-                if annotate_ui_node_attr == None or annotate_ui_node_attr in [
-                    "",
-                    " ",
-                    "null",
-                ]:
-                    continue
-                else:
-                    find_node_match = False
-                    break
-
-            if node_attr == "true":
-                node_attr = True
-            if node_attr == "false":
-                node_attr = False
-            if attr == "text" or attr == "content-desc":
-                annotate_ui_node_attr = annotate_ui_node_attr.lower()
-                node_attr = node_attr.lower()
-
-            if node_attr == annotate_ui_node_attr:
-                continue
-            else:
-                find_node_match = False
-                break
-
-        if find_node_match:
-            return True
-    return False
-
-
-def check_uicomponent_match(gr_ui_state: UIState, exec_ui_state: UIState) -> bool:
-    """Exact match on two UI components"""
+    return exec_vh_index.has_exact_match(annotated_ui_node)
+
+
+def check_uicomponent_match(
+    gr_ui_state: UIState,
+    exec_ui_state: UIState,
+    patch_hashes: Optional[Mapping[Tuple[int, int], imagehash.ImageHash]] = None,
+) -> bool:
+    """Exact match on two UI components
+
+    Args:
+        patch_hashes: precomputed hashes of annotated image patches, by
+            (index of the ground-truth UIState, node id)
+    """
     match_node_ids: List[str] = gr_ui_state.essential_state[EssentialStateKeyword.EXACT]
-    null_state = ["", " ", "null", None]
 
-    parser = etree.XMLParser(recover=True, encoding="utf-8")
-    exec_ui_tree = etree.parse(exec_ui_state.vh_path, parser)
+    exec_vh_index = exec_ui_state.get_vh_index()
 
     for node_id in match_node_ids:
         node_id = int(node_id)
-        gr_vh_simp_ui_json_path = gr_ui_state.vh_simp_ui_json_path
-        annotated_ui_repr: Dict = json.load(
-            open(gr_vh_simp_ui_json_path, "r", encoding="utf-8")
-        )[node_id]
-
-        if (
-            annotated_ui_repr.get("text", None) in null_state
-            and annotated_ui_repr.get("content-desc", None) in null_state
-        ):
+        annotated_ui_repr: Mapping = gr_ui_state.annotated_ui_nodes[node_id]
+
+        if is_image_matched_node(annotated_ui_repr):
             if not _check_img_exact_match(
                 annotated_ui_repr,
                 gr_ui_state.screenshot_path,
                 exec_ui_state.screenshot_path,
+                gr_bounds=gr_ui_state.annotated_ui_bounds[node_id],
+                gr_screen_size=gr_ui_state.screen_size,
+                gr_hash=(
+                    patch_hashes.get((gr_ui_state.index, node_id))
+                    if patch_hashes
+                    else None
+                ),
             ):
                 return False
 
         else:
             # if there is one annotated UI component (indicated by node_id) has no
             # matched counterpart, directly return False to indicate
-            if not _check_exact_single_node_match(annotated_ui_repr, exec_ui_tree):
+            if not _check_exact_single_node_match(annotated_ui_repr, exec_vh_index):
                 # print(f"[textbox] match failed: '{gr_ui_state.screenshot_path}', essential state: {annotated_ui_repr}")
                 return False
 
@@ -228,13 +225,9 @@ def check_click_match(gr_ui_state: UIState, exec_ui_state: UIState) -> bool:
         return False
 
     gr_click_id = int(gr_ui_state.essential_state[EssentialStateKeyword.CLICK][0])
-    gr_vh_simp_ui_json_path = gr_ui_state.vh_simp_ui_json_path
-    gr_click_xpath: str = json.load(
-        open(gr_vh_simp_ui_json_path, "r", encoding="utf-8")
-    )[gr_click_id]["xpath"]
+    gr_click_xpath: str = gr_ui_state.annotated_ui_nodes[gr_click_id]["xpath"]
 
-    parser = etree.XMLParser(recover=True, encoding="utf-8")
-    exec_ui_tree = etree.parse(exec_ui_state.vh_path, parser)
+    exec_ui_tree = exec_ui_state.get_vh_tree()
 
     found_nodes = exec_ui_tree.xpath(gr_click_xpath)
     if len(found_nodes) == 0:
@@ -248,10 +241,9 @@ def check_click_match(gr_ui_state: UIState, exec_ui_state: UIState) -> bool:
     )
 
     screen_width, screen_height = 0, 0
-    with Image.open(exec_ui_state.screenshot_path) as img:
+    with trace_storage.open_image(exec_ui_state.screenshot_path) as img:
         screen_width, screen_height = img.size
 
-    # screen_width, screen_height = Image.open(exec_ui_state.screenshot_path).size
     y = exec_ui_state.action.touch_point_yx[0] * screen_height
     x = exec_ui_state.action.touch_point_yx[1] * screen_width
 
@@ -1,26 +1,132 @@
 import json
-import os
-from typing import Dict, List
+from functools import lru_cache
+from typing import Dict, List, Mapping, Optional, Tuple
 
-from lxml import etree
+import numpy as np
 
-from ..task_trace import EssentialStateKeyword, UIState
+from .. import trace_storage
+from ..task_trace import EssentialStateKeyword, TaskTrace, UIState
 from ..utils.autodroid_vh2html import simplify_views
-from .sentence_similarity import check_sentence_similarity
+from .sentence_similarity import EmbeddingService, check_sentence_similarity
 
+SCREEN_SIMILARITY_THRESHOLD = 0.85
 
-def compare_entire_ui_vh(gr_ui_state: UIState, exec_ui_state: UIState) -> bool:
+
+@lru_cache(maxsize=4096)
+def load_simplified_views(vh_json_path: str) -> str:
+    """Simplified views of a droidbot view hierarchy; the text to be embedded"""
+    with trace_storage.open_file(vh_json_path, "r") as f:
+        return simplify_views(json.load(f))
+
+
+def has_screen_level_fuzzy_state(ui_state: UIState) -> bool:
+    """Whether the ground-truth UIState is annotated with fuzzy<-1>"""
+    if ui_state.essential_state is None:
+        return False
+    node_ids = ui_state.essential_state.get(EssentialStateKeyword.FUZZY, [])
+    return any(int(node_id) == -1 for node_id in node_ids)
+
+
+def get_screen_level_fuzzy_ui_states(
+    gr_trace: TaskTrace, exec_trace: TaskTrace
+) -> Tuple[List[UIState], List[UIState]]:
+    """UIStates whose simplified views are compared by screen-level fuzzy match"""
+    gr_ui_states = [s for s in gr_trace if has_screen_level_fuzzy_state(s)]
+    if not gr_ui_states:
+        return [], []
+    # WARNING: AgentEnv for AppAgent can't get VH
+    exec_ui_states = [s for s in exec_trace if trace_storage.exists(s.vh_json_path)]
+    return gr_ui_states, exec_ui_states
+
+
+class ScreenSimilarityMatrix:
+    """Screen-level similarities between the ground-truth UIStates annotated
+    with fuzzy<-1> and all UIStates of an execution trace in one episode.
+
+    Simplified views of all these UIStates are embedded in one batched call,
+    and the cosine similarities of all (gr, exec) pairs are computed with one
+    matrix multiplication, so that the greedy essential-state scan only looks
+    up scores instead of running the model for every compared pair.
+
+    Embeddings of the ground-truth UIStates may be given in *gr_embeddings*
+    (index of the UIState -> embedding), e.g., precomputed once for all
+    agents evaluated on the episode; only the exec UIStates are then embedded.
+    """
+
+    def __init__(
+        self,
+        gr_trace: TaskTrace,
+        exec_trace: TaskTrace,
+        embedding_service: Optional[EmbeddingService] = None,
+        gr_embeddings: Optional[Mapping[int, np.ndarray]] = None,
+    ) -> None:
+        embedding_service = embedding_service or EmbeddingService()
+
+        gr_ui_states, exec_ui_states = get_screen_level_fuzzy_ui_states(
+            gr_trace, exec_trace
+        )
+
+        # ui_state.index -> row/column of self.matrix
+        self.gr_rows: Dict[int, int] = {s.index: i for i, s in enumerate(gr_ui_states)}
+        self.exec_columns: Dict[int, int] = {
+            s.index: j for j, s in enumerate(exec_ui_states)
+        }
+        self.matrix = np.zeros((len(gr_ui_states), len(exec_ui_states)))
+        if not gr_ui_states or not exec_ui_states:
+            return
+
+        if gr_embeddings is not None and all(
+            s.index in gr_embeddings for s in gr_ui_states
+        ):
+            gr_matrix = np.stack([gr_embeddings[s.index] for s in gr_ui_states])
+            exec_matrix = embedding_service.encode(
+                [load_simplified_views(s.vh_json_path) for s in exec_ui_states]
+            )
+        else:
+            embeddings = embedding_service.encode(
+                [load_simplified_views(s.vh_json_path) for s in gr_ui_states]
+                + [load_simplified_views(s.vh_json_path) for s in exec_ui_states]
+            )
+            gr_matrix = embeddings[: len(gr_ui_states)]
+            exec_matrix = embeddings[len(gr_ui_states) :]
+        # embeddings are L2-normalized; their dot products are cosine similarities
+        self.matrix = gr_matrix @ exec_matrix.T
+
+    def get(self, gr_ui_state: UIState, exec_ui_state: UIState) -> Optional[float]:
+        if (
+            gr_ui_state.index not in self.gr_rows
+            or exec_ui_state.index not in self.exec_columns
+        ):
+            return None
+        return float(
+            self.matrix[self.gr_rows[gr_ui_state.index]][
+                self.exec_columns[exec_ui_state.index]
+            ]
+        )
+
+
+def compare_entire_ui_vh(
+    gr_ui_state: UIState,
+    exec_ui_state: UIState,
+    similarity_matrix: Optional[ScreenSimilarityMatrix] = None,
+) -> bool:
     gr_vh_json_path = gr_ui_state.vh_json_path
     exec_vh_json_path = exec_ui_state.vh_json_path
-    gr_views: str = simplify_views(json.load(open(gr_vh_json_path)))
     # WARNING: AgentEnv for AppAgent can't get VH
-    if not os.path.exists(exec_vh_json_path):
+    if not trace_storage.exists(exec_vh_json_path):
         return True
-    exec_views: str = simplify_views(json.load(open(exec_vh_json_path)))
 
-    similarity, similar = check_sentence_similarity(
-        gr_views, exec_views, threshold=0.85
+    similarity = (
+        similarity_matrix.get(gr_ui_state, exec_ui_state) if similarity_matrix else None
     )
+    if similarity is not None:
+        similar = similarity > SCREEN_SIMILARITY_THRESHOLD
+    else:
+        gr_views: str = load_simplified_views(gr_vh_json_path)
+        exec_views: str = load_simplified_views(exec_vh_json_path)
+        similarity, similar = check_sentence_similarity(
+            gr_views, exec_views, threshold=SCREEN_SIMILARITY_THRESHOLD
+        )
     if similar:
         print(
             f"[screen fuzzy match] success: '{gr_ui_state.screenshot_path}' with '{exec_ui_state.screenshot_path}', similarity: {similarity}"
@@ -34,6 +140,7 @@ def check_fuzzy_match(
     exec_ui_state: UIState,
     screen_level_fuzzy_match: bool = True,
     textbox_fuzzy_match: bool = True,
+    similarity_matrix: Optional[ScreenSimilarityMatrix] = None,
 ) -> bool:
     fuzzy_match_node_ids: List[str] = gr_ui_state.essential_state[
         EssentialStateKeyword.FUZZY
@@ -60,7 +167,7 @@ def check_fuzzy_match(
         # node_id = -1 indicates that the entire UI is to be compared
         if node_id == -1:
             if not screen_level_fuzzy_match or compare_entire_ui_vh(
-                gr_ui_state, exec_ui_state
+                gr_ui_state, exec_ui_state, similarity_matrix
             ):
                 # this node has matched, go to the next node
                 continue
@@ -103,10 +210,7 @@ def check_fuzzy_match(
             "bounds": "[189,266][890,323]"
         }
         """
-        gr_vh_simp_ui_json_path = gr_ui_state.vh_simp_ui_json_path
-        annotated_ui_repr: Dict = json.load(
-            open(gr_vh_simp_ui_json_path, "r", encoding="utf-8")
-        )[node_id]
+        annotated_ui_repr: Mapping = gr_ui_state.annotated_ui_nodes[node_id]
         target_text = annotated_ui_repr["text"]
         target_class = annotated_ui_repr["class"]
         target_resource_id = annotated_ui_repr["resource-id"]
@@ -118,21 +222,8 @@ def check_fuzzy_match(
         find whether there is an XML item in exec_ui_state that matches the 
         1. target_text, 2. target_class, 3. target_resource_id
         """
-        parser = etree.XMLParser(recover=True, encoding="utf-8")
-
-        exec_vh_path = exec_ui_state.vh_path
-        exec_ui_tree = etree.parse(exec_vh_path, parser)
-
-        node_text_matched = False
-        for node in exec_ui_tree.getroot().iter():
-            node_text = node.get("text", "")
-            node_class = node.get("class", "'")
-            node_resource_id = node.get("resource-id", "")
-            # TODO: check if node_text and target_text are semantically similar
-            if node_text == target_text:
-                # finish this iteration: there is one node identical to the target node
-                node_text_matched = True
-                break
+        # TODO: check if node_text and target_text are semantically similar
+        node_text_matched = exec_ui_state.get_vh_index().has_text(target_text)
 
         # if this annotated node has been matched, go to the next node
         # else this UIState in the exec trace doesnot match the ground-truth UIState
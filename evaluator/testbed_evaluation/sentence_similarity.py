@@ -1,18 +1,193 @@
-from sentence_transformers import SentenceTransformer, util
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Union
 
+import numpy as np
 
-def compute_sentence_similiarity(sentence1: str, sentence2: str) -> float:
-    model = SentenceTransformer(
-        model_name_or_path="all-MiniLM-L6-v2",
-        device="cpu",
-    )
+from .embedding_backend import BACKENDS, load_backend
+from .embedding_cache import EmbeddingCache
+
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+
+class EmbeddingService:
+    """A singleton class owning the sentence-embedding model of the process.
+
+    The model is loaded lazily on the first call to `encode` (or explicitly
+    through `warm_up`) and is then reused by every fuzzy comparison, instead
+    of being reloaded from disk for each sentence pair.
+
+    The inference backend ("torch", "onnx" or "onnx-int8", see
+    embedding_backend.py) can be selected with `set_backend` before the model
+    is loaded.
+    """
+
+    _instance = None
+
+    def __new__(cls, *args, **kwargs):
+        if not cls._instance:
+            cls._instance = super(EmbeddingService, cls).__new__(cls)
+            cls._instance._initialized = False
+        return cls._instance
+
+    def __init__(
+        self, model_name: str = MODEL_NAME, device: str = "cpu", backend: str = "torch"
+    ) -> None:
+        if self._initialized:
+            return
+        self._initialized = True
+        self.logger = logging.getLogger(self.__class__.__name__)
+
+        self.model_name = model_name
+        self.device = device
+        self.backend = backend
+        self._model = None
+        self._lock = threading.Lock()
+        # embeddings are cached in memory until set_cache_dir() is called
+        self.cache = EmbeddingCache(self.model_id)
+
+        # timing statistics, reported through self.stats()
+        self.load_time: float = 0.0
+        self.encode_time: float = 0.0
+        self.num_encode_calls: int = 0
+        self.num_encoded_sentences: int = 0
+
+    def __getstate__(self) -> Dict:
+        # pickled to worker processes: only the configuration is sent, the
+        # model and the cache are loaded again in the worker
+        return {
+            "model_name": self.model_name,
+            "device": self.device,
+            "backend": self.backend,
+            "cache_dir": self.cache.cache_dir,
+        }
+
+    def __setstate__(self, state: Dict) -> None:
+        # self is the singleton of the unpickling process (see __new__)
+        if not self._initialized:
+            self.__init__(state["model_name"], state["device"], state["backend"])
+        self.set_backend(state["backend"])
+        self.set_cache_dir(state["cache_dir"])
+
+    @property
+    def model_id(self) -> str:
+        # embeddings of different backends differ slightly; never mix them up
+        if self.backend == "torch":
+            return self.model_name
+        return f"{self.model_name}@{self.backend}"
 
-    sentence_embedding1 = model.encode(sentence1, convert_to_tensor=True)
-    sentence_embedding2 = model.encode(sentence2, convert_to_tensor=True)
+    def set_backend(self, backend: str) -> None:
+        assert backend in BACKENDS, f"Unknown embedding backend: {backend}"
+        if backend == self.backend:
+            return
+        assert self._model is None, "The backend must be set before loading the model"
+        self.backend = backend
+        self.cache = EmbeddingCache(self.model_id, self.cache.cache_dir)
+
+    def set_cache_dir(self, cache_dir: Optional[str]) -> None:
+        """Persist embeddings in *cache_dir* so that later runs reuse them"""
+        if cache_dir != self.cache.cache_dir:
+            self.cache = EmbeddingCache(self.model_id, cache_dir)
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    self._model = load_backend(
+                        self.backend, self.model_name, self.device
+                    )
+                    self.load_time = time.perf_counter() - start
+                    self.logger.info(
+                        f"Loaded model {self.model_id} in {self.load_time:.2f}s"
+                    )
+        return self._model
+
+    def warm_up(self) -> None:
+        """Load the model and run one forward pass ahead of the evaluation"""
+        self._encode_with_model(["warm up"])
+
+    def encode(self, sentences: Union[str, List[str]]) -> np.ndarray:
+        """Encode sentences into L2-normalized embeddings.
+        Only sentences missing in self.cache are passed to the model.
+
+        Return:
+            np.ndarray of shape (len(sentences), dim), or (dim,) when a single
+            string is given
+        """
+        if isinstance(sentences, str):
+            return self.encode([sentences])[0]
+
+        embeddings: List[Optional[np.ndarray]] = [
+            self.cache.get(sentence) for sentence in sentences
+        ]
+        missing = list(
+            dict.fromkeys(
+                sentence
+                for sentence, embedding in zip(sentences, embeddings)
+                if embedding is None
+            )
+        )
+        if missing:
+            computed = dict(zip(missing, self._encode_with_model(missing)))
+            self.cache.put_many(missing, np.stack([*computed.values()]))
+            embeddings = [
+                computed[sentence] if embedding is None else embedding
+                for sentence, embedding in zip(sentences, embeddings)
+            ]
+        return np.stack(embeddings).astype(np.float32, copy=False)
+
+    def precompute(self, sentences: List[str], batch_size: int = 128) -> None:
+        """Embed all uncached sentences in large batches and store them in
+        self.cache, so that later calls to `encode` never hit the model.
+
+        Sentences are deduplicated and sorted by length before being split
+        into batches, so that every batch pads its sentences to a similar
+        length.
+        """
+        missing = sorted(
+            {sentence for sentence in sentences if sentence not in self.cache}, key=len
+        )
+        self.logger.info(
+            f"Precomputing {len(missing)} embeddings in batches of {batch_size}"
+        )
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start : start + batch_size]
+            self.cache.put_many(
+                batch, self._encode_with_model(batch, batch_size=batch_size)
+            )
+
+    def _encode_with_model(
+        self, sentences: List[str], batch_size: int = 32
+    ) -> np.ndarray:
+        model = self.model
+        start = time.perf_counter()
+        embeddings = model.encode(sentences, batch_size=batch_size)
+        self.encode_time += time.perf_counter() - start
+        self.num_encode_calls += 1
+        self.num_encoded_sentences += len(sentences)
+        return embeddings
+
+    def stats(self) -> Dict[str, Union[str, int, float]]:
+        return {
+            "model": self.model_id,
+            "load_time": self.load_time,
+            "encode_time": self.encode_time,
+            "num_encode_calls": self.num_encode_calls,
+            "num_encoded_sentences": self.num_encoded_sentences,
+            "cache": self.cache.stats(),
+        }
+
+
+def compute_sentence_similiarity(sentence1: str, sentence2: str) -> float:
+    sentence_embeddings = EmbeddingService().encode([sentence1, sentence2])
 
-    similarity = util.pytorch_cos_sim(sentence_embedding1, sentence_embedding2)[0][0]
+    # embeddings are L2-normalized, so their dot product is the cosine similarity
+    similarity = np.dot(sentence_embeddings[0], sentence_embeddings[1])
 
-    return similarity
+    return float(similarity)
 
 
 def check_sentence_similarity(sentence1: str, sentence2: str, threshold: float = 0.8):
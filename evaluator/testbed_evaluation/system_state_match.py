@@ -1,6 +1,6 @@
-import os
 from typing import List
 
+from .. import trace_storage
 from ..task_trace import EssentialStateKeyword, UIState
 
 app_to_package_name = {
@@ -30,10 +30,11 @@ app_to_package_name = {
 def check_install_match(gr_ui_state: UIState, exec_ui_state: UIState):
     # collect all installed apps in during task execution under the current UIState
     installed_apps: List[str] = []
-    if not os.path.exists(exec_ui_state.installed_app_path):
+    if not trace_storage.exists(exec_ui_state.installed_app_path):
         return False
-    for line in open(exec_ui_state.installed_app_path):
-        installed_apps.append(line.strip().lower())
+    with trace_storage.open_file(exec_ui_state.installed_app_path) as f:
+        for line in f:
+            installed_apps.append(line.strip().lower())
 
     # extract all apps to check in the annotated UIState
     app_list = gr_ui_state.essential_state[EssentialStateKeyword.CHECK_INSTALL]
@@ -53,10 +54,11 @@ def check_install_match(gr_ui_state: UIState, exec_ui_state: UIState):
 def check_uninstall_match(gr_ui_state: UIState, exec_ui_state: UIState):
     # collect all installed apps in during task execution under the current UIState
     installed_apps: List[str] = []
-    if not os.path.exists(exec_ui_state.installed_app_path):
+    if not trace_storage.exists(exec_ui_state.installed_app_path):
         return False
-    for line in open(exec_ui_state.installed_app_path):
-        installed_apps.append(line.strip().lower())
+    with trace_storage.open_file(exec_ui_state.installed_app_path) as f:
+        for line in f:
+            installed_apps.append(line.strip().lower())
 
     # extract all apps to check in the annotated UIState
     uninstall_app_list = gr_ui_state.essential_state[
@@ -0,0 +1,101 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from evaluator.testbed_evaluation.ablation import (
+    DEFAULT_ABLATION_CONFIGS,
+    AblationSweep,
+    Check,
+    get_check_flags,
+    get_required_checks,
+    run_checks,
+)
+from evaluator.task_trace import EssentialStateKeyword
+
+ALL = Check.SCREEN_LEVEL_FUZZY | Check.TEXTBOX_FUZZY | Check.ACTIVITY
+ALL |= Check.UI_COMPONENT | Check.TYPE | Check.CLICK | Check.INSTALL
+ALL |= Check.UNINSTALL
+
+
+class TestAblationSweep(unittest.TestCase):
+    def test_required_checks(self):
+        self.assertEqual(get_required_checks(get_check_flags(None)), ALL)
+        self.assertEqual(
+            get_required_checks(
+                get_check_flags(DEFAULT_ABLATION_CONFIGS["only_action_exact_match"])
+            ),
+            Check.TYPE | Check.CLICK,
+        )
+        self.assertEqual(
+            get_required_checks(get_check_flags({"exact_match": False})),
+            Check.SCREEN_LEVEL_FUZZY | Check.TEXTBOX_FUZZY,
+        )
+        with self.assertRaises(AssertionError):
+            get_check_flags({"activity_exact_match": True, "action_exact_match": True})
+
+    def test_greedy_match_from_outcomes(self):
+        gr_trace = [
+            SimpleNamespace(essential_state={"fuzzy": ["-1"]}),
+            SimpleNamespace(essential_state=None),
+            SimpleNamespace(essential_state={"activity": ["1"]}),
+        ]
+        exec_trace = [SimpleNamespace() for _ in range(3)]
+        sweep = AblationSweep(gr_trace, exec_trace)
+        error = RuntimeError("broken view hierarchy")
+        # outcomes of all (gr, exec) pairs, as recorded by run_checks
+        sweep._outcomes = {
+            (0, 0): (ALL & ~Check.SCREEN_LEVEL_FUZZY, Check(0), {}),
+            (0, 1): (ALL, Check(0), {}),
+            (0, 2): (ALL, Check(0), {}),
+            (2, 0): (ALL, Check(0), {}),
+            (2, 1): (ALL, Check(0), {}),
+            (2, 2): (
+                ALL & ~Check.ACTIVITY & ~Check.CLICK,
+                Check.CLICK,
+                {Check.CLICK: error},
+            ),
+        }
+
+        # gr 0 matches exec 0, gr 2 matches exec 1
+        self.assertEqual(sweep.eval(Check.ACTIVITY), (True, None))
+        # gr 0 matches exec 1, gr 2 does not match exec 2
+        self.assertEqual(sweep.eval(ALL & ~Check.CLICK), (False, None))
+        # the first failing check decides before the raising one
+        self.assertEqual(
+            sweep.eval(Check.SCREEN_LEVEL_FUZZY | Check.ACTIVITY | Check.CLICK),
+            (False, None),
+        )
+        self.assertEqual(sweep.eval(ALL), (False, None))
+        with self.assertRaises(RuntimeError):
+            sweep.eval(Check.SCREEN_LEVEL_FUZZY | Check.CLICK)
+        self.assertEqual(sweep.num_evaluated_pairs(), 6)
+
+    def test_only_enabled_checks_run(self):
+        gr_ui_state = SimpleNamespace(
+            essential_state={
+                EssentialStateKeyword.FUZZY: ["-1"],
+                EssentialStateKeyword.ACTIVITY: ["1"],
+            }
+        )
+        with mock.patch(
+            "evaluator.testbed_evaluation.ablation.check_fuzzy_match"
+        ) as check_fuzzy_match, mock.patch(
+            "evaluator.testbed_evaluation.ablation.check_activity_match",
+            return_value=True,
+        ):
+            outcomes = run_checks(
+                gr_ui_state, SimpleNamespace(), enabled=Check.ACTIVITY | Check.CLICK
+            )
+            check_fuzzy_match.assert_not_called()
+        # checks of absent keywords pass, disabled checks do not
+        self.assertEqual(outcomes, (Check.ACTIVITY | Check.CLICK, Check(0), {}))
+
+        sweep = AblationSweep(
+            [gr_ui_state], [SimpleNamespace()], enabled=Check.ACTIVITY
+        )
+        with self.assertRaises(AssertionError):
+            sweep.eval(Check.SCREEN_LEVEL_FUZZY)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from evaluator.agent import MobileAgent
+from evaluator.common.action_type import Action, ActionType
+from evaluator.evaluator import FailedReason
+from evaluator.exactmatch_evaluation.action_matching import (
+    check_actions_match_batch,
+    pad_annotation_positions,
+    stack_actions,
+)
+from evaluator.exactmatch_evaluator import ExactMatchEvaluator
+from evaluator.task_trace import Agent
+from evaluator.testbed_evaluation.tests.lcs_match_test import (
+    check_action_match_like_AITW,
+    random_action,
+    random_ui_positions,
+)
+
+
+class TestCheckActionsMatchBatch(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(2)
+        num_pairs = 500
+        self.actions_1 = [random_action(rng) for _ in range(num_pairs)]
+        self.actions_2 = [random_action(rng) for _ in range(num_pairs)]
+        # pairs of the same action, so that both taps are in the same boxes
+        self.actions_2[::5] = self.actions_1[::5]
+        self.actions_1[7] = None
+        self.ui_positions = [random_ui_positions(rng) for _ in range(num_pairs)]
+        self.expected = np.array(
+            [
+                check_action_match_like_AITW(action_1, action_2, positions)
+                for action_1, action_2, positions in zip(
+                    self.actions_1, self.actions_2, self.ui_positions
+                )
+            ]
+        )
+
+    def check_batch(self, annotation_positions, annotation_mask=None):
+        touch_1, lift_1, types_1, valid_1 = stack_actions(self.actions_1)
+        touch_2, lift_2, types_2, valid_2 = stack_actions(self.actions_2)
+        matched = check_actions_match_batch(
+            touch_1,
+            lift_1,
+            types_1,
+            touch_2,
+            lift_2,
+            types_2,
+            annotation_positions,
+            annotation_mask,
+        )
+        np.testing.assert_array_equal(matched & valid_1 & valid_2, self.expected)
+
+    def test_ragged_annotation_positions(self):
+        self.check_batch(self.ui_positions)
+
+    def test_padded_annotation_positions(self):
+        self.check_batch(*pad_annotation_positions(self.ui_positions))
+
+    def test_empty_batch(self):
+        touch_yx, lift_yx, action_types, _ = stack_actions([])
+        matched = check_actions_match_batch(
+            touch_yx, lift_yx, action_types, touch_yx, lift_yx, action_types, []
+        )
+        self.assertEqual(matched.shape, (0,))
+
+
+class PredictingAgent(MobileAgent):
+    def __init__(self, actions) -> None:
+        super().__init__()
+        self.agent = Agent.AUTOUI
+        self.actions = actions
+
+    def load_exec_trace_by_episode(self, episode):
+        return None
+
+    def load_predicted_action_by_episode(self, episode):
+        return self.actions
+
+
+class TestExactMatchEvaluator(unittest.TestCase):
+    def evaluate(self, gr_actions, predicted_actions, empty_ui_positions_at=None):
+        """(result, indexes of steps whose UI positions were extracted)"""
+        gr_trace = [
+            SimpleNamespace(
+                screenshot_path=f"{i}.png",
+                vh_path=f"{i}.xml",
+                screen_size=(1080, 2400),
+                action=action,
+            )
+            for i, action in enumerate(gr_actions)
+        ]
+        extracted = []
+
+        def extract_ui_positions_from_vh(screenshot_path, vh_path, screen_size):
+            step = int(vh_path.split(".")[0])
+            extracted.append(step)
+            if step == empty_ui_positions_at:
+                return np.array([])
+            return np.array([[0.0, 0.0, 1.0, 1.0]])
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            evaluator = ExactMatchEvaluator(
+                PredictingAgent(predicted_actions), "", tmp_dir
+            )
+            with mock.patch.object(
+                evaluator, "load_groundtruth_trace", return_value=gr_trace
+            ), mock.patch.object(
+                evaluator,
+                "extract_ui_positions_from_vh",
+                side_effect=extract_ui_positions_from_vh,
+            ):
+                result = evaluator.eval_impl("1000", "")
+            num_correct_action = evaluator.epi_to_num_correct_action.pop("1000", 0)
+        return result, num_correct_action, extracted
+
+    def test_stop_at_first_failed_step(self):
+        back, home = Action(ActionType.PRESS_BACK), Action(ActionType.PRESS_HOME)
+        gr_actions = [back] * 40
+
+        result, num_correct_action, extracted = self.evaluate(
+            gr_actions, [back, home] + [back] * 38
+        )
+        self.assertEqual(
+            result, (False, FailedReason.STEP_CHECK_FAILED.value + " on step 1")
+        )
+        self.assertEqual(num_correct_action, 1)
+        # the UI positions of the first chunk only
+        self.assertEqual(extracted, [0, 1, 2, 3])
+
+        self.assertEqual(self.evaluate(gr_actions, gr_actions)[:2], ((True, None), 40))
+        self.assertEqual(
+            self.evaluate(gr_actions, gr_actions[:30])[0],
+            (False, FailedReason.STEP_CHECK_FAILED.value + " on step 30"),
+        )
+        result, num_correct_action, extracted = self.evaluate(
+            gr_actions, gr_actions, empty_ui_positions_at=9
+        )
+        self.assertEqual(result, (False, FailedReason.UI_POSITIONS_NOT_FOUND))
+        self.assertEqual(num_correct_action, 9)
+        self.assertEqual(extracted, list(range(10)))
+
+
+if __name__ == "__main__":
+    unittest.main()
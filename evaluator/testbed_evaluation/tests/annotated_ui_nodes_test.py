@@ -0,0 +1,34 @@
+import unittest
+
+from evaluator.task_trace import UIState, parse_bounds
+
+CASE_PATH = "evaluator/testbed_evaluation/tests/test_case/img_test_case/case1"
+
+
+class TestAnnotatedUINodes(unittest.TestCase):
+    def test_parse_bounds(self):
+        self.assertEqual(parse_bounds("[0,63][165,189]"), (0, 63, 165, 189))
+        self.assertIsNone(parse_bounds(""))
+        self.assertIsNone(parse_bounds(None))
+
+    def test_annotated_ui_nodes(self):
+        ui_state = UIState(
+            index=2,
+            screenshot_path=f"{CASE_PATH}/2.png",
+            vh_path=f"{CASE_PATH}/2.xml",
+            vh_json_path=f"{CASE_PATH}/2.vh",
+            activity="",
+            action=None,
+            state_type="groundtruth",
+            vh_simp_ui_json_path=f"{CASE_PATH}/2.json",
+        )
+        node = ui_state.annotated_ui_nodes[0]
+        self.assertEqual(node["resource-id"], "com.duolingo:id/menuLanguage")
+        self.assertEqual(ui_state.annotated_ui_bounds[0], (0, 63, 165, 189))
+        self.assertIs(ui_state.annotated_ui_nodes[0], node)
+        with self.assertRaises(TypeError):
+            node["text"] = "modified"
+
+
+if __name__ == "__main__":
+    unittest.main()
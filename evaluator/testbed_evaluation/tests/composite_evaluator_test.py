@@ -0,0 +1,133 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from evaluator.agent import MobileAgent
+from evaluator.common.action_type import Action, ActionType
+from evaluator.composite_evaluator import CompositeEvaluator, SharedEpisodeAgent
+from evaluator.exactmatch_evaluator import ExactMatchEvaluator
+from evaluator.lcsmatch_evaluator import LCSMatchEvaluator
+from evaluator.result_cache import ResultCache
+from evaluator.task_trace import Agent
+
+
+class CountingAgent(MobileAgent):
+    def __init__(self) -> None:
+        super().__init__()
+        self.agent = Agent.AUTOUI
+        self.num_loads = 0
+
+    def load_exec_trace_by_episode(self, episode):
+        self.num_loads += 1
+        return [episode]
+
+    def load_predicted_action_by_episode(self, episode):
+        return self.load_exec_trace_by_episode(episode)
+
+
+class TestSharedEpisodeAgent(unittest.TestCase):
+    def test_load_once_per_episode(self):
+        agent = CountingAgent()
+        shared = SharedEpisodeAgent(agent)
+        self.assertEqual(shared.agent_name, agent.agent_name)
+
+        shared.begin_episode("1000")
+        trace = shared.load_exec_trace_by_episode("1000")
+        self.assertIs(shared.load_exec_trace_by_episode("1000"), trace)
+        shared.load_predicted_action_by_episode("1000")
+        shared.load_predicted_action_by_episode("1000")
+        self.assertEqual(agent.num_loads, 2)
+
+        # other episodes are loaded by the agent
+        self.assertEqual(shared.load_exec_trace_by_episode("1001"), ["1001"])
+        self.assertEqual(agent.num_loads, 3)
+
+        shared.end_episode()
+        self.assertIsNot(shared.load_exec_trace_by_episode("1000"), trace)
+        self.assertEqual(agent.num_loads, 4)
+
+
+class ActingAgent(MobileAgent):
+    def __init__(self, action_type: ActionType) -> None:
+        super().__init__()
+        self.agent = Agent.AUTOUI
+        self.action_type = action_type
+
+    def load_exec_trace_by_episode(self, episode):
+        return None
+
+    def load_predicted_action_by_episode(self, episode):
+        return [Action(self.action_type)]
+
+
+class TestCompositeEvaluatorResults(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.result_cache = ResultCache(os.path.join(self.tmp_dir.name, "cache"))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def get_run(
+        self, evaluator_classes, evaluator_options=None, options=None, agent=None
+    ):
+        """(journal run id, result cache key of an episode) of a composite"""
+        evaluator = CompositeEvaluator(
+            agent or ActingAgent(ActionType.PRESS_BACK),
+            os.path.join(self.tmp_dir.name, "metadata.tsv"),
+            self.tmp_dir.name,
+            evaluator_classes,
+            options={"journal": os.path.join(self.tmp_dir.name, "journal.jsonl")},
+            evaluator_options=evaluator_options,
+        )
+        evaluator.options.update(options or {})
+        evaluator.result_cache = self.result_cache
+        with mock.patch.object(
+            evaluator.helper, "load_groundtruth_trace_by_episode", return_value=None
+        ):
+            fingerprint = evaluator.get_episode_fingerprint("1000")
+        return (
+            evaluator.get_journal().run_id,
+            self.result_cache.get_key(
+                evaluator.__class__.__name__,
+                evaluator.get_result_options(),
+                "1000",
+                fingerprint,
+            ),
+        )
+
+    def test_results_of_other_runs_are_not_reused(self):
+        run = self.get_run([ExactMatchEvaluator, LCSMatchEvaluator])
+        # the same evaluators in another order, and output-only options
+        self.assertEqual(self.get_run([LCSMatchEvaluator, ExactMatchEvaluator]), run)
+        self.assertEqual(
+            self.get_run(
+                [ExactMatchEvaluator, LCSMatchEvaluator],
+                options={"result_sink": "results.csv"},
+            ),
+            run,
+        )
+
+        other_runs = [
+            self.get_run([ExactMatchEvaluator]),
+            self.get_run(
+                [ExactMatchEvaluator, LCSMatchEvaluator],
+                evaluator_options={"LCSMatchEvaluator": {"option": 1}},
+            ),
+        ]
+        for other_run in other_runs:
+            self.assertNotEqual(other_run[0], run[0])
+            self.assertNotEqual(other_run[1], run[1])
+
+        # predicted actions of the agent changed: same run, other result
+        run_id, cache_key = self.get_run(
+            [ExactMatchEvaluator, LCSMatchEvaluator],
+            agent=ActingAgent(ActionType.PRESS_HOME),
+        )
+        self.assertEqual(run_id, run[0])
+        self.assertNotEqual(cache_key, run[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
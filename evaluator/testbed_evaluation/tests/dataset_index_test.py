@@ -0,0 +1,139 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from evaluator.common.action_type import ActionType
+from evaluator.dataset_index import DatasetIndex
+from evaluator.task_trace import DatasetHelper, EssentialStateKeyword
+
+CASE_PATH = "evaluator/testbed_evaluation/tests/test_case/img_test_case/case1"
+
+
+def make_trace(trace_path: str, episode: str) -> None:
+    """A ground-truth trace of two UIStates with one click"""
+    os.makedirs(trace_path)
+    with open(os.path.join(trace_path, "instruction.txt"), "w") as f:
+        f.write(f"{episode}\n")
+    with open(os.path.join(trace_path, "eventStructs.txt"), "w") as f:
+        f.write("[Click] Screen Resolution (1080, 2400), Click Position (540, 1200)\n")
+    for i in range(2):
+        shutil.copy(
+            os.path.join(CASE_PATH, "0.png"), os.path.join(trace_path, f"{i}.png")
+        )
+        with open(os.path.join(trace_path, f"{i}.activity"), "w") as f:
+            f.write("com.android.settings/.Settings\n")
+    with open(os.path.join(trace_path, "1.ess"), "w") as f:
+        f.write("fuzzy<-1>|exact<0>")
+
+
+class TestDatasetIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dataset_path = self.tmp_dir.name
+        self.trace_path = os.path.join(self.dataset_path, "general", "trace_0")
+        make_trace(self.trace_path, "1234")
+
+        self.helper = DatasetHelper("", self.dataset_path)
+        self.index = DatasetIndex(self.dataset_path)
+        self.index.build(self.helper)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_load_indexed_trace(self):
+        episode, ui_states = self.index.load_trace(self.trace_path)
+        self.assertEqual(episode, "1234")
+        self.assertEqual(len(ui_states), 2)
+
+        index, action, activity, essential_state, screen_size = ui_states[0]
+        self.assertEqual(action.action_type, ActionType.DUAL_POINT)
+        self.assertEqual(action.touch_point_yx, (0.5, 0.5))
+        self.assertEqual(activity, "com.android.settings.Settings")
+        self.assertIsNone(essential_state)
+        with Image.open(os.path.join(CASE_PATH, "0.png")) as img:
+            self.assertEqual(screen_size, img.size)
+
+        trace = self.helper._load_groundtruth_trace_by_path(self.trace_path)
+        self.assertEqual(
+            dict(trace[1].essential_state),
+            {EssentialStateKeyword(k): v for k, v in ui_states[1][3].items()},
+        )
+
+    def test_find_trace_paths(self):
+        self.assertEqual(
+            self.index.find_trace_paths("1234"), [os.path.join("general", "trace_0")]
+        )
+        self.assertEqual(self.index.find_trace_paths("5678"), [])
+
+    def test_threads(self):
+        # each thread opens its own connection
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(self.index.find_trace_paths, ["1234"] * 3))
+        self.assertEqual(results, [[os.path.join("general", "trace_0")]] * 3)
+
+        # as copied to a worker process
+        index = pickle.loads(pickle.dumps(self.index))
+        self.assertEqual(index.load_trace(self.trace_path)[0], "1234")
+
+    def test_stale_trace(self):
+        with open(os.path.join(self.trace_path, "1.ess"), "w") as f:
+            f.write("fuzzy<-1>")
+        self.assertIsNone(self.index.load_trace(self.trace_path))
+
+
+class TestGroundTruthTracePath(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dataset_path = self.tmp_dir.name
+        # at its path in the metadata
+        make_trace(os.path.join(self.dataset_path, "general", "trace_0"), "1000")
+        # moved to another folder before the index was built
+        make_trace(os.path.join(self.dataset_path, "googleapps", "moved"), "1001")
+        self.metadata_path = os.path.join(self.dataset_path, "metadata.tsv")
+        with open(self.metadata_path, "w") as f:
+            f.write("episode\tcategory\tpath\tdescription\n")
+            for episode, path in [
+                ("1000", "general/trace_0"),
+                ("1001", "general/trace_1"),
+                ("1002", "general/trace_2"),
+                # the folder of another episode
+                ("1003", "general/trace_0"),
+            ]:
+                f.write(f"{episode}\tgeneral\t{path}\ttask {episode}\n")
+
+        self.helper = DatasetHelper(self.metadata_path, self.dataset_path)
+        self.helper.build_dataset_index()
+        # renamed after the index was built
+        make_trace(os.path.join(self.dataset_path, "general", "renamed"), "1002")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_lookup_fallbacks(self):
+        expected_paths = {
+            # metadata path
+            "1000": os.path.join("general", "trace_0"),
+            # dataset index
+            "1001": os.path.join("googleapps", "moved"),
+            # instruction.txt of all folders of the category
+            "1002": os.path.join("general", "renamed"),
+        }
+        for episode, rel_path in expected_paths.items():
+            with self.subTest(episode=episode):
+                self.assertEqual(
+                    self.helper.get_groundtruth_trace_path_by_episode(episode),
+                    os.path.join(self.dataset_path, rel_path),
+                )
+                trace = self.helper.load_groundtruth_trace_by_episode(episode)
+                self.assertEqual(len(trace), 2)
+        self.assertIsNone(self.helper.get_groundtruth_trace_path_by_episode("1003"))
+        self.assertIsNone(self.helper.load_groundtruth_trace_by_episode("1003"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from evaluator.testbed_evaluation.embedding_cache import EmbeddingCache
+
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.texts = ["<button>OK</button>", "<text>Settings</text>"]
+        self.embeddings = np.random.rand(2, 8).astype(np.float32)
+
+    def test_in_memory_cache(self):
+        cache = EmbeddingCache("model")
+        self.assertIsNone(cache.get(self.texts[0]))
+        cache.put_many(self.texts, self.embeddings)
+        np.testing.assert_array_equal(cache.get(self.texts[1]), self.embeddings[1])
+        self.assertEqual(cache.stats(), {"size": 2, "hits": 1, "misses": 1})
+
+    def test_persistent_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            EmbeddingCache("model", cache_dir).put_many(self.texts, self.embeddings)
+            EmbeddingCache("model", cache_dir).put_many(["new"], self.embeddings[:1])
+
+            cache = EmbeddingCache("model", cache_dir)
+            self.assertEqual(len(cache), 3)
+            np.testing.assert_array_equal(cache.get(self.texts[1]), self.embeddings[1])
+            np.testing.assert_array_equal(cache.get("new"), self.embeddings[0])
+
+            # embeddings of another model are never mixed up
+            self.assertIsNone(EmbeddingCache("other", cache_dir).get(self.texts[0]))
+
+    def test_bounded_memory(self):
+        cache = EmbeddingCache("model", max_memory_entries=1)
+        cache.put_many(self.texts, self.embeddings)
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(cache.get(self.texts[0]))
+        np.testing.assert_array_equal(cache.get(self.texts[1]), self.embeddings[1])
+
+    def test_interrupted_append(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            EmbeddingCache("model", cache_dir).put_many(self.texts, self.embeddings)
+            # a row written without its key, then half of a row
+            with open(os.path.join(cache_dir, "model.f32"), "ab") as f:
+                f.write(self.embeddings[0].tobytes())
+                f.write(self.embeddings[1].tobytes()[:10])
+
+            cache = EmbeddingCache("model", cache_dir)
+            self.assertEqual(os.path.getsize(os.path.join(cache_dir, "model.f32")), 64)
+            cache.put_many(["new"], self.embeddings[1:])
+            cache = EmbeddingCache("model", cache_dir)
+            np.testing.assert_array_equal(cache.get(self.texts[0]), self.embeddings[0])
+            np.testing.assert_array_equal(cache.get("new"), self.embeddings[1])
+
+    def test_lost_rows_and_partial_key(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            EmbeddingCache("model", cache_dir).put_many(self.texts, self.embeddings)
+            with open(os.path.join(cache_dir, "model.f32"), "rb+") as f:
+                f.truncate(40)
+            with open(os.path.join(cache_dir, "model.keys"), "a") as f:
+                f.write("0123")
+
+            cache = EmbeddingCache("model", cache_dir)
+            self.assertEqual(len(cache), 1)
+            self.assertIsNone(cache.get(self.texts[1]))
+            cache.put_many(["new"], self.embeddings[1:])
+            cache = EmbeddingCache("model", cache_dir)
+            self.assertEqual(len(cache), 2)
+            np.testing.assert_array_equal(cache.get(self.texts[0]), self.embeddings[0])
+            np.testing.assert_array_equal(cache.get("new"), self.embeddings[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
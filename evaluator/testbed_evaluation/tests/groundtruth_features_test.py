@@ -0,0 +1,199 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from evaluator.agent import MobileAgent
+from evaluator.evaluator import BaseEvaluator
+from evaluator.multi_agent_evaluator import MultiAgentEvaluator
+from evaluator.task_trace import Agent, UIState, parse_bounds
+from evaluator.testbed_evaluation.exact_match import (
+    _check_img_exact_match,
+    get_annotated_patch_hashes,
+    get_image_patch_hash,
+)
+
+CASE_PATH = "evaluator/testbed_evaluation/tests/test_case/img_test_case/case3"
+
+
+class TestAnnotatedPatchHashes(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        for file_name in ["1.png", "1.json"]:
+            shutil.copy(
+                os.path.join(CASE_PATH, file_name),
+                os.path.join(self.tmp_dir.name, file_name),
+            )
+        # node 1 has neither text nor content-desc, node 22 has a content-desc
+        with open(os.path.join(self.tmp_dir.name, "1.ess"), "w") as f:
+            f.write("exact<1>|exact<22>")
+        self.gr_ui_state = UIState(
+            index=1,
+            screenshot_path=os.path.join(self.tmp_dir.name, "1.png"),
+            vh_path=os.path.join(self.tmp_dir.name, "1.xml"),
+            vh_json_path=os.path.join(self.tmp_dir.name, "1.vh.json"),
+            activity="com.yelp.android",
+            action=None,
+            state_type="groundtruth",
+            vh_simp_ui_json_path=os.path.join(self.tmp_dir.name, "1.json"),
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_only_image_matched_nodes(self):
+        patch_hashes = get_annotated_patch_hashes(self.gr_ui_state)
+        self.assertEqual(list(patch_hashes), [1])
+        self.assertEqual(
+            patch_hashes[1],
+            get_image_patch_hash(
+                self.gr_ui_state.screenshot_path,
+                self.gr_ui_state.annotated_ui_bounds[1],
+            ),
+        )
+
+    def test_precomputed_hash_gives_same_result(self):
+        with open(os.path.join(CASE_PATH, "1.json"), "r", encoding="utf-8") as f:
+            nodes = json.load(f)
+        gr_screenshot_path = os.path.join(CASE_PATH, "1.png")
+        for node_id in [1, 3, 22]:
+            gr_bounds = parse_bounds(nodes[node_id]["bounds"])
+            gr_hash = get_image_patch_hash(gr_screenshot_path, gr_bounds)
+            for exec_file_name in ["1.png", "2.png"]:
+                for bound in [1, 5, 10]:
+                    with self.subTest(
+                        node_id=node_id, exec=exec_file_name, bound=bound
+                    ):
+                        args = (
+                            nodes[node_id],
+                            gr_screenshot_path,
+                            os.path.join(CASE_PATH, exec_file_name),
+                            bound,
+                        )
+                        self.assertEqual(
+                            _check_img_exact_match(
+                                *args,
+                                gr_hash=gr_hash,
+                                gr_screen_size=self.gr_ui_state.screen_size,
+                            ),
+                            _check_img_exact_match(*args),
+                        )
+
+
+class NamedAgent(MobileAgent):
+    def __init__(self, agent: Agent, completed_episodes) -> None:
+        super().__init__()
+        self.agent = agent
+        self.completed_episodes = completed_episodes
+
+    def load_exec_trace_by_episode(self, episode):
+        return [episode in self.completed_episodes]
+
+    def load_predicted_action_by_episode(self, episode):
+        return None
+
+
+class GroundTruthReadingEvaluator(BaseEvaluator):
+    num_added_features = 0
+
+    def __init__(self, agent, epi_metadata_path, gr_dataset_path, options=None):
+        super().__init__(agent, epi_metadata_path, gr_dataset_path, options)
+        self.evaluator_name = self.__class__.__name__
+        self.logger = logging.getLogger(self.evaluator_name)
+
+    def add_groundtruth_features(self, features):
+        GroundTruthReadingEvaluator.num_added_features += 1
+        features.view_embeddings[0] = features.episode
+
+    def eval_impl(self, episode, task_description):
+        features = self.get_groundtruth_features(episode)
+        assert features is not None and features.view_embeddings[0] == episode
+        assert self.load_groundtruth_trace(episode) is features.gr_trace
+        return self.agent.load_exec_trace_by_episode(episode)[0], None
+
+
+class OtherEvaluator(GroundTruthReadingEvaluator):
+    pass
+
+
+class TestMultiAgentEvaluator(unittest.TestCase):
+    def test_groundtruth_features_shared_by_agents(self):
+        agents = [
+            NamedAgent(Agent.AUTOUI, {"1000", "1001"}),
+            NamedAgent(Agent.AUTODROID, {"1001"}),
+            NamedAgent(Agent.COCOAGENT, set()),
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            evaluator = MultiAgentEvaluator(
+                agents,
+                os.path.join(tmp_dir, "metadata.tsv"),
+                tmp_dir,
+                [GroundTruthReadingEvaluator],
+            )
+            GroundTruthReadingEvaluator.num_added_features = 0
+            with mock.patch.object(
+                evaluator.helper,
+                "load_groundtruth_trace_by_episode",
+                side_effect=lambda episode: [episode],
+            ) as load_gr_trace, mock.patch.object(
+                evaluator.helper, "get_all_episodes", return_value=["1000", "1001"]
+            ), mock.patch.object(
+                evaluator.helper, "get_task_description_by_episode", return_value=""
+            ):
+                evaluator.run_evaluation()
+
+        # once per episode, whatever the number of agents
+        self.assertEqual(load_gr_trace.call_count, 2)
+        self.assertEqual(GroundTruthReadingEvaluator.num_added_features, 2)
+
+        completion = {
+            agent_name: composite.evaluators[0].episode_completion
+            for agent_name, composite in evaluator.agent_evaluators.items()
+        }
+        self.assertEqual(
+            completion,
+            {
+                "Auto-UI": {"1000": (True, ""), "1001": (True, "")},
+                "AutoDroid": {"1000": (False, ""), "1001": (True, "")},
+                "CoCoAgent": {"1000": (False, ""), "1001": (False, "")},
+            },
+        )
+        self.assertFalse(evaluator.episode_completion["1001"][0])
+
+    def test_results_of_other_evaluators_are_not_reused(self):
+        agents = [NamedAgent(Agent.AUTOUI, set()), NamedAgent(Agent.AUTODROID, set())]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+
+            def get_run_id(evaluator_classes, evaluator_options=None):
+                return (
+                    MultiAgentEvaluator(
+                        agents,
+                        os.path.join(tmp_dir, "metadata.tsv"),
+                        tmp_dir,
+                        evaluator_classes,
+                        options={"journal": os.path.join(tmp_dir, "journal.jsonl")},
+                        evaluator_options=evaluator_options,
+                    )
+                    .get_journal()
+                    .run_id
+                )
+
+            run_id = get_run_id([GroundTruthReadingEvaluator])
+            self.assertEqual(get_run_id([GroundTruthReadingEvaluator]), run_id)
+            self.assertNotEqual(
+                get_run_id([GroundTruthReadingEvaluator, OtherEvaluator]), run_id
+            )
+            self.assertNotEqual(
+                get_run_id(
+                    [GroundTruthReadingEvaluator],
+                    {"GroundTruthReadingEvaluator": {"option": 1}},
+                ),
+                run_id,
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
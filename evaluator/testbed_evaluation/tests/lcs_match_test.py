@@ -0,0 +1,147 @@
+import unittest
+
+import numpy as np
+
+from evaluator.common.action_type import Action, ActionType
+from evaluator.exactmatch_evaluation.action_matching import (
+    check_actions_match,
+    check_actions_match_matrix,
+    pad_annotation_positions,
+    stack_actions,
+)
+from evaluator.lcsmatch_evaluator import longest_common_subsequence
+
+ACTION_TYPES = [
+    ActionType.DUAL_POINT,
+    ActionType.DUAL_POINT,
+    ActionType.DUAL_POINT,
+    ActionType.TYPE,
+    ActionType.PRESS_BACK,
+    ActionType.PRESS_HOME,
+]
+
+
+def random_action(rng: np.random.Generator) -> Action:
+    action_type = ACTION_TYPES[rng.integers(len(ACTION_TYPES))]
+    touch_yx = tuple(rng.random(2).tolist())
+    if rng.random() < 0.6:
+        # a tap, sometimes a small move
+        lift_yx = tuple((np.array(touch_yx) + rng.normal(0, 0.02, 2)).tolist())
+    else:
+        lift_yx = tuple(rng.random(2).tolist())
+    return Action(action_type, touch_yx, lift_yx)
+
+
+def random_ui_positions(rng: np.random.Generator) -> np.ndarray:
+    num_bboxes = rng.integers(0, 8)
+    if num_bboxes == 0:
+        # as extracted from a view hierarchy without UI positions
+        return np.array([])
+    return rng.random((num_bboxes, 4)) * [1, 1, 0.3, 0.3]
+
+
+def check_action_match_like_AITW(gr_action, exec_action, ui_positions) -> bool:
+    # the check of every (gt, exec) pair done by LCSMatchEvaluator before
+    try:
+        return bool(
+            check_actions_match(
+                gr_action.touch_point_yx,
+                gr_action.lift_point_yx,
+                gr_action.action_type,
+                exec_action.touch_point_yx,
+                exec_action.lift_point_yx,
+                exec_action.action_type,
+                ui_positions,
+            )
+        )
+    except Exception:
+        return False
+
+
+class TestCheckActionsMatchMatrix(unittest.TestCase):
+    def test_same_as_pairwise_check(self):
+        rng = np.random.default_rng(0)
+        for _ in range(20):
+            gt_actions = [random_action(rng) for _ in range(rng.integers(1, 40))]
+            gt_actions[-1] = None
+            exec_actions = [random_action(rng) for _ in range(rng.integers(1, 60))]
+            ui_positions = [random_ui_positions(rng) for _ in gt_actions]
+
+            gt_touch_yx, gt_lift_yx, gt_action_types, gt_valid = stack_actions(
+                gt_actions
+            )
+            exec_touch_yx, exec_lift_yx, exec_action_types, exec_valid = stack_actions(
+                exec_actions
+            )
+            match = check_actions_match_matrix(
+                gt_touch_yx,
+                gt_lift_yx,
+                gt_action_types,
+                exec_touch_yx,
+                exec_lift_yx,
+                exec_action_types,
+                *pad_annotation_positions(ui_positions),
+            )
+            match &= gt_valid[:, None] & exec_valid[None, :]
+
+            expected = np.array(
+                [
+                    [
+                        check_action_match_like_AITW(gr_action, exec_action, positions)
+                        for exec_action in exec_actions
+                    ]
+                    for gr_action, positions in zip(gt_actions, ui_positions)
+                ]
+            )
+            np.testing.assert_array_equal(match, expected)
+
+    def test_no_ui_positions(self):
+        back = Action(ActionType.PRESS_BACK)
+        touch_yx, lift_yx, action_types, _ = stack_actions([back])
+        match = check_actions_match_matrix(
+            touch_yx,
+            lift_yx,
+            action_types,
+            touch_yx,
+            lift_yx,
+            action_types,
+            *pad_annotation_positions([np.array([])]),
+        )
+        self.assertFalse(match[0][0])
+
+
+class TestLongestCommonSubsequence(unittest.TestCase):
+    def test_alignment(self):
+        # gt: a b c, exec: a x c b c
+        match = np.array(
+            [
+                [True, False, False, False, False],
+                [False, False, False, True, False],
+                [False, False, True, False, True],
+            ]
+        )
+        lcs, alignment = longest_common_subsequence(match)
+        self.assertEqual(lcs, 3)
+        self.assertEqual(alignment, [(0, 0), (1, 3), (2, 4)])
+
+    def test_long_traces(self):
+        rng = np.random.default_rng(1)
+        match = rng.random((100, 120)) < 0.05
+        lcs, alignment = longest_common_subsequence(match)
+
+        # quadratic reference
+        f = np.zeros((101, 121), dtype=int)
+        for i in range(100):
+            for j in range(120):
+                f[i + 1][j + 1] = max(
+                    f[i][j + 1], f[i + 1][j], f[i][j] + 1 if match[i][j] else 0
+                )
+        self.assertEqual(lcs, f[100][120])
+        self.assertEqual(len(alignment), lcs)
+        self.assertTrue(all(match[i][j] for i, j in alignment))
+        for (i1, j1), (i2, j2) in zip(alignment, alignment[1:]):
+            self.assertTrue(i1 < i2 and j1 < j2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import logging
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from evaluator.agent import MobileAgent
+from evaluator.evaluator import BaseEvaluator, FailedReason
+from evaluator.task_trace import Agent, DatasetHelper
+
+EPISODES = [str(episode) for episode in range(1000, 1006)]
+
+
+class ReplayAgent(MobileAgent):
+    def __init__(self) -> None:
+        super().__init__()
+        self.agent = Agent.AUTOUI
+
+    def load_exec_trace_by_episode(self, episode):
+        return None
+
+    def load_predicted_action_by_episode(self, episode):
+        return None
+
+
+class ParityEvaluator(BaseEvaluator):
+    """Completes even episodes; the process evaluating one of the
+    *crashing_episodes* exits"""
+
+    def __init__(self, *args, crashing_episodes=(), **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.evaluator_name = "ParityEvaluator"
+        self.crashing_episodes = set(crashing_episodes)
+        self.epi_to_description = {}
+
+    def eval_impl(self, episode, task_description):
+        if episode in self.crashing_episodes:
+            os._exit(1)
+        self.epi_to_description[episode] = task_description
+        if int(episode) % 2 == 0:
+            return True, None
+        return False, FailedReason.STEP_CHECK_FAILED
+
+    def export_episode_stats(self, episode):
+        return self.epi_to_description.pop(episode, None)
+
+    def import_episode_stats(self, episode, episode_stats):
+        if episode_stats is not None:
+            self.epi_to_description[episode] = episode_stats
+
+
+class TestParallelEvaluation(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.dataset_path = self.tmp_dir.name
+        self.metadata_path = os.path.join(self.dataset_path, "metadata.tsv")
+        with open(self.metadata_path, "w") as f:
+            f.write("episode\tcategory\tpath\tdescription\n")
+            for episode in EPISODES:
+                f.write(f"{episode}\tgeneral\tgeneral/{episode}\ttask {episode}\n")
+        DatasetHelper(self.metadata_path, self.dataset_path).build_dataset_index()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_evaluation(self, options=None, crashing_episodes=()):
+        evaluator = ParityEvaluator(
+            ReplayAgent(),
+            self.metadata_path,
+            self.dataset_path,
+            {"episodes": EPISODES, **(options or {})},
+            crashing_episodes=crashing_episodes,
+        )
+        evaluator.run_evaluation()
+        return evaluator
+
+    def test_jobs(self):
+        expected = self.run_evaluation()
+        evaluator = self.run_evaluation({"jobs": 2})
+        self.assertEqual(evaluator.episode_completion, expected.episode_completion)
+        self.assertEqual(
+            list(evaluator.episode_completion), EPISODES, "in the target order"
+        )
+        # statistics of the workers are sent back
+        self.assertEqual(evaluator.epi_to_description, expected.epi_to_description)
+
+    def test_executor(self):
+        expected = self.run_evaluation()
+        # the result cache and the dataset index are used by several threads
+        result_cache = os.path.join(self.tmp_dir.name, "result_cache.sqlite")
+        for _ in range(2):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                evaluator = self.run_evaluation(
+                    {"executor": executor, "result_cache": result_cache}
+                )
+            self.assertEqual(evaluator.episode_completion, expected.episode_completion)
+        self.assertEqual(evaluator.result_cache.stats()["entries"], len(EPISODES))
+
+    def test_worker_crash(self):
+        evaluator = self.run_evaluation({"jobs": 2}, crashing_episodes=["1002"])
+        expected = self.run_evaluation().episode_completion
+        expected["1002"] = (False, FailedReason.WORKER_CRASHED.value)
+        self.assertEqual(evaluator.episode_completion, expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from evaluator.common.action_type import Action, ActionType
+from evaluator.result_cache import ResultCache, get_code_version
+from evaluator.task_trace import UIState
+
+CASE_PATH = "evaluator/testbed_evaluation/tests/test_case/img_test_case/case1"
+
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ResultCache(os.path.join(self.tmp_dir.name, "cache.sqlite"))
+        self.screenshot_path = os.path.join(self.tmp_dir.name, "0.png")
+        shutil.copy(os.path.join(CASE_PATH, "0.png"), self.screenshot_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_trace(self, activity="com.android.settings/.Settings"):
+        return [
+            UIState(
+                index=0,
+                screenshot_path=self.screenshot_path,
+                vh_path=os.path.join(self.tmp_dir.name, "0.xml"),
+                vh_json_path=None,
+                activity=activity,
+                action=Action(ActionType.PRESS_HOME),
+                state_type="execution",
+            )
+        ]
+
+    def test_put_and_get(self):
+        key = self.cache.get_key("TestbedEvaluator", {"jobs": 4}, "1000", "abc")
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, "TestbedEvaluator", "1000", False, "reason", {"n": 1})
+        self.assertEqual(self.cache.get(key), (False, "reason", {"n": 1}))
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+        # options that do not change results are not part of the key
+        self.assertEqual(
+            key, self.cache.get_key("TestbedEvaluator", {"jobs": 1}, "1000", "abc")
+        )
+        self.assertNotEqual(
+            key,
+            self.cache.get_key(
+                "TestbedEvaluator", {"check_install": False}, "1000", "abc"
+            ),
+        )
+        self.assertNotEqual(
+            key, self.cache.get_key("LCSMatchEvaluator", None, "1000", "abc")
+        )
+
+    def test_threads(self):
+        def put_and_get(episode):
+            key = self.cache.get_key("TestbedEvaluator", None, episode, "abc")
+            self.cache.put(key, "TestbedEvaluator", episode, True, "")
+            return self.cache.get(key)
+
+        # each thread opens its own connection
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = list(executor.map(put_and_get, ["1000", "1001", "1002"]))
+        self.assertEqual(results, [(True, "", None)] * 3)
+        self.assertEqual(self.cache.stats()["entries"], 3)
+
+        # as copied to a worker process
+        cache = pickle.loads(pickle.dumps(self.cache))
+        self.assertEqual(cache.stats()["entries"], 3)
+
+    def test_trace_fingerprint(self):
+        fingerprint = self.cache.trace_fingerprint(self.make_trace())
+        self.assertEqual(fingerprint, self.cache.trace_fingerprint(self.make_trace()))
+        self.assertNotEqual(
+            fingerprint, self.cache.trace_fingerprint(self.make_trace("other"))
+        )
+
+        # a modified file is hashed again
+        with open(self.screenshot_path, "ab") as f:
+            f.write(b"\0")
+        self.assertNotEqual(
+            fingerprint, self.cache.trace_fingerprint(self.make_trace())
+        )
+
+    def test_prune(self):
+        key = self.cache.get_key("TestbedEvaluator", None, "1000", "abc")
+        self.cache.put(key, "TestbedEvaluator", "1000", True, "")
+        self.cache.conn.execute(
+            "INSERT INTO results VALUES ('old', 'TestbedEvaluator', '1000', 'v0', "
+            "1, '', NULL, 0, 0)"
+        )
+        self.cache.file_hash(self.screenshot_path)
+        os.remove(self.screenshot_path)
+
+        self.assertEqual(self.cache.stats()["stale_entries"], 1)
+        self.assertEqual(self.cache.prune(), 1)
+        stats = self.cache.stats()
+        self.assertEqual((stats["entries"], stats["hashed_files"]), (1, 0))
+        self.assertNotEqual(get_code_version(), "v0")
+
+
+if __name__ == "__main__":
+    unittest.main()
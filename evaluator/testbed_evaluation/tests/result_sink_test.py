@@ -0,0 +1,67 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+
+from evaluator.result_sink import RunningStats, open_result_sink
+
+RESULTS = [("1000", True), ("1001", True), ("1002", False), ("1003", False)]
+
+
+class TestResultSink(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.human_eval_path = os.path.join(self.tmp_dir.name, "human.csv")
+        with open(self.human_eval_path, "w") as f:
+            f.write("episode,human\n1000,1\n1001,0\n1002,1\n0999,1\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_running_stats(self):
+        stats = RunningStats()
+        for epi, completeness in RESULTS:
+            stats.update(epi, completeness)
+        self.assertIsNone(stats.metric())
+        self.assertEqual(stats.summary(), "Completed tasks: 2, failed tasks: 2")
+
+        stats = RunningStats(self.human_eval_path)
+        stats.update(*RESULTS[0])
+        self.assertEqual(stats.snapshot()["accuracy"], 1.0)
+        for epi, completeness in RESULTS[1:]:
+            stats.update(epi, completeness)
+        # (total, human_positive, exec_positive, tp) of 1000, 1001 and 1002
+        self.assertEqual(stats.metric(), (3, 2, 2, 1))
+
+        stats = RunningStats(self.human_eval_path, only_human_eval_positive=True)
+        for epi, completeness in RESULTS:
+            stats.update(epi, completeness)
+        self.assertEqual(stats.metric(), (2, 2, 1, 1))
+        self.assertTrue(stats.matches(self.human_eval_path, True))
+        self.assertFalse(stats.matches(None, False))
+
+    def test_sinks(self):
+        jsonl_path = os.path.join(self.tmp_dir.name, "out", "results.jsonl")
+        csv_path = os.path.join(self.tmp_dir.name, "results.csv")
+        sinks = [open_result_sink(jsonl_path), open_result_sink(csv_path)]
+        for epi, completeness in RESULTS:
+            for sink in sinks:
+                sink.write(epi, completeness, "" if completeness else "failed")
+        for sink in sinks:
+            sink.close()
+
+        with open(jsonl_path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual([(r["episode"], r["completeness"]) for r in records], RESULTS)
+        with open(csv_path, newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ["episode", "completeness", "failed_reason"])
+        self.assertEqual(rows[3], ["1002", "False", "failed"])
+
+        with self.assertRaises(ValueError):
+            open_result_sink(os.path.join(self.tmp_dir.name, "results.txt"))
+
+
+if __name__ == "__main__":
+    unittest.main()
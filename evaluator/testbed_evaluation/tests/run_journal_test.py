@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from evaluator.run_journal import RunJournal
+
+
+class TestRunJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.journal_path = os.path.join(self.tmp_dir.name, "run", "journal.jsonl")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_resume_same_run(self):
+        journal = RunJournal(self.journal_path, "TestbedEvaluator", "Auto-UI")
+        journal.append("1000", True, "")
+        journal.append("1001", False, "execution trace not found", 3)
+        journal.close()
+
+        # a run killed while writing a line
+        with open(self.journal_path, "a") as f:
+            f.write('{"run": ')
+
+        journal = RunJournal(self.journal_path, "TestbedEvaluator", "Auto-UI", {})
+        self.assertEqual(
+            journal.load(),
+            {"1000": (True, "", None), "1001": (False, "execution trace not found", 3)},
+        )
+        journal.append("1001", True, "")
+        journal.close()
+        self.assertEqual(journal.load()["1001"], (True, "", None))
+
+        # records of other runs are not resumed
+        for evaluator_name, agent_name, options in [
+            ("LCSMatchEvaluator", "Auto-UI", None),
+            ("TestbedEvaluator", "AppAgent", None),
+            ("TestbedEvaluator", "Auto-UI", {"check_install": False}),
+        ]:
+            journal = RunJournal(self.journal_path, evaluator_name, agent_name, options)
+            self.assertEqual(journal.load(), {})
+        # options that do not change results are ignored
+        journal = RunJournal(
+            self.journal_path,
+            "TestbedEvaluator",
+            "Auto-UI",
+            {
+                "jobs": 8,
+                "resume": True,
+                "result_sink": "results.csv",
+                "human_eval_path": "human.csv",
+                "only_human_eval_positive": True,
+            },
+        )
+        self.assertEqual(len(journal.load()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
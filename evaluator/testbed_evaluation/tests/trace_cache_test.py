@@ -0,0 +1,43 @@
+import unittest
+
+from evaluator.trace_cache import TraceCache
+
+
+class TestTraceCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = TraceCache(max_entries=2)
+        trace = cache.get_or_load("a", lambda: [])
+        self.assertIs(cache.get_or_load("a", lambda: None), trace)
+        cache.get_or_load("b", lambda: [])
+        cache.get_or_load("a", lambda: None)
+        cache.get_or_load("c", lambda: [])
+
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(
+            cache.stats(),
+            {
+                "size": 2,
+                "bytes": cache.stats()["bytes"],
+                "hits": 2,
+                "misses": 3,
+                "evictions": 1,
+            },
+        )
+
+    def test_byte_budget_and_invalidation(self):
+        cache = TraceCache(max_entries=None, max_bytes=1)
+        cache.get_or_load("a", lambda: [])
+        self.assertEqual(len(cache), 0)
+
+        cache.resize(max_entries=None, max_bytes=None)
+        cache.get_or_load(("groundtruth", "a"), lambda: [])
+        cache.get_or_load(("testbed", "b"), lambda: [])
+        cache.invalidate(lambda key: key[0] == "groundtruth")
+        self.assertEqual(len(cache), 1)
+        self.assertIsNone(cache.get_or_load("missing", lambda: None))
+        self.assertNotIn("missing", cache)
+
+
+if __name__ == "__main__":
+    unittest.main()
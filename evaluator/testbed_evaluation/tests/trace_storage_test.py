@@ -0,0 +1,130 @@
+import os
+import shutil
+import tarfile
+import tempfile
+import unittest
+
+from evaluator import trace_storage
+from evaluator.utils.vh_tree import parse_vh
+
+CASE_PATH = "evaluator/testbed_evaluation/tests/test_case/img_test_case/case1"
+VH_PATH = "evaluator/testbed_evaluation/tests/test_case/click_test_case/case1/10.xml"
+
+
+class TestPackedTrace(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.folder = os.path.join(self.tmp_dir.name, "captured_data")
+        for sub_folder in ["screenshot", "xml", "activity"]:
+            os.makedirs(os.path.join(self.folder, sub_folder))
+        shutil.copy(
+            os.path.join(CASE_PATH, "0.png"),
+            os.path.join(self.folder, "screenshot", "0.png"),
+        )
+        shutil.copy(VH_PATH, os.path.join(self.folder, "xml", "0.xml"))
+        with open(os.path.join(self.folder, "activity", "0.activity"), "w") as f:
+            f.write("com.android.settings/.Settings\n")
+
+        self.pack_path = trace_storage.pack_trace(self.folder)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_read_packed_files(self):
+        self.assertEqual(trace_storage.resolve_trace_root(self.folder), self.folder)
+        shutil.rmtree(self.folder)
+        root = trace_storage.resolve_trace_root(self.folder)
+        self.assertEqual(root, self.pack_path)
+
+        self.assertEqual(
+            sorted(trace_storage.listdir(root)), ["activity", "screenshot", "xml"]
+        )
+        activity_path = os.path.join(root, "activity", "0.activity")
+        self.assertTrue(trace_storage.exists(activity_path))
+        self.assertFalse(trace_storage.exists(os.path.join(root, "activity", "1")))
+        with trace_storage.open_file(activity_path) as f:
+            self.assertEqual(f.read(), "com.android.settings/.Settings\n")
+
+        with trace_storage.open_image(
+            os.path.join(root, "screenshot", "0.png")
+        ) as img, trace_storage.open_image(os.path.join(CASE_PATH, "0.png")) as exp:
+            self.assertEqual(img.size, exp.size)
+
+        packed_tree = parse_vh(os.path.join(root, "xml", "0.xml"))
+        self.assertEqual(
+            [node.attrib for node in packed_tree.iter()],
+            [node.attrib for node in parse_vh(VH_PATH).iter()],
+        )
+
+    def test_unpack(self):
+        folder = trace_storage.unpack_trace(
+            self.pack_path, os.path.join(self.tmp_dir.name, "unpacked")
+        )
+        for name in ["screenshot/0.png", "xml/0.xml", "activity/0.activity"]:
+            with open(os.path.join(folder, name), "rb") as f, open(
+                os.path.join(self.folder, name), "rb"
+            ) as exp:
+                self.assertEqual(f.read(), exp.read())
+
+
+class TestArchivedTraces(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.run_folder = os.path.join(self.tmp_dir.name, "run")
+        for episode in ["1000", "1001"]:
+            folder = os.path.join(self.run_folder, episode, "captured_data")
+            os.makedirs(os.path.join(folder, "screenshot"))
+            os.makedirs(os.path.join(folder, "activity"))
+            shutil.copy(
+                os.path.join(CASE_PATH, "0.png"),
+                os.path.join(folder, "screenshot", "0.png"),
+            )
+            with open(os.path.join(folder, "activity", "0.activity"), "w") as f:
+                f.write(f"activity_{episode}\n")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read_activity(self, trace_root: str) -> str:
+        with trace_storage.open_file(
+            os.path.join(trace_root, "activity", "0.activity")
+        ) as f:
+            return f.read().strip()
+
+    def test_zip_of_trace_folder(self):
+        folder = os.path.join(self.run_folder, "1000", "captured_data")
+        shutil.make_archive(folder, "zip", os.path.dirname(folder), "captured_data")
+        shutil.rmtree(folder)
+
+        root = trace_storage.resolve_trace_root(folder)
+        self.assertEqual(root, os.path.join(folder + ".zip", "captured_data"))
+        self.assertTrue(trace_storage.exists(os.path.join(root, "screenshot")))
+        self.assertEqual(self.read_activity(root), "activity_1000")
+
+    def test_tar_gz_of_many_traces(self):
+        with tarfile.open(self.run_folder + ".tar.gz", "w:gz") as tar:
+            tar.add(self.run_folder, arcname="run")
+        shutil.rmtree(self.run_folder)
+
+        roots = [
+            trace_storage.resolve_trace_root(
+                os.path.join(self.run_folder, episode, "captured_data")
+            )
+            for episode in ["1001", "1000", "1001"]
+        ]
+        self.assertEqual(
+            roots[0],
+            os.path.join(self.run_folder + ".tar.gz", "run", "1001", "captured_data"),
+        )
+        self.assertEqual(
+            [self.read_activity(root) for root in roots],
+            ["activity_1001", "activity_1000", "activity_1001"],
+        )
+        missing_root = trace_storage.resolve_trace_root(
+            os.path.join(self.run_folder, "1002", "captured_data")
+        )
+        self.assertFalse(trace_storage.exists(missing_root))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import unittest
+
+import numpy as np
+
+from evaluator.common.action_type import Action, ActionType
+from evaluator.task_trace import (
+    NO_ACTION,
+    TraceTable,
+    UIState,
+    get_all_actions,
+    get_all_screenshot_paths,
+    get_all_vh_paths,
+)
+
+
+class TestTraceTable(unittest.TestCase):
+    def setUp(self):
+        self.actions = [
+            Action(
+                action_type=ActionType.DUAL_POINT,
+                touch_point_yx=(0.25, 0.5),
+                lift_point_yx=(0.75, 0.5),
+            ),
+            Action(action_type=ActionType.TYPE, typed_text="good burger place"),
+            None,
+        ]
+        self.trace = TraceTable(
+            UIState.in_trace_folder(
+                "captured_data",
+                index=i,
+                activity="com.android.settings.Settings",
+                action=action,
+                state_type="execution",
+            )
+            for i, action in enumerate(self.actions)
+        )
+
+    def test_columns(self):
+        np.testing.assert_array_equal(
+            self.trace.action_types,
+            [ActionType.DUAL_POINT.value, ActionType.TYPE.value, NO_ACTION],
+        )
+        np.testing.assert_array_equal(
+            self.trace.touch_points_yx, [[0.25, 0.5], [-1, -1], [-1, -1]]
+        )
+        self.assertEqual(get_all_actions(self.trace), self.actions)
+
+        self.trace[2].action = Action(action_type=ActionType.PRESS_BACK)
+        self.assertEqual(self.trace[2].action.action_type, ActionType.PRESS_BACK)
+        self.assertEqual(self.trace[0].action, self.actions[0])
+
+    def test_derived_paths(self):
+        ui_state = self.trace[1]
+        self.assertEqual(
+            get_all_screenshot_paths(self.trace)[1],
+            os.path.join("captured_data", "screenshot", "1.png"),
+        )
+        self.assertEqual(
+            get_all_vh_paths(self.trace)[1],
+            os.path.join("captured_data", "xml", "1.xml"),
+        )
+        self.assertIsNone(ui_state.vh_simp_ui_json_path)
+        self.assertEqual(
+            ui_state.installed_app_path,
+            os.path.join("captured_data", "installed_apps", "installed_apps.txt"),
+        )
+        self.assertFalse(hasattr(ui_state, "__dict__"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from evaluator.utils.vh_tree import EXACT_MATCH_ATTRS, VHIndex, VHTreeCache
+
+VH_PATH = "evaluator/testbed_evaluation/tests/test_case/click_test_case/case1/10.xml"
+
+
+class TestVHTreeCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.other_vh_path = os.path.join(self.tmp_dir.name, "0.xml")
+        with open(self.other_vh_path, "w") as f:
+            f.write('<hierarchy><node text="OK" bounds="[0,0][1,1]"/></hierarchy>')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_parse_once(self):
+        cache = VHTreeCache()
+        tree = cache.get(VH_PATH)
+        self.assertIs(cache.get(VH_PATH), tree)
+        self.assertEqual(cache.stats(), {"size": 1, "hits": 1, "misses": 1})
+
+        cache.release(VH_PATH)
+        self.assertNotIn(VH_PATH, cache)
+        self.assertIsNot(cache.get(VH_PATH), tree)
+
+    def test_bounded_size(self):
+        cache = VHTreeCache(max_size=1)
+        cache.get(VH_PATH)
+        cache.get(self.other_vh_path)
+        self.assertEqual(len(cache), 1)
+        self.assertNotIn(VH_PATH, cache)
+        self.assertIn(self.other_vh_path, cache)
+
+
+class TestVHIndex(unittest.TestCase):
+    def test_lookups(self):
+        index = VHIndex(VHTreeCache().get(VH_PATH))
+        self.assertTrue(index.has_text("Done"))
+        self.assertFalse(index.has_text("done"))
+
+        annotated_ui_node = {attr: "" for attr in EXACT_MATCH_ATTRS}
+        node = next(iter(index.text_to_nodes["Done"]))
+        for attr in EXACT_MATCH_ATTRS:
+            value = node.get(attr)
+            if value in ["true", "false"]:
+                value = value == "true"
+            annotated_ui_node[attr] = value
+        annotated_ui_node["text"] = "DONE"
+        self.assertTrue(index.has_exact_match(annotated_ui_node))
+
+        annotated_ui_node["clickable"] = not annotated_ui_node["clickable"]
+        self.assertFalse(index.has_exact_match(annotated_ui_node))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,17 +1,37 @@
 import logging
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from imagehash import ImageHash
 
 from evaluator.agent import MobileAgent
 
 from .evaluator import BaseEvaluator, FailedReason
+from .groundtruth_features import GroundTruthFeatures
+from .result_sink import RunningStats
 from .task_trace import EssentialStateKeyword, TaskTrace, UIState
+from .testbed_evaluation.ablation import (
+    AblationSweep,
+    Check,
+    get_ablation_configs,
+    get_check_flags,
+    get_required_checks,
+)
+from .testbed_evaluation.embedding_cache import DEFAULT_CACHE_DIR
 from .testbed_evaluation.exact_match import (
     check_activity_match,
     check_click_match,
     check_type_match,
     check_uicomponent_match,
+    get_annotated_patch_hashes,
+)
+from .testbed_evaluation.fuzzy_match import (
+    ScreenSimilarityMatrix,
+    check_fuzzy_match,
+    get_screen_level_fuzzy_ui_states,
+    has_screen_level_fuzzy_state,
+    load_simplified_views,
 )
-from .testbed_evaluation.fuzzy_match import check_fuzzy_match
+from .testbed_evaluation.sentence_similarity import EmbeddingService
 from .testbed_evaluation.system_state_match import (
     check_install_match,
     check_uninstall_match,
@@ -44,64 +64,215 @@ class TestbedEvaluator(BaseEvaluator):
         """
         self.fuzzy_match = options.get("fuzzy_match", True) if options else True
         self.exact_match = options.get("exact_match", True) if options else True
-        self.screen_level_fuzzy_match = (
-            options.get("screen_level_fuzzy_match", False) if options else False
-        )
-        self.textbox_fuzzy_match = (
-            options.get("textbox_fuzzy_match", False) if options else False
-        )
-        self.activity_exact_match = (
-            options.get("activity_exact_match", False) if options else False
+        flags = get_check_flags(options)
+        self.screen_level_fuzzy_match = flags["screen_level_fuzzy_match"]
+        self.textbox_fuzzy_match = flags["textbox_fuzzy_match"]
+        self.activity_exact_match = flags["activity_exact_match"]
+        self.action_exact_match = flags["action_exact_match"]
+        self.UI_component_exact_match = flags["UI_component_exact_match"]
+        self.system_state_exact_match = flags["system_state_exact_match"]
+        self.required_checks: Check = get_required_checks(flags)
+
+        # "ablation_sweep": True, [config names] or {config name: options};
+        # evaluate all ablation configurations (see testbed_evaluation/
+        # ablation.py) in one pass. Results of the configurations are
+        # collected in self.ablation_completion, while episode_completion
+        # records the configuration of this evaluator
+        self.ablation_configs: Dict[str, Dict] = (
+            get_ablation_configs(options["ablation_sweep"])
+            if options and options.get("ablation_sweep")
+            else {}
         )
-        self.action_exact_match = (
-            options.get("action_exact_match", False) if options else False
+        self.ablation_required_checks: Dict[str, Check] = {
+            name: get_required_checks(get_check_flags(config))
+            for name, config in self.ablation_configs.items()
+        }
+        self.ablation_completion: Dict[str, Dict[str, Tuple[bool, str]]] = {
+            name: {} for name in self.ablation_configs
+        }
+
+        self.logger = logging.getLogger(self.evaluator_name)
+        logging.getLogger().setLevel(logging.WARNING)
+
+        # the sentence-embedding model is shared by all fuzzy comparisons in
+        # this process; set "warm_up_model" to load it before the first episode
+        self.embedding_service = EmbeddingService()
+        # "embedding_backend": "torch" (default), "onnx" or "onnx-int8"
+        if options and "embedding_backend" in options:
+            self.embedding_service.set_backend(options["embedding_backend"])
+        # embeddings of simplified views are persisted in "embedding_cache_dir"
+        # (default: a folder in the user cache directory); set it to None to
+        # disable
+        self.embedding_service.set_cache_dir(
+            options.get("embedding_cache_dir", DEFAULT_CACHE_DIR)
+            if options
+            else DEFAULT_CACHE_DIR
         )
-        self.UI_component_exact_match = (
-            options.get("UI_component_exact_match", False) if options else False
+        if (
+            self._needs_screen_level_fuzzy_match()
+            and options
+            and options.get("warm_up_model")
+        ):
+            self.embedding_service.warm_up()
+
+    def get_ablation_checks(self) -> Check:
+        """Checks required by any ablation configuration or by this
+        evaluator's own configuration"""
+        checks = self.required_checks
+        for required in self.ablation_required_checks.values():
+            checks |= required
+        return checks
+
+    def _needs_screen_level_fuzzy_match(self) -> bool:
+        return self.screen_level_fuzzy_match or any(
+            required & Check.SCREEN_LEVEL_FUZZY
+            for required in self.ablation_required_checks.values()
         )
-        self.system_state_exact_match = (
-            options.get("system_state_exact_match", False) if options else False
+
+    def _needs_ui_component_match(self) -> bool:
+        return self.UI_component_exact_match or any(
+            required & Check.UI_COMPONENT
+            for required in self.ablation_required_checks.values()
         )
 
-        if (
-            self.screen_level_fuzzy_match
-            or self.textbox_fuzzy_match
-            or self.activity_exact_match
-            or self.action_exact_match
-            or self.UI_component_exact_match
-            or self.system_state_exact_match
+    def add_groundtruth_features(self, features: GroundTruthFeatures) -> None:
+        """Embeddings of the ground-truth views compared by screen-level fuzzy
+        match, and hashes of the annotated image patches compared by UI
+        component exact match"""
+        if not features.gr_trace:
+            return
+        if self._needs_screen_level_fuzzy_match():
+            gr_ui_states = [
+                s
+                for s in features.gr_trace
+                if has_screen_level_fuzzy_state(s)
+                and s.index not in features.view_embeddings
+            ]
+            if gr_ui_states:
+                embeddings = self.embedding_service.encode(
+                    [load_simplified_views(s.vh_json_path) for s in gr_ui_states]
+                )
+                for ui_state, embedding in zip(gr_ui_states, embeddings):
+                    features.view_embeddings[ui_state.index] = embedding
+        if self._needs_ui_component_match():
+            for ui_state in features.gr_trace:
+                try:
+                    patch_hashes = get_annotated_patch_hashes(ui_state)
+                except Exception:
+                    # left to fail when evaluating the episode
+                    continue
+                for node_id, patch_hash in patch_hashes.items():
+                    features.patch_hashes[(ui_state.index, node_id)] = patch_hash
+
+    def prepare_evaluation(self, target_episodes: List[str]) -> None:
+        """With the "bulk_embedding" option, first gather the simplified views
+        needed by screen-level fuzzy match in all target episodes and embed
+        them in size-bucketed batches ("embedding_batch_size", default: 128).
+        The following per-episode evaluation then reads all embeddings from
+        the cache.
+        """
+        if not (
+            self._needs_screen_level_fuzzy_match()
+            and self.options
+            and self.options.get("bulk_embedding", False)
         ):
-            assert (
-                self.screen_level_fuzzy_match
-                + self.textbox_fuzzy_match
-                + self.activity_exact_match
-                + self.action_exact_match
-                + self.UI_component_exact_match
-                + self.system_state_exact_match
-                <= 1
-            ), "Only one ablation study can be enabled"
-        if self.fuzzy_match:
-            self.screen_level_fuzzy_match = True
-            self.textbox_fuzzy_match = True
-        if self.exact_match:
-            self.activity_exact_match = True
-            self.action_exact_match = True
-            self.UI_component_exact_match = True
-            self.system_state_exact_match = True
+            return
 
-        self.logger = logging.getLogger(self.evaluator_name)
-        logging.getLogger().setLevel(logging.WARNING)
+        views: List[str] = []
+        for episode in target_episodes:
+            try:
+                gr_trace = self.helper.load_groundtruth_trace_by_episode(episode)
+                if not gr_trace or not any(
+                    has_screen_level_fuzzy_state(s) for s in gr_trace
+                ):
+                    continue
+                exec_trace = self.agent.load_exec_trace_by_episode(episode)
+                if not exec_trace:
+                    continue
+                gr_ui_states, exec_ui_states = get_screen_level_fuzzy_ui_states(
+                    gr_trace, exec_trace
+                )
+                views.extend(
+                    load_simplified_views(s.vh_json_path)
+                    for s in gr_ui_states + exec_ui_states
+                )
+            except Exception as e:
+                # leave the failure to be reported when evaluating this episode
+                self.logger.error(
+                    f"Failed to collect views of episode {episode}: {str(e)}"
+                )
+
+        self.embedding_service.precompute(
+            views, batch_size=int(self.options.get("embedding_batch_size", 128))
+        )
+
+    def finish_evaluation(self) -> None:
+        # episodes failing before the sweep fail in all configurations
+        for completion in self.ablation_completion.values():
+            for epi, result in self.episode_completion.items():
+                completion.setdefault(epi, result)
+        print(f"Embedding stats: {self.embedding_service.stats()}")
+
+    def export_episode_stats(
+        self, episode: str
+    ) -> Optional[Dict[str, Tuple[bool, str]]]:
+        # popped, so that results evaluated in a worker are only kept once
+        if not self.ablation_configs:
+            return None
+        return {
+            name: completion.pop(episode)
+            for name, completion in self.ablation_completion.items()
+            if episode in completion
+        }
+
+    def import_episode_stats(
+        self, episode: str, episode_stats: Optional[Dict[str, Tuple[bool, str]]]
+    ) -> None:
+        for name, result in (episode_stats or {}).items():
+            if name in self.ablation_completion:
+                self.ablation_completion[name][episode] = tuple(result)
+
+    def report_ablation_stats(
+        self, human_eval_path: str = None, only_human_eval_positive: bool = False
+    ) -> None:
+        """Print the task completion of every ablation configuration"""
+        for name, completion in self.ablation_completion.items():
+            stats = RunningStats(human_eval_path, only_human_eval_positive)
+            for epi, (completed, _) in completion.items():
+                stats.update(epi, completed)
+            print(f"[{name}] {stats.summary()}, {stats.snapshot()}")
 
     def eval_impl(
         self, episode, task_description
     ) -> Tuple[bool, Optional[FailedReason]]:
-        gr_trace: TaskTrace = self.helper.load_groundtruth_trace_by_episode(episode)
+        gr_trace: TaskTrace = self.load_groundtruth_trace(episode)
         if not gr_trace:
             return False, FailedReason.GR_TRACE_NOT_FOUND
         exec_trace: TaskTrace = self.agent.load_exec_trace_by_episode(episode)
         if not exec_trace:
             return False, FailedReason.EXEC_TRACE_NOT_FOUND
 
+        # ground-truth embeddings and patch hashes shared by all agents
+        gr_features = self.get_groundtruth_features(episode)
+        patch_hashes = gr_features.patch_hashes if gr_features else None
+
+        # embed all screens compared by screen-level fuzzy match in one batch
+        similarity_matrix: Optional[ScreenSimilarityMatrix] = None
+        if self._needs_screen_level_fuzzy_match() and any(
+            has_screen_level_fuzzy_state(ui_state) for ui_state in gr_trace
+        ):
+            similarity_matrix = ScreenSimilarityMatrix(
+                gr_trace,
+                exec_trace,
+                self.embedding_service,
+                gr_features.view_embeddings if gr_features else None,
+            )
+
+        if self.ablation_configs:
+            return self.eval_ablation_sweep(
+                episode, gr_trace, exec_trace, similarity_matrix, patch_hashes
+            )
+
         # index for iterating exec_trace
         i = 0
 
@@ -124,7 +295,13 @@ class TestbedEvaluator(BaseEvaluator):
                 cur_exec_ui_state: UIState = exec_trace[i]
                 i += 1
 
-                if not self.check_essential_state_match(ui_state, cur_exec_ui_state):
+                matched = self.check_essential_state_match(
+                    ui_state, cur_exec_ui_state, similarity_matrix, patch_hashes
+                )
+                # the scan never goes back to this UIState of the exec trace
+                cur_exec_ui_state.release_vh_tree()
+
+                if not matched:
                     # current UIState in the exec trace does not match the
                     # essential state, go to the next UIState in the exec trace
                     continue
@@ -142,8 +319,54 @@ class TestbedEvaluator(BaseEvaluator):
 
         return True, None
 
+    def eval_ablation_sweep(
+        self,
+        episode: str,
+        gr_trace: TaskTrace,
+        exec_trace: TaskTrace,
+        similarity_matrix: Optional[ScreenSimilarityMatrix] = None,
+        patch_hashes: Optional[Mapping[Tuple[int, int], ImageHash]] = None,
+    ) -> Tuple[bool, Optional[str]]:
+        """Evaluate the episode in all ablation configurations, sharing the
+        outcomes of checks, and return the result of this evaluator's own
+        configuration"""
+        sweep = AblationSweep(
+            gr_trace,
+            exec_trace,
+            similarity_matrix,
+            patch_hashes,
+            self.get_ablation_checks(),
+        )
+        try:
+            for name, required in self.ablation_required_checks.items():
+                try:
+                    completeness, failed_reason = sweep.eval(required)
+                except Exception as e:
+                    self.logger.error(
+                        f"Failed to evaluate episode {episode} in {name}: {str(e)}"
+                    )
+                    # as eval_episode reports an exception of eval_impl
+                    completeness = False
+                    failed_reason = FailedReason.EVALUATION_ERROR.value
+                self.ablation_completion[name][episode] = (
+                    completeness,
+                    failed_reason or "",
+                )
+            # raises the exception of a failed check like the greedy match
+            return sweep.eval(self.required_checks)
+        finally:
+            self.logger.info(
+                f"Episode {episode}: checked {sweep.num_evaluated_pairs()} "
+                f"pairs of UIStates for {len(self.ablation_configs)} configurations"
+            )
+            sweep.release()
+
     def check_essential_state_match(
-        self, gr_ui_state: UIState, exec_ui_state: UIState
+        self,
+        gr_ui_state: UIState,
+        exec_ui_state: UIState,
+        similarity_matrix: Optional[ScreenSimilarityMatrix] = None,
+        patch_hashes: Optional[Mapping[Tuple[int, int], ImageHash]] = None,
     ) -> bool:
         assert (
             gr_ui_state.essential_state is not None
@@ -160,6 +383,7 @@ class TestbedEvaluator(BaseEvaluator):
                 exec_ui_state,
                 self.screen_level_fuzzy_match,
                 self.textbox_fuzzy_match,
+                similarity_matrix,
             ):
                 return False
 
@@ -185,7 +409,9 @@ class TestbedEvaluator(BaseEvaluator):
             if (
                 self.UI_component_exact_match
                 and uicomponent_match_states
-                and not check_uicomponent_match(gr_ui_state, exec_ui_state)
+                and not check_uicomponent_match(
+                    gr_ui_state, exec_ui_state, patch_hashes
+                )
             ):
                 return False
 
@@ -0,0 +1,142 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    Optional,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    from .task_trace import TaskTrace
+
+
+def _attr_values(obj: Any) -> Iterator[Any]:
+    """Values of the instance attributes of *obj*, kept in __dict__ and/or
+    __slots__"""
+    yield from getattr(obj, "__dict__", {}).values()
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, "__slots__", ()):
+            if hasattr(obj, name):
+                yield getattr(obj, name)
+
+
+def estimate_trace_bytes(trace: "TaskTrace") -> int:
+    """Approximate memory held by a trace: the trace, e.g., the columns of a
+    TraceTable, the UIState objects and their attribute values (paths,
+    activities, actions, ...). Values shared by several UIStates are counted
+    once; lazily loaded data, e.g., parsed view hierarchies, is not counted."""
+    seen = {id(trace)}
+    size = sys.getsizeof(trace)
+    for obj in [trace, *trace]:
+        if id(obj) not in seen:
+            seen.add(id(obj))
+            size += sys.getsizeof(obj)
+        for value in _attr_values(obj):
+            if id(value) not in seen:
+                seen.add(id(value))
+                size += sys.getsizeof(value)
+    return size
+
+
+class TraceCache:
+    """LRU cache of loaded traces shared by ground-truth and testbed trace
+    loading in DatasetHelper.
+
+    Entries are evicted, least recently used first, when there are more than
+    `max_entries` traces or their estimated size exceeds `max_bytes` (None
+    disables a budget). Traces handed out by the cache are shared by all
+    callers: do not modify them.
+    """
+
+    def __init__(
+        self, max_entries: Optional[int] = 1024, max_bytes: Optional[int] = None
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, Tuple["TaskTrace", int]] = OrderedDict()
+        self._num_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __getstate__(self) -> Dict:
+        # pickled to worker processes without the cached traces
+        return {"max_entries": self.max_entries, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__init__(state["max_entries"], state["max_bytes"])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def resize(
+        self, max_entries: Optional[int] = None, max_bytes: Optional[int] = None
+    ) -> None:
+        with self._lock:
+            self.max_entries = max_entries
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def get_or_load(
+        self, key: Hashable, loader: Callable[[], Optional["TaskTrace"]]
+    ) -> Optional["TaskTrace"]:
+        """Return the cached trace of *key*, or load it with *loader* and
+        cache it. Traces that could not be loaded (None) are not cached."""
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+            self.misses += 1
+
+        trace = loader()
+        if trace is None:
+            return None
+
+        num_bytes = estimate_trace_bytes(trace)
+        with self._lock:
+            if key in self._entries:
+                self._num_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (trace, num_bytes)
+            self._num_bytes += num_bytes
+            self._evict()
+        return trace
+
+    def _evict(self) -> None:
+        while self._entries and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries)
+            or (self.max_bytes is not None and self._num_bytes > self.max_bytes)
+        ):
+            _, (_, num_bytes) = self._entries.popitem(last=False)
+            self._num_bytes -= num_bytes
+            self.evictions += 1
+
+    def invalidate(
+        self, predicate: Optional[Callable[[Hashable], bool]] = None
+    ) -> None:
+        """Drop all cached traces, or only the ones whose key satisfies
+        *predicate*"""
+        with self._lock:
+            for key in [*self._entries]:
+                if predicate is None or predicate(key):
+                    self._num_bytes -= self._entries.pop(key)[1]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "bytes": self._num_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
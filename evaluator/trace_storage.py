@@ -0,0 +1,563 @@
+"""Storage of trace files: trace folders, packed traces, or archives.
+
+A trace folder (a ground-truth episode folder, or a `captured_data` folder of
+a testbed execution) holds hundreds of small files. A packed trace bundles all
+files of a trace folder into one file, [FOLDER].tpack:
+
+    header: MAGIC, offset and size of the file table
+    contents of all files
+    file table: JSON {relative path: [offset, size]}
+
+Traces are also read in place from .zip, .tar, .tar.gz (.tgz) and .tar.zst
+archives (the latter requires the `zstandard` package), e.g., an archive of
+many `captured_data` folders returned by an agent run.
+
+Files in packs and archives are addressed through the container file, e.g.,
+exec/1000/captured_data.tpack/screenshot/0.png or
+run.tar.gz/1000/captured_data/screenshot/0.png, so that the paths of UIStates
+stay strings. The evaluator reads trace files through exists, listdir,
+read_bytes, open_file and open_image of this module, which serve these paths
+from the container and all other paths from the file system:
+
+    - packs are memory-mapped; XML view hierarchies are parsed straight from
+      the mapped memory
+    - archives are read through a member index (the zip central directory, or
+      [ARCHIVE].members.json written on the first scan of a tar archive).
+      Members are decompressed on demand and the decompressed files of the
+      MAX_CACHED_TRACES traces read last are kept in memory; a compressed tar
+      is decompressed in one forward pass per trace
+
+Pack or unpack traces with:
+    python -m evaluator.trace_storage pack FOLDER [FOLDER ...]
+    python -m evaluator.trace_storage unpack PACK_FILE [PACK_FILE ...]
+"""
+
+import argparse
+import io
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import tarfile
+import threading
+import zipfile
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import IO, Dict, Iterable, List, Optional, Tuple, Union
+
+from PIL import Image
+
+PACKED_TRACE_SUFFIX = ".tpack"
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.zst")
+STORAGE_SUFFIXES = (PACKED_TRACE_SUFFIX, *ARCHIVE_SUFFIXES)
+MAGIC = b"LTTPACK1"
+# MAGIC, offset of the file table, size of the file table
+_HEADER = struct.Struct("<8sQQ")
+# packs and archives kept open, least recently used ones are closed first
+MAX_OPEN_STORAGES = 64
+# traces per archive whose decompressed files are kept in memory
+MAX_CACHED_TRACES = 4
+
+
+class TraceStorage(ABC):
+    """Files of one trace, addressed by paths relative to the trace root
+    (separated by "/"; "" is the root)"""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+
+    @abstractmethod
+    def isfile(self, name: str) -> bool:
+        pass
+
+    @abstractmethod
+    def isdir(self, name: str) -> bool:
+        pass
+
+    @abstractmethod
+    def listdir(self, name: str = "") -> List[str]:
+        pass
+
+    @abstractmethod
+    def read_bytes(self, name: str) -> Union[bytes, memoryview]:
+        pass
+
+    def exists(self, name: str) -> bool:
+        return self.isfile(name) or self.isdir(name)
+
+
+class DirectoryStorage(TraceStorage):
+    """A trace folder"""
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.root, *name.split("/")) if name else self.root
+
+    def isfile(self, name: str) -> bool:
+        return os.path.isfile(self._path(name))
+
+    def isdir(self, name: str) -> bool:
+        return os.path.isdir(self._path(name))
+
+    def listdir(self, name: str = "") -> List[str]:
+        return os.listdir(self._path(name))
+
+    def read_bytes(self, name: str) -> bytes:
+        with open(self._path(name), "rb") as f:
+            return f.read()
+
+
+class _ContainerStorage(TraceStorage):
+    """A single file holding the files of one or more traces, listed in
+    self._files"""
+
+    def _index_dirs(self, file_names: Iterable[str]) -> None:
+        # folder -> names of its files and sub-folders (as ordered set)
+        self._dirs: Dict[str, Dict[str, None]] = {"": {}}
+        for file_name in file_names:
+            child = file_name
+            while child:
+                parent, _, base = child.rpartition("/")
+                children = self._dirs.setdefault(parent, {})
+                if base in children:
+                    break
+                children[base] = None
+                child = parent
+
+    def isfile(self, name: str) -> bool:
+        return name in self._files
+
+    def isdir(self, name: str) -> bool:
+        return name in self._dirs
+
+    def listdir(self, name: str = "") -> List[str]:
+        if name not in self._dirs:
+            raise FileNotFoundError(os.path.join(self.root, name))
+        return [*self._dirs[name]]
+
+    def close(self) -> None:
+        pass
+
+
+class PackedTraceStorage(_ContainerStorage):
+    """A packed trace, memory-mapped; read_bytes returns zero-copy views of
+    the mapped file"""
+
+    def __init__(self, root: str) -> None:
+        super().__init__(root)
+        with open(root, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, table_offset, table_size = _HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{root} is not a packed trace")
+        self._files: Dict[str, Tuple[int, int]] = json.loads(
+            self._mmap[table_offset : table_offset + table_size]
+        )
+        self._index_dirs(self._files)
+
+    def read_bytes(self, name: str) -> memoryview:
+        if name not in self._files:
+            raise FileNotFoundError(os.path.join(self.root, name))
+        offset, size = self._files[name]
+        return memoryview(self._mmap)[offset : offset + size]
+
+
+class ArchiveStorage(_ContainerStorage):
+    """A zip or tar archive read in place. Files are grouped by trace (the
+    folders holding a `screenshot` folder, `instruction.txt` or
+    `eventStructs.txt`); the decompressed files of the MAX_CACHED_TRACES
+    traces read last are kept in memory."""
+
+    def __init__(self, root: str, file_names: List[str]) -> None:
+        super().__init__(root)
+        # file name -> position in the archive
+        self._files: Dict[str, int] = {name: i for i, name in enumerate(file_names)}
+        self._index_dirs(self._files)
+        self._trace_roots = {
+            folder
+            for folder, children in self._dirs.items()
+            if "screenshot" in children
+            or "instruction.txt" in children
+            or "eventStructs.txt" in children
+        }
+        # trace root -> {file name: content}
+        self._cache: OrderedDict[str, Dict[str, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_trace_root(self, name: str) -> str:
+        # the innermost trace folder holding the file
+        folder = name
+        while folder:
+            folder = folder.rpartition("/")[0]
+            if folder in self._trace_roots:
+                return folder
+        return ""
+
+    def _trace_files(self, trace_root: str) -> List[str]:
+        prefix = trace_root + "/" if trace_root else ""
+        return [name for name in self._files if name.startswith(prefix)]
+
+    def read_bytes(self, name: str) -> bytes:
+        if name not in self._files:
+            raise FileNotFoundError(os.path.join(self.root, name))
+        trace_root = self._get_trace_root(name)
+        with self._lock:
+            files = self._cache.get(trace_root)
+            if files is None:
+                files = self._cache[trace_root] = {}
+                while len(self._cache) > MAX_CACHED_TRACES:
+                    self._cache.popitem(last=False)
+            self._cache.move_to_end(trace_root)
+            if name not in files:
+                self._extract(trace_root, name, files)
+            return files[name]
+
+    @abstractmethod
+    def _extract(self, trace_root: str, name: str, files: Dict[str, bytes]) -> None:
+        """Decompress at least *name* of the trace *trace_root* into *files*"""
+        pass
+
+
+class ZipArchiveStorage(ArchiveStorage):
+    """A zip archive; members are decompressed one at a time"""
+
+    def __init__(self, root: str) -> None:
+        self._zip = zipfile.ZipFile(root)
+        super().__init__(
+            root, [info.filename for info in self._zip.infolist() if not info.is_dir()]
+        )
+
+    def _extract(self, trace_root: str, name: str, files: Dict[str, bytes]) -> None:
+        files[name] = self._zip.read(name)
+
+    def close(self) -> None:
+        self._zip.close()
+
+
+def _normalize_tar_name(name: str) -> str:
+    while name.startswith("./"):
+        name = name[2:]
+    return name.strip("/")
+
+
+class TarArchiveStorage(ArchiveStorage):
+    """A (compressed) tar archive. Compressed tars cannot be read at random,
+    so all files of a trace are decompressed in one pass over the archive; the
+    pass resumes where the previous one stopped when traces are read in
+    archive order."""
+
+    def __init__(self, root: str) -> None:
+        self.root = root
+        self._stream: Optional[tarfile.TarFile] = None
+        self._stream_fileobj: Optional[IO] = None
+        # position of the next member of self._stream
+        self._stream_pos = 0
+        super().__init__(root, self._load_member_index(root))
+
+    def _open_stream(self) -> None:
+        self.close()
+        f = open(self.root, "rb")
+        if self.root.endswith(".tar.zst"):
+            try:
+                import zstandard
+            except ImportError:
+                f.close()
+                raise ImportError(
+                    f"Reading {self.root} requires `pip install zstandard`"
+                )
+            f = zstandard.ZstdDecompressor().stream_reader(f, closefd=True)
+        self._stream_fileobj = f
+        self._stream = tarfile.open(fileobj=f, mode="r|*")
+        self._stream_pos = 0
+
+    def _iter_stream(self) -> Iterable[tarfile.TarInfo]:
+        """Members of the archive from the current stream position on"""
+        while True:
+            member = self._stream.next()
+            if member is None:
+                return
+            if member.isfile():
+                self._stream_pos += 1
+                yield member
+
+    def _load_member_index(self, root: str) -> List[str]:
+        """File names of the archive in archive order, cached in
+        [root].members.json as long as the archive is unchanged"""
+        stat = os.stat(root)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        index_path = root + ".members.json"
+        try:
+            with open(index_path, "r") as f:
+                index = json.load(f)
+            if index["signature"] == signature:
+                return index["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        self._open_stream()
+        file_names = [
+            _normalize_tar_name(member.name) for member in self._iter_stream()
+        ]
+        self.close()
+        try:
+            with open(index_path, "w") as f:
+                json.dump({"signature": signature, "files": file_names}, f)
+        except OSError:
+            # e.g., a read-only folder; the archive is scanned again next time
+            pass
+        return file_names
+
+    def _extract(self, trace_root: str, name: str, files: Dict[str, bytes]) -> None:
+        wanted = set(self._trace_files(trace_root)) - files.keys()
+        first_pos = min(self._files[file_name] for file_name in wanted)
+        if self._stream is None or self._stream_pos > first_pos:
+            self._open_stream()
+        for member in self._iter_stream():
+            file_name = _normalize_tar_name(member.name)
+            if file_name in wanted:
+                files[file_name] = self._stream.extractfile(member).read()
+                wanted.discard(file_name)
+                if not wanted:
+                    break
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._stream.close()
+            self._stream_fileobj.close()
+            self._stream = self._stream_fileobj = None
+
+
+def _open_storage(path: str) -> _ContainerStorage:
+    if path.endswith(PACKED_TRACE_SUFFIX):
+        return PackedTraceStorage(path)
+    if path.endswith(".zip"):
+        return ZipArchiveStorage(path)
+    return TarArchiveStorage(path)
+
+
+# container file -> (mtime of the file when it was opened, its storage)
+_open_storages: OrderedDict[str, Tuple[int, _ContainerStorage]] = OrderedDict()
+_open_storages_lock = threading.Lock()
+
+
+def _get_storage(path: str) -> _ContainerStorage:
+    # a file written again (e.g., packed once more) is opened again
+    mtime_ns = os.stat(path).st_mtime_ns
+    with _open_storages_lock:
+        entry = _open_storages.get(path)
+        if entry is not None and entry[0] == mtime_ns:
+            _open_storages.move_to_end(path)
+            return entry[1]
+    storage = _open_storage(path)
+    with _open_storages_lock:
+        _open_storages[path] = (mtime_ns, storage)
+        _open_storages.move_to_end(path)
+        # memory maps of evicted packs are closed once the views handed out
+        # are released
+        while len(_open_storages) > MAX_OPEN_STORAGES:
+            _open_storages.popitem(last=False)[1][1].close()
+    return storage
+
+
+def _reset_storages() -> None:
+    # open archive streams must not be shared with a forked child
+    global _open_storages, _open_storages_lock
+    _open_storages = OrderedDict()
+    _open_storages_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_storages)
+
+
+def split_storage_path(path: str) -> Optional[Tuple[str, str]]:
+    """(pack or archive file, file name in it) of a path through a pack or an
+    archive, or None for other paths"""
+    ends = []
+    for suffix in STORAGE_SUFFIXES:
+        pos = path.find(suffix)
+        while pos >= 0:
+            end = pos + len(suffix)
+            if end == len(path) or path[end] in "/\\":
+                ends.append(end)
+            pos = path.find(suffix, end)
+    for end in sorted(ends):
+        if os.path.isfile(path[:end]):
+            return path[:end], path[end + 1 :].replace(os.sep, "/").strip("/")
+    return None
+
+
+def strip_storage_suffix(file_name: str) -> Optional[str]:
+    """*file_name* without its pack or archive suffix, or None if it is not a
+    pack or archive"""
+    for suffix in STORAGE_SUFFIXES:
+        if file_name.endswith(suffix):
+            return file_name[: -len(suffix)]
+    return None
+
+
+def is_storage_file(path: str) -> bool:
+    """Whether *path* is a pack or an archive"""
+    return strip_storage_suffix(path) is not None and os.path.isfile(path)
+
+
+def get_trace_storage(trace_root: str) -> TraceStorage:
+    """Storage of a trace folder, a pack or an archive"""
+    if is_storage_file(trace_root):
+        return _get_storage(trace_root)
+    return DirectoryStorage(trace_root)
+
+
+def resolve_trace_root(path: str) -> str:
+    """The trace folder *path*, or its path through a pack or an archive if
+    the folder (or one of its parent folders) only exists packed or archived,
+    e.g., [path].tpack or [parent].tar.gz/[folder]. An archive [folder].zip
+    whose only top-level entry is the folder itself is looked into."""
+    if os.path.exists(path):
+        return path
+    head, tail = os.path.normpath(path), ""
+    while head and not os.path.isdir(head):
+        for suffix in STORAGE_SUFFIXES:
+            storage_path = head + suffix
+            if not os.path.isfile(storage_path):
+                continue
+            folder = os.path.basename(head)
+            if _get_storage(storage_path).listdir() == [folder]:
+                storage_path = os.path.join(storage_path, folder)
+            return os.path.join(storage_path, tail) if tail else storage_path
+        parent, name = os.path.split(head)
+        if parent == head:
+            break
+        head, tail = parent, os.path.join(name, tail) if tail else name
+    return path
+
+
+# ------------------------------------------------------------ #
+# -- Reading trace files, in a container or the file system -- #
+# ------------------------------------------------------------ #
+def exists(path: str) -> bool:
+    stored = split_storage_path(path)
+    if stored is None:
+        return os.path.exists(path)
+    storage_path, name = stored
+    return _get_storage(storage_path).exists(name)
+
+
+def isfile(path: str) -> bool:
+    stored = split_storage_path(path)
+    if stored is None:
+        return os.path.isfile(path)
+    storage_path, name = stored
+    return _get_storage(storage_path).isfile(name)
+
+
+def listdir(path: str) -> List[str]:
+    stored = split_storage_path(path)
+    if stored is None:
+        return os.listdir(path)
+    storage_path, name = stored
+    return _get_storage(storage_path).listdir(name)
+
+
+def getmtime_ns(path: str) -> int:
+    """mtime of *path*; files in a pack or an archive share its mtime"""
+    stored = split_storage_path(path)
+    return os.stat(path if stored is None else stored[0]).st_mtime_ns
+
+
+def read_bytes(path: str) -> Union[bytes, memoryview]:
+    stored = split_storage_path(path)
+    if stored is None:
+        with open(path, "rb") as f:
+            return f.read()
+    storage_path, name = stored
+    return _get_storage(storage_path).read_bytes(name)
+
+
+def open_file(path: str, mode: str = "r", encoding: Optional[str] = None) -> IO:
+    """open() for reading trace files"""
+    assert mode in ["r", "rb"]
+    if split_storage_path(path) is None:
+        return open(path, mode, encoding=encoding)
+    f = io.BytesIO(read_bytes(path))
+    return f if mode == "rb" else io.TextIOWrapper(f, encoding=encoding)
+
+
+def open_image(path: str) -> Image.Image:
+    """Image.open() for screenshots"""
+    if split_storage_path(path) is None:
+        return Image.open(path)
+    return Image.open(io.BytesIO(read_bytes(path)))
+
+
+# ------------------------------------------------------------ #
+# -- Packing and unpacking ------------------------------------ #
+# ------------------------------------------------------------ #
+def pack_trace(folder: str, pack_path: Optional[str] = None) -> str:
+    """Pack all files in *folder* into *pack_path* (default: [folder].tpack);
+    empty folders are left out"""
+    folder = folder.rstrip("/\\")
+    pack_path = pack_path or folder + PACKED_TRACE_SUFFIX
+    files: Dict[str, Tuple[int, int]] = {}
+    tmp_path = pack_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, 0, 0))
+        for dir_path, dir_names, file_names in os.walk(folder):
+            dir_names.sort()
+            for file_name in sorted(file_names):
+                file_path = os.path.join(dir_path, file_name)
+                name = os.path.relpath(file_path, folder).replace(os.sep, "/")
+                offset = f.tell()
+                with open(file_path, "rb") as src:
+                    shutil.copyfileobj(src, f)
+                files[name] = (offset, f.tell() - offset)
+        table_offset = f.tell()
+        table = json.dumps(files).encode("utf-8")
+        f.write(table)
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, table_offset, len(table)))
+    os.replace(tmp_path, pack_path)
+    return pack_path
+
+
+def unpack_trace(pack_path: str, folder: Optional[str] = None) -> str:
+    """Extract a packed trace into *folder* (default: the pack path without
+    its suffix)"""
+    if folder is None:
+        assert pack_path.endswith(PACKED_TRACE_SUFFIX)
+        folder = pack_path[: -len(PACKED_TRACE_SUFFIX)]
+    storage = PackedTraceStorage(pack_path)
+    for name in storage._files:
+        file_path = os.path.join(folder, *name.split("/"))
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(storage.read_bytes(name))
+    return folder
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack or unpack traces.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    pack_parser = subparsers.add_parser("pack", help="trace folders -> [FOLDER].tpack")
+    pack_parser.add_argument("folders", type=str, nargs="+")
+    pack_parser.add_argument(
+        "--remove", action="store_true", help="remove the folders once packed"
+    )
+    unpack_parser = subparsers.add_parser(
+        "unpack", help="[FOLDER].tpack -> trace folders"
+    )
+    unpack_parser.add_argument("pack_files", type=str, nargs="+")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    logger = logging.getLogger("trace_storage")
+    if args.command == "pack":
+        for folder in args.folders:
+            pack_path = pack_trace(folder)
+            if args.remove:
+                shutil.rmtree(folder)
+            logger.info(f"Packed {folder} into {pack_path}")
+    else:
+        for pack_path in args.pack_files:
+            folder = unpack_trace(pack_path)
+            logger.info(f"Unpacked {pack_path} into {folder}")
@@ -1,8 +1,6 @@
 import hashlib
 import re
 
-import networkx as nx
-
 ACTION_MISSED = None
 FINISHED = "task_completed"
 
@@ -321,7 +319,11 @@ def _remove_ip_and_date(string, remove_candidates=None):
     return string
 
 
-def _merge_textv2(views, children_ids, remove_time_and_ip=False, important_view_ids=[]):
+def _merge_textv2(
+    views, children_ids, remove_time_and_ip=False, important_view_ids=None
+):
+    if important_view_ids is None:
+        important_view_ids = []
     texts, content_descriptions = [], []
     for childid in children_ids:
 
@@ -364,15 +366,6 @@ def _merge_textv2(views, children_ids, remove_time_and_ip=False, important_view_
     return merged_text, merged_desc, important_view_ids
 
 
-def _get_self_ancestors_property(views, view, key, default=None):
-    all_views = [view] + [views[i] for i in get_all_ancestors(views, view)]
-    for v in all_views:
-        value = _safe_dict_get(v, key)
-        if value:
-            return value
-    return default
-
-
 def get_all_ancestors(views, view_dict):
     """
     Get temp view ids of the given view's ancestors
@@ -387,36 +380,142 @@ def get_all_ancestors(views, view_dict):
     return result
 
 
-def _get_ancestor_id(views, view, key, default=None):
-    if _safe_dict_get(view, key=key, default=False):
-        return view["temp_id"]
-    all_views = [view] + [views[i] for i in get_all_ancestors(views, view)]
-    for v in all_views:
-        value = _safe_dict_get(v, key)
-        if value:
-            return v["temp_id"]
-    return default
+class _ViewTree:
+    """Structure of a view hierarchy, precomputed once per call of simplify_views.
 
+    - children: parent id -> child ids in the order of their view ids; the
+        same adjacency as a graph built by adding edge (view["parent"], view_id)
+        for every view except the first one
+    - preorder/subtree ranges: views in the subtree of view `i` (depth-first,
+        children visited in order) are preorder[start[i]:end[i]]
+    - inherited properties: the first truthy value (and the id of the view
+        holding it) of a property among a view and its ancestors
+    """
 
-def _build_view_graph(views):
-    view_graph = nx.DiGraph()
-    for view_id in range(1, len(views)):
-        view = views[view_id]
-        parentid = view["parent"]
-        view_graph.add_edge(parentid, view_id)
-    return view_graph
-
+    # depth limit of the depth-first search collecting the children of a view
+    DEPTH_LIMIT = 100
+
+    def __init__(self, views) -> None:
+        self.views = views
+
+        self.children = {}
+        # nodes of the graph, in the order they were first added to it
+        self.nodes = {}
+        has_parent = set()
+        for view_id in range(1, len(views)):
+            parent_id = views[view_id]["parent"]
+            self.nodes.setdefault(parent_id, None)
+            self.nodes.setdefault(view_id, None)
+            self.children.setdefault(parent_id, []).append(view_id)
+            has_parent.add(view_id)
+
+        self.preorder = []
+        self.start, self.end, self.depth = {}, {}, {}
+        for root in self.nodes:
+            if root in has_parent:
+                continue
+            self.start[root] = len(self.preorder)
+            self.depth[root] = 0
+            self.preorder.append(root)
+            stack = [(root, iter(self.children.get(root, [])))]
+            while stack:
+                parent_id, children = stack[-1]
+                child_id = next(children, None)
+                if child_id is None:
+                    self.end[parent_id] = len(self.preorder)
+                    stack.pop()
+                    continue
+                self.start[child_id] = len(self.preorder)
+                self.depth[child_id] = self.depth[parent_id] + 1
+                self.preorder.append(child_id)
+                stack.append((child_id, iter(self.children.get(child_id, []))))
+
+        self._inherited = {}
+        self._all_children = {}
+
+    def _parent_id(self, view_id):
+        parent_id = _safe_dict_get(self.views[view_id], "parent", -1)
+        if isinstance(parent_id, int) and 0 <= parent_id < len(self.views):
+            return parent_id
+        return None
+
+    def _inherit(self, key):
+        """view id -> (value, id of the view holding the value) for *key*"""
+        if key in self._inherited:
+            return self._inherited[key]
+        inherited = [None] * len(self.views)
+        for view_id in range(len(self.views)):
+            # walk up until a view with a known result, then fill the path
+            path = []
+            cur = view_id
+            while cur is not None and inherited[cur] is None:
+                value = _safe_dict_get(self.views[cur], key)
+                if value:
+                    inherited[cur] = (value, self.views[cur]["temp_id"])
+                    break
+                path.append(cur)
+                cur = self._parent_id(cur)
+                if cur in path:  # malformed hierarchy with a cycle of parents
+                    cur = None
+            result = inherited[cur] if cur is not None else (None, None)
+            for v in path:
+                inherited[v] = result
+        self._inherited[key] = inherited
+        return inherited
+
+    def get_self_ancestors_property(self, view_id, key):
+        return self._inherit(key)[view_id][0]
+
+    def get_ancestor_id(self, view_id, key):
+        return self._inherit(key)[view_id][1]
+
+    def _dfs_successors(self, sources):
+        """Children of the sources in depth-first order grouped by their parents,
+        for sources that are not covered by the preorder (i.e., on a cycle)"""
+        successors, visited = {}, set()
+        for source in sources:
+            if source in visited:
+                continue
+            visited.add(source)
+            stack = [(source, iter(self.children.get(source, [])))]
+            while stack:
+                parent_id, children = stack[-1]
+                for child_id in children:
+                    if child_id not in visited:
+                        successors.setdefault(parent_id, []).append(child_id)
+                        visited.add(child_id)
+                        if len(stack) < self.DEPTH_LIMIT:
+                            stack.append(
+                                (child_id, iter(self.children.get(child_id, [])))
+                            )
+                            break
+                else:
+                    stack.pop()
+        return [child_id for ids in successors.values() for child_id in ids]
+
+    def get_all_children(self, view_id):
+        """All successors of a view, as collected by a depth-first search with
+        a depth limit; `None` collects the successors of all nodes"""
+        if view_id in self._all_children:
+            return self._all_children[view_id]
+
+        if view_id is None:
+            successors = self._dfs_successors(self.nodes)
+        elif view_id not in self.nodes:
+            raise KeyError(view_id)
+        elif view_id not in self.start:
+            successors = self._dfs_successors([view_id])
+        else:
+            # parents are expanded in preorder, each of them adding its children
+            successors = []
+            base_depth = self.depth[view_id]
+            for parent_id in self.preorder[self.start[view_id] : self.end[view_id]]:
+                if self.depth[parent_id] - base_depth < self.DEPTH_LIMIT:
+                    successors.extend(self.children.get(parent_id, []))
+        successors = [i for i in dict.fromkeys(successors) if i != view_id]
 
-def _extract_all_children(views, id):
-    view_graph = _build_view_graph(views)
-    successors = []
-    successors_of_view = nx.dfs_successors(view_graph, source=id, depth_limit=100)
-    # print(successors_of_view)
-    for k, v in successors_of_view.items():
-        for successor_id in v:
-            if successor_id not in successors and successor_id != id:
-                successors.append(successor_id)
-    return successors
+        self._all_children[view_id] = (successors, set(successors))
+        return self._all_children[view_id]
 
 
 def simplify_views(views, merge_buttons=True) -> str:
@@ -437,22 +536,27 @@ def simplify_views(views, merge_buttons=True) -> str:
         ]:
             enabled_view_ids.append(view_dict["temp_id"])
 
+    view_tree = _ViewTree(views)
+    enabled_view_id_set = set(enabled_view_ids)
+
     text_frame = "<text id=@ text='&'>#</text>"
     btn_frame = "<button id=@ text='&'>#</button>"
     checkbox_frame = "<checkbox id=@ checked=$ text='&'>#</checkbox>"
     input_frame = "<input id=@ text='&'>#</input>"
 
     view_descs = []
-    removed_view_ids = []
+    removed_view_ids = set()
 
     for view_id in enabled_view_ids:
         if view_id in removed_view_ids:
             continue
         view = views[view_id]
-        clickable = _get_self_ancestors_property(views, view, "clickable")
+        clickable = view_tree.get_self_ancestors_property(view_id, "clickable")
         scrollable = _safe_dict_get(view, "scrollable")
-        checkable = _get_self_ancestors_property(views, view, "checkable")
-        long_clickable = _get_self_ancestors_property(views, view, "long_clickable")
+        checkable = view_tree.get_self_ancestors_property(view_id, "checkable")
+        long_clickable = view_tree.get_self_ancestors_property(
+            view_id, "long_clickable"
+        )
         editable = _safe_dict_get(view, "editable")
         actionable = clickable or scrollable or checkable or long_clickable or editable
         checked = _safe_dict_get(view, "checked", default=False)
@@ -486,19 +590,18 @@ def simplify_views(views, merge_buttons=True) -> str:
             view_descs.append(view_desc)
         elif clickable:  # or long_clickable
             if merge_buttons:
-                clickable_ancestor_id = _get_ancestor_id(
-                    views, view=view, key="clickable"
-                )
+                clickable_ancestor_id = view_tree.get_ancestor_id(view_id, "clickable")
                 if not clickable_ancestor_id:
-                    clickable_ancestor_id = _get_ancestor_id(
-                        views, view=view, key="checkable"
+                    clickable_ancestor_id = view_tree.get_ancestor_id(
+                        view_id, "checkable"
                     )
-                clickable_children_ids = _extract_all_children(
-                    views=views, id=clickable_ancestor_id
+                all_children_ids, all_children_id_set = view_tree.get_all_children(
+                    clickable_ancestor_id
                 )
 
-                if view_id not in clickable_children_ids:
-                    clickable_children_ids.append(view_id)
+                clickable_children_ids = all_children_ids
+                if view_id not in all_children_id_set:
+                    clickable_children_ids = all_children_ids + [view_id]
 
                 view_text, content_description, _ = _merge_textv2(
                     views,
@@ -521,10 +624,10 @@ def simplify_views(views, merge_buttons=True) -> str:
             if merge_buttons:
                 for clickable_child in clickable_children_ids:
                     if (
-                        clickable_child in enabled_view_ids
+                        clickable_child in enabled_view_id_set
                         and clickable_child != view_id
                     ):
-                        removed_view_ids.append(clickable_child)
+                        removed_view_ids.add(clickable_child)
 
         elif scrollable:
             continue
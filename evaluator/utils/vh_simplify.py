@@ -4,6 +4,8 @@ from typing import Dict, List
 
 import numpy as np
 
+from .. import trace_storage
+
 
 def generate_id(element, parent_ids=None):
     if parent_ids is None:
@@ -86,7 +88,8 @@ def extract_clickable_components(root) -> List[Dict]:
 
 
 def extract_ui_positions_from_vh(xml_path: str) -> np.ndarray[np.ndarray]:
-    xml_root = ET.parse(xml_path).getroot()
+    with trace_storage.open_file(xml_path, "rb") as f:
+        xml_root = ET.parse(f).getroot()
     ui_positions = []
     ui_components = extract_clickable_components(xml_root)
     for item in ui_components:
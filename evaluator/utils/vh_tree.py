@@ -0,0 +1,159 @@
+from collections import OrderedDict, defaultdict
+from itertools import product
+from typing import Any, Dict, List, Optional, Tuple
+
+from lxml import etree
+
+from .. import trace_storage
+
+
+def parse_vh(vh_path: str) -> etree._ElementTree:
+    """Parse an XML view hierarchy dumped through `uiautomator`"""
+    parser = etree.XMLParser(recover=True, encoding="utf-8")
+    if trace_storage.split_storage_path(vh_path) is None:
+        return etree.parse(vh_path, parser)
+    # parsed straight from the memory-mapped packed trace
+    root = etree.fromstring(trace_storage.read_bytes(vh_path), parser)
+    if root is None:
+        raise etree.XMLSyntaxError(f"Empty view hierarchy: {vh_path}", None, 0, 0)
+    return root.getroottree()
+
+
+# attributes compared by the exact match of annotated UI components
+EXACT_MATCH_ATTRS = [
+    "class",
+    "text",
+    "resource-id",
+    "content-desc",
+    "enabled",
+    "checked",
+    "checkable",
+    "selected",
+    "focused",
+    "focusable",
+    "clickable",
+    "long-clickable",
+    "password",
+    "scrollable",
+]
+# annotated values that also match a missing attribute
+NULL_VALUES = ["", " ", "null"]
+# attributes compared case-insensitively
+CASE_INSENSITIVE_ATTRS = ["text", "content-desc"]
+
+
+def _normalize_node_attr(attr: str, value: Optional[str]) -> Any:
+    if value == "true":
+        return True
+    if value == "false":
+        return False
+    if value is not None and attr in CASE_INSENSITIVE_ATTRS:
+        return value.lower()
+    return value
+
+
+class VHIndex:
+    """Lookup tables over all nodes of a parsed view hierarchy.
+
+    - signatures: the normalized EXACT_MATCH_ATTRS of every node (missing
+        attributes as None, "true"/"false" as booleans, lower-cased text and
+        content-desc), so that matching an annotated UI component is a set
+        lookup instead of a walk over the tree
+    - text_to_nodes: raw text of every node (missing text as "") -> nodes
+    """
+
+    def __init__(self, tree: etree._ElementTree) -> None:
+        self.signatures: set = set()
+        self.text_to_nodes: Dict[str, List[etree._Element]] = defaultdict(list)
+        for node in tree.iter():
+            self.signatures.add(
+                tuple(
+                    _normalize_node_attr(attr, node.get(attr))
+                    for attr in EXACT_MATCH_ATTRS
+                )
+            )
+            self.text_to_nodes[node.get("text", "")].append(node)
+
+    def has_text(self, text: str) -> bool:
+        return text in self.text_to_nodes
+
+    def has_exact_match(self, annotated_ui_node: Dict) -> bool:
+        """Whether one node matches all EXACT_MATCH_ATTRS of the annotated UI
+        component. A missing attribute matches an annotated None or NULL_VALUES.
+        """
+        candidates: List[Tuple] = []
+        for attr in EXACT_MATCH_ATTRS:
+            assert attr in annotated_ui_node
+            value = annotated_ui_node.get(attr)
+            # null values are checked before lower-casing, e.g., "Null" only
+            # matches a node with the same (lower-cased) attribute
+            is_null = value is None or value in NULL_VALUES
+            if isinstance(value, str) and attr in CASE_INSENSITIVE_ATTRS:
+                value = value.lower()
+            if value is None:
+                candidates.append((None,))
+            elif is_null:
+                candidates.append((value, None))
+            else:
+                candidates.append((value,))
+        return any(signature in self.signatures for signature in product(*candidates))
+
+
+class VHTreeCache:
+    """Parsed view hierarchies of the UIStates in one trace.
+
+    Every matcher comparing a ground-truth UIState with an execution UIState
+    reads the execution view hierarchy through this cache, so that each XML
+    file is parsed (and indexed, see VHIndex) once although it is checked
+    several times. At most `max_size` trees are kept (least recently used ones
+    are evicted first); evaluators release trees of UIStates they have moved
+    past.
+
+    Parsed trees are shared: callers must not modify them.
+    """
+
+    def __init__(self, max_size: int = 8) -> None:
+        assert max_size > 0
+        self.max_size = max_size
+        self._trees: OrderedDict[str, etree._ElementTree] = OrderedDict()
+        self._indexes: Dict[str, VHIndex] = {}
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self._trees)
+
+    def __contains__(self, vh_path: str) -> bool:
+        return vh_path in self._trees
+
+    def get(self, vh_path: str) -> etree._ElementTree:
+        tree = self._trees.get(vh_path)
+        if tree is not None:
+            self.hits += 1
+            self._trees.move_to_end(vh_path)
+            return tree
+
+        self.misses += 1
+        tree = parse_vh(vh_path)
+        self._trees[vh_path] = tree
+        if len(self._trees) > self.max_size:
+            self.release(next(iter(self._trees)))
+        return tree
+
+    def get_index(self, vh_path: str) -> VHIndex:
+        tree = self.get(vh_path)
+        if vh_path not in self._indexes:
+            self._indexes[vh_path] = VHIndex(tree)
+        return self._indexes[vh_path]
+
+    def release(self, vh_path: str) -> None:
+        self._trees.pop(vh_path, None)
+        self._indexes.pop(vh_path, None)
+
+    def clear(self) -> None:
+        self._trees.clear()
+        self._indexes.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._trees), "hits": self.hits, "misses": self.misses}